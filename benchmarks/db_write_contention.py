@@ -0,0 +1,82 @@
+"""
+Benchmark: concurrent progress-style write transactions per database engine profile.
+
+Usage: python -m benchmarks.db_write_contention [--writers 8] [--transactions 200] [--url postgresql+psycopg://...]
+Without --url, a temporary SQLite file is benchmarked with SQLAlchemy defaults and with the tuned profile.
+Each transaction inserts a quiz attempt and an XP transaction and bumps the student's XP, like /progress/record.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from sqlalchemy import delete
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from src.database.database import create_db_engine
+from src.database.models import Base, StudentGamification, StudentQuizAttempt, XPTransaction
+
+
+def run_writer(Session, writer_id: int, transactions: int, timings: list, errors: list):
+    student_id = f"bench_{writer_id:03d}"
+    for i in range(transactions):
+        start = time.perf_counter()
+        db = Session()
+        try:
+            db.add(StudentQuizAttempt(quiz_id=f"q{i}", student_id=student_id, topic="Python", difficulty="medium", questions=["q"] * 5, answers=["a"] * 5, correct_count=4, total_questions=5))
+            db.add(XPTransaction(student_id=student_id, xp_amount=50, activity_type="quiz_completion"))
+            db.query(StudentGamification).filter_by(student_id=student_id).update({StudentGamification.total_xp: StudentGamification.total_xp + 50}, synchronize_session=False)
+            db.commit()
+            timings.append((time.perf_counter() - start) * 1000)
+        except OperationalError as e:
+            db.rollback()
+            errors.append(str(e.orig))
+        finally:
+            db.close()
+
+
+def benchmark(label: str, engine, writers: int, transactions: int):
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        for table in (XPTransaction, StudentQuizAttempt, StudentGamification):
+            db.execute(delete(table).where(table.student_id.like("bench_%")))
+        db.add_all([StudentGamification(student_id=f"bench_{w:03d}", total_xp=0, level=1, current_streak=0, longest_streak=0) for w in range(writers)])
+        db.commit()
+
+    timings, errors = [], []
+    threads = [threading.Thread(target=run_writer, args=(Session, w, transactions, timings, errors)) for w in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+
+    p50 = statistics.median(timings) if timings else 0
+    p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else p50
+    print(f"{label:<22}{len(timings) / elapsed:>10.0f}{p50:>10.2f}{p95:>10.2f}{len(errors):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--transactions", type=int, default=200)
+    parser.add_argument("--url", help="Benchmark this database with the tuned profile instead of temporary SQLite files")
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.transactions} transactions")
+    print(f"{'profile':<22}{'tx/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    if args.url:
+        benchmark("tuned", create_db_engine(args.url), args.writers, args.transactions)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, tuned in [("sqlite defaults", False), ("sqlite tuned (WAL)", True)]:
+            path = os.path.join(tmp, f"{'tuned' if tuned else 'default'}.db")
+            benchmark(label, create_db_engine(f"sqlite:///{path}", tuned=tuned, echo=False), args.writers, args.transactions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: knowledge graph rendering, temp-file + base64 (previous path) vs in-memory HTML.
+
+Usage: python -m benchmarks.graph_render [--iterations 50]
+No LLM calls are made; graphs are synthetic.
+"""
+import argparse
+import base64
+import gzip
+import os
+import statistics
+import tempfile
+import time
+from src.utils.generate_knowledge_graph import visualize_graph
+
+
+def build_graph(num_nodes: int) -> dict:
+    nodes = [{"id": f"Concept {i}", "type": f"Type{i % 5}"} for i in range(num_nodes)]
+    relationships = [{"source": f"Concept {i}", "target": f"Concept {(i * 7 + 1) % num_nodes}", "type": "RELATES_TO"} for i in range(num_nodes)]
+    relationships += [{"source": f"Concept {i}", "target": f"Concept {(i + 1) % num_nodes}", "type": "PRECEDES"} for i in range(num_nodes)]
+    return {"nodes": nodes, "relationships": relationships}
+
+
+def legacy_tempfile_base64(graph: dict) -> bytes:
+    """Previous behaviour: write to a NamedTemporaryFile, read back, unlink, base64 encode."""
+    html = visualize_graph(graph)
+    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.html') as tmp_file:
+        tmp_path = tmp_file.name
+        tmp_file.write(html)
+    with open(tmp_path, 'r', encoding='utf-8') as f:
+        html_content = f.read()
+    os.unlink(tmp_path)
+    return base64.b64encode(html_content.encode('utf-8'))
+
+
+def in_memory_base64(graph: dict) -> bytes:
+    return base64.b64encode(visualize_graph(graph).encode('utf-8'))
+
+
+def in_memory_raw(graph: dict) -> bytes:
+    return visualize_graph(graph).encode('utf-8')
+
+
+def in_memory_gzip(graph: dict) -> bytes:
+    return gzip.compress(visualize_graph(graph).encode('utf-8'), compresslevel=6)
+
+
+def measure(fn, graph: dict, iterations: int):
+    timings = []
+    payload = b""
+    for _ in range(iterations):
+        start = time.perf_counter()
+        payload = fn(graph)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), statistics.quantiles(timings, n=20)[-1], len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    modes = [("tempfile+base64 (old)", legacy_tempfile_base64), ("in-memory base64", in_memory_base64), ("in-memory raw html", in_memory_raw), ("in-memory gzip html", in_memory_gzip)]
+    for label, size in [("small", 10), ("large", 400)]:
+        graph = build_graph(size)
+        print(f"\n{label} graph: {size} nodes, {len(graph['relationships'])} edges")
+        print(f"{'mode':<24}{'p50 ms':>10}{'p95 ms':>10}{'bytes':>12}")
+        for name, fn in modes:
+            p50, p95, size_bytes = measure(fn, graph, args.iterations)
+            print(f"{name:<24}{p50:>10.2f}{p95:>10.2f}{size_bytes:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import os
+
+# Tests never talk to a real provider
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from src.database.database import create_db_engine
+from src.database.migrations import run_migrations
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A freshly migrated SQLite database in a temporary directory."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}", echo=False)
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def Session(engine):
+    return sessionmaker(bind=engine, autoflush=False)
@@ -36,7 +36,7 @@ async function handleSendMessage(e) {
     const typingId = showTypingIndicator();
     
     try {
-        const response = await fetch(`${API_BASE_URL}/chat/message`, {
+        const response = await fetch(`${API_BASE_URL}/chat/stream`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
@@ -46,14 +46,43 @@ async function handleSendMessage(e) {
             })
         });
         
-        if (!response.ok) throw new Error('Failed to get response');
+        if (!response.ok || !response.body) throw new Error('Failed to get response');
         
-        const data = await response.json();
-        conversationId = data.conversation_id;
+        // Read Server-Sent Events and render tokens as they arrive
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let reply = '';
+        let bubble = null;
         
-        // Remove typing indicator and show tutor response
-        removeTypingIndicator(typingId);
-        addMessage('tutor', data.reply);
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            for (const rawEvent of events) {
+                const event = parseSseEvent(rawEvent);
+                if (!event) continue;
+                if (event.type === 'start') {
+                    conversationId = event.data.conversation_id;
+                } else if (event.type === 'token') {
+                    if (!bubble) {
+                        // Remove typing indicator on the first token
+                        removeTypingIndicator(typingId);
+                        bubble = addMessage('tutor', '').querySelector('.message-bubble');
+                    }
+                    reply += event.data.token;
+                    bubble.textContent = reply;
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                } else if (event.type === 'error') {
+                    throw new Error(event.data.detail);
+                }
+            }
+        }
+        
+        if (!bubble) throw new Error('Empty response');
         
     } catch (error) {
         removeTypingIndicator(typingId);
@@ -87,6 +116,19 @@ function addMessage(role, content) {
     
     chatMessages.appendChild(messageDiv);
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    return messageDiv;
+}
+
+// Parse one Server-Sent Event block into { type, data }
+function parseSseEvent(rawEvent) {
+    let type = 'message';
+    const dataLines = [];
+    for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event:')) type = line.slice(6).trim();
+        else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+    }
+    if (!dataLines.length) return null;
+    return { type, data: JSON.parse(dataLines.join('\n')) };
 }
 
 // Show typing indicator
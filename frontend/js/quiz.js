@@ -32,7 +32,8 @@ class QuizGenerator {
             topic: document.getElementById('quiz-topic').value,
             question_type: document.getElementById('question-type').value,
             difficulty: difficultyRadio ? difficultyRadio.value : 'medium',
-            num_questions: parseInt(document.getElementById('num-questions').value)
+            num_questions: parseInt(document.getElementById('num-questions').value),
+            student_id: this.studentId
         };
 
         setButtonLoading(this.generateButton, true);
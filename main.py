@@ -1,4 +1,8 @@
-from fastapi import FastAPI, HTTPException, Depends
+import asyncio
+import gzip
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from src.models.api_schemas import QuizSettings, QuizResponse, KnowledgeGraphRequest, KnowledgeGraphResponse, DailyProblemResponse, ChatRequest, ChatResponse
 from src.models.progress_schemas import QuizAttemptRequest, QuizAttemptResponse, AnalyticsResponse
@@ -9,14 +13,44 @@ from src.services.daily_problem_service import DailyProblemService
 from src.services.progress_service import ProgressService
 from src.services.chat_service import ChatService
 from src.services.gamification_service import GamificationService
-from src.database.database import get_db, init_db
+from src.services.question_bank_service import QuestionBankService
+from src.services.xp_ledger import xp_ledger
+from src.database.database import get_db, get_async_db, init_db, AsyncSessionLocal, async_engine
+from src.llm.groq_client import llm_registry, get_llm_pool_stats
+from src.llm.resilience import LLMUnavailableError, llm_call_budget
+from src.llm.admission import PRIORITY_INTERACTIVE, PRIORITY_STANDARD, set_llm_caller
+from src.config.settings import settings as app_settings
+from src.utils.generate_knowledge_graph import get_graph_cache_stats
 from src.common.custom_exception import CustomException
 from src.common.logger import get_logger
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-app = FastAPI(title="Studdy Buddy AI Backend", description="Backend services for Quiz Generation, Knowledge Graph, and Daily Problem.", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    stop_event = asyncio.Event()
+    workers = []
+    if app_settings.QUESTION_BANK_ENABLED:
+        workers.append(asyncio.create_task(question_bank_service.run_refill_worker(stop_event)))
+    if app_settings.DAILY_PROBLEM_PREGENERATE:
+        workers.append(asyncio.create_task(daily_problem_service.run_pregeneration_worker(stop_event)))
+    if app_settings.XP_LEDGER_WRITE_BEHIND:
+        workers.append(asyncio.create_task(xp_ledger.run_flush_worker(stop_event)))
+    yield
+    stop_event.set()
+    await asyncio.gather(*workers, return_exceptions=True)
+    await llm_registry.aclose()
+    await async_engine.dispose()
+
+app = FastAPI(title="Studdy Buddy AI Backend", description="Backend services for Quiz Generation, Knowledge Graph, and Daily Problem.", version="1.0.0", lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+
+@app.middleware("http")
+async def llm_budget_middleware(request: Request, call_next):
+    # Every LLM call made for this request, retries and concurrent quiz slots included, draws on one budget
+    with llm_call_budget():
+        return await call_next(request)
 init_db()
 
 quiz_service = QuizService()
@@ -25,11 +59,15 @@ daily_problem_service = DailyProblemService()
 progress_service = ProgressService()
 chat_service = ChatService()
 gamification_service = GamificationService()
+question_bank_service = QuestionBankService(quiz_service)
 logger = get_logger("FastAPI_Main")
 
 async def _handle_service_call(coro):
     try:
         return await coro
+    except LLMUnavailableError as e:
+        logger.warning(f"LLM unavailable: {e.error_message}")
+        raise HTTPException(status_code=503, detail="The AI service is temporarily unavailable, please try again shortly.")
     except CustomException as e:
         logger.error(f"Service Error: {e.error_message}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e.error_message))
@@ -37,44 +75,68 @@ async def _handle_service_call(coro):
         logger.error(f"Unexpected Error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="An unexpected error occurred in the service.")
 
+def _html_response(http_request: Request, html_content: str, compress: bool = True) -> Response:
+    """Raw HTML response, gzip-compressed when requested and the client accepts it."""
+    if not compress or "gzip" not in http_request.headers.get("accept-encoding", ""):
+        return HTMLResponse(content=html_content)
+    return Response(content=gzip.compress(html_content.encode("utf-8"), compresslevel=6), media_type="text/html", headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+
 @app.get("/", summary="Root Health Check")
 async def read_root():
     return {"message": "🤖 Studdy Buddy AI Backend is running! Navigate to /docs for API documentation."}
 
+@app.get("/llm/stats", summary="LLM Client Pool Statistics")
+def get_llm_stats():
+    return get_llm_pool_stats()
+
 @app.post("/quiz/generate", response_model=QuizResponse, summary="Generate a Quiz")
-async def generate_quiz_endpoint(settings: QuizSettings):
+async def generate_quiz_endpoint(settings: QuizSettings, db: AsyncSession = Depends(get_async_db)):
     logger.info(f"Generating quiz with settings: {settings.model_dump()}")
+    set_llm_caller(PRIORITY_STANDARD, settings.student_id)
+    if app_settings.QUESTION_BANK_ENABLED:
+        return await _handle_service_call(question_bank_service.serve_quiz(db, settings))
     return await _handle_service_call(quiz_service.generate_questions(settings))
 
 @app.post("/knowledge-graph/generate", response_model=KnowledgeGraphResponse, summary="Generate Knowledge Graph (HTML)")
-async def generate_knowledge_graph_endpoint(request: KnowledgeGraphRequest, student_id: str = None, db: Session = Depends(get_db)):
+async def generate_knowledge_graph_endpoint(request: KnowledgeGraphRequest, http_request: Request, student_id: str = None, response_format: str = "json", compress: bool = True, db: AsyncSession = Depends(get_async_db)):
+    """`response_format=json` returns base64 HTML in JSON; `response_format=html` returns the raw (optionally gzipped) HTML."""
     if not request.text and not request.topic:
         raise HTTPException(status_code=400, detail="Must provide either 'text' or 'topic'.")
-    result = await _handle_service_call(kg_service.create_knowledge_graph(request))
+    if response_format not in ("json", "html"):
+        raise HTTPException(status_code=400, detail="response_format must be 'json' or 'html'.")
+    set_llm_caller(PRIORITY_STANDARD, student_id)
+    if response_format == "html":
+        result = _html_response(http_request, await _handle_service_call(kg_service.render_knowledge_graph(request)), compress)
+    else:
+        result = await _handle_service_call(kg_service.create_knowledge_graph(request))
     if student_id:
         try:
-            gamification_service.award_xp(db, student_id, "graph_creation", f"Created graph for {request.topic or 'custom text'}")
-            gamification_service.check_and_award_badges(db, student_id)
+            await gamification_service.arecord_graph_creation(db, student_id, f"Created graph for {request.topic or 'custom text'}")
         except Exception:
             pass
     return result
 
 @app.post("/knowledge-graph/render", summary="Render Knowledge Graph HTML for testing")
-async def render_knowledge_graph_html(request: KnowledgeGraphRequest):
-    response = await _handle_service_call(kg_service.create_knowledge_graph(request))
-    return HTMLResponse(content=response.html_content)
+async def render_knowledge_graph_html(request: KnowledgeGraphRequest, http_request: Request):
+    html_content = await _handle_service_call(kg_service.render_knowledge_graph(request))
+    return _html_response(http_request, html_content)
+
+@app.get("/knowledge-graph/cache/stats", summary="Knowledge Graph Cache Statistics")
+def get_knowledge_graph_cache_stats():
+    return get_graph_cache_stats()
 
 @app.get("/daily-problem", response_model=DailyProblemResponse, summary="Get the Daily Challenging Problem")
-async def get_daily_problem_endpoint():
-    return await _handle_service_call(daily_problem_service.get_daily_problem())
+async def get_daily_problem_endpoint(db: AsyncSession = Depends(get_async_db)):
+    return await _handle_service_call(daily_problem_service.get_daily_problem(db))
 
 @app.post("/daily-problem/submit", summary="Submit Daily Problem Answer")
 def submit_daily_problem(student_id: str, is_correct: bool, db: Session = Depends(get_db)):
     try:
-        if is_correct:
-            gamification_service.award_xp(db, student_id, "daily_problem", "Solved daily problem")
-        gamification_service.update_streak(db, student_id)
-        gamification_service.check_and_award_badges(db, student_id)
+        with gamification_service.unit_of_work(db, student_id):
+            if is_correct:
+                gamification_service.award_xp(db, student_id, "daily_problem", "Solved daily problem", commit=False)
+            gamification_service.update_streak(db, student_id, commit=False)
+            gamification_service.check_and_award_badges(db, student_id, commit=False)
         return {"success": True, "message": "Daily problem recorded"}
     except Exception as e:
         logger.error(f"Failed to record daily problem: {str(e)}")
@@ -83,13 +145,15 @@ def submit_daily_problem(student_id: str, is_correct: bool, db: Session = Depend
 @app.post("/progress/record", response_model=QuizAttemptResponse, summary="Record Quiz Attempt")
 def record_progress_endpoint(attempt: QuizAttemptRequest, db: Session = Depends(get_db)):
     try:
-        result = progress_service.record_quiz_attempt(db, attempt)
+        # One transaction for the attempt, XP, streak and badges
+        with gamification_service.unit_of_work(db, attempt.student_id):
+            result = progress_service.record_quiz_attempt(db, attempt, commit=False)
+            gamification_service.award_xp(db, attempt.student_id, "quiz_completion", f"Completed quiz: {attempt.topic}", commit=False)
+            if result['accuracy'] == 100:
+                gamification_service.award_xp(db, attempt.student_id, "perfect_quiz", "Perfect score on quiz!", commit=False)
+            gamification_service.update_streak(db, attempt.student_id, commit=False)
+            gamification_service.check_and_award_badges(db, attempt.student_id, commit=False)
         logger.info(f"Recorded quiz attempt for student {attempt.student_id}: {result['accuracy']}% accuracy")
-        gamification_service.award_xp(db, attempt.student_id, "quiz_completion", f"Completed quiz: {attempt.topic}")
-        if result['accuracy'] == 100:
-            gamification_service.award_xp(db, attempt.student_id, "perfect_quiz", "Perfect score on quiz!")
-        gamification_service.update_streak(db, attempt.student_id)
-        gamification_service.check_and_award_badges(db, attempt.student_id)
         return result
     except Exception as e:
         logger.error(f"Failed to record progress: {str(e)}")
@@ -105,8 +169,13 @@ def get_analytics_endpoint(student_id: str, db: Session = Depends(get_db)):
         logger.error(f"Failed to retrieve analytics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/progress/questions/hardest", summary="Questions Students Miss Most Often")
+def get_hardest_questions_endpoint(limit: int = 10, min_answers: int = 5, db: Session = Depends(get_db)):
+    return progress_service.get_hardest_questions(db, limit=limit, min_answers=min_answers)
+
 @app.get("/progress/analytics/{student_id}/ai", response_model=AnalyticsResponse, summary="Get Student Analytics with AI Feedback")
-async def get_analytics_with_ai_endpoint(student_id: str, db: Session = Depends(get_db)):
+async def get_analytics_with_ai_endpoint(student_id: str, db: AsyncSession = Depends(get_async_db)):
+    set_llm_caller(PRIORITY_STANDARD, student_id)
     try:
         result = await progress_service.get_student_analytics_with_ai_feedback(db, student_id)
         logger.info(f"Retrieved AI-enhanced analytics for student {student_id}")
@@ -116,31 +185,89 @@ async def get_analytics_with_ai_endpoint(student_id: str, db: Session = Depends(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/chat/message", response_model=ChatResponse, summary="Send Message to AI Tutor")
-async def chat_message_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
-    conv_id = chat_service.create_or_get_conversation(db, request.student_id, request.conversation_id)
-    chat_service.add_message_to_history(db, conv_id, "student", request.message)
+async def chat_message_endpoint(request: ChatRequest, db: AsyncSession = Depends(get_async_db)):
+    set_llm_caller(PRIORITY_INTERACTIVE, request.student_id)
+    conv_id = await chat_service.astart_turn(db, request.student_id, request.conversation_id, request.message)
+    await gamification_service.arecord_chat_message(db, request.student_id)
     tutor_reply = await chat_service.get_tutor_response(db, conv_id, request.message)
-    chat_service.add_message_to_history(db, conv_id, "tutor", tutor_reply)
-    history = chat_service.format_conversation_context(db, conv_id)
+    await chat_service.aadd_message_to_history(db, conv_id, "tutor", tutor_reply)
+    chat_service.schedule_summary_refresh(conv_id)
+    history = await chat_service.aformat_conversation_context(db, conv_id)
     return ChatResponse(reply=tutor_reply, conversation_id=conv_id, message_history=history)
 
+async def _persist_tutor_reply(conversation_id: str, reply: str):
+    async with AsyncSessionLocal() as db:
+        await chat_service.aadd_message_to_history(db, conversation_id, "tutor", reply)
+    chat_service.schedule_summary_refresh(conversation_id)
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream", summary="Stream AI Tutor Reply (Server-Sent Events)")
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Streams `start`, `token`... and `done` (or `error`) events; the tutor message is persisted when the stream ends."""
+    # Set for the rest of this request's context, which the streamed body below runs in
+    set_llm_caller(PRIORITY_INTERACTIVE, request.student_id)
+    conv_id = await chat_service.astart_turn(db, request.student_id, request.conversation_id, request.message)
+    await gamification_service.arecord_chat_message(db, request.student_id)
+    prompt = await chat_service.abuild_tutor_prompt(db, conv_id)
+    # The stream never touches this session again, so hand its connection back before the LLM starts
+    await db.commit()
+
+    async def event_stream():
+        tokens = []
+        disconnected = False
+        try:
+            yield _sse_event("start", {"conversation_id": conv_id})
+            async for token in chat_service.stream_tutor_response(prompt):
+                if await http_request.is_disconnected():
+                    disconnected = True
+                    break
+                tokens.append(token)
+                yield _sse_event("token", {"token": token})
+            if not disconnected:
+                yield _sse_event("done", {"conversation_id": conv_id, "reply": "".join(tokens)})
+        except asyncio.CancelledError:
+            disconnected = True
+            raise
+        except Exception as e:
+            logger.error(f"Tutor stream failed for conversation {conv_id}: {str(e)}", exc_info=True)
+            yield _sse_event("error", {"detail": "An unexpected error occurred in the service."})
+        finally:
+            if disconnected:
+                logger.info(f"Client disconnected from conversation {conv_id} after {len(tokens)} tokens")
+            if tokens:
+                # Persist what the student actually received, on a session owned by the stream; shielded so
+                # the write still completes while a disconnect is cancelling the stream
+                await asyncio.shield(_persist_tutor_reply(conv_id, "".join(tokens)))
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/chat/stats", summary="Tutor Context Cache and Prompt Size Statistics")
+def get_chat_stats():
+    return chat_service.get_stats()
+
 @app.get("/chat/history/{conversation_id}", response_model=ChatResponse, summary="Get Conversation History")
-async def get_chat_history_endpoint(conversation_id: str, db: Session = Depends(get_db)):
-    history = chat_service.format_conversation_context(db, conversation_id)
+async def get_chat_history_endpoint(conversation_id: str, db: AsyncSession = Depends(get_async_db)):
+    history = await chat_service.aformat_conversation_context(db, conversation_id)
     return ChatResponse(reply="", conversation_id=conversation_id, message_history=history)
 
 @app.post("/auth/login", summary="Track Daily Login and Update Streak")
 def daily_login_endpoint(student_id: str, db: Session = Depends(get_db)):
     try:
-        gamification_service.get_or_create_profile(db, student_id)
-        streak_result = gamification_service.update_streak(db, student_id)
-        if streak_result["streak_status"] != "already_counted":
-            gamification_service.award_xp(db, student_id, "daily_login", "Daily Login Bonus")
+        with gamification_service.unit_of_work(db, student_id):
+            streak_result = gamification_service.update_streak(db, student_id, commit=False)
+            if streak_result["streak_status"] != "already_counted":
+                gamification_service.award_xp(db, student_id, "daily_login", "Daily Login Bonus", commit=False)
         return {"success": True, "streak": streak_result, "message": f"Welcome back! Current streak: {streak_result['current_streak']} days"}
     except Exception as e:
         logger.error(f"Failed to track login: {str(e)}")
         return {"success": False, "message": "Login tracked but gamification update failed"}
 
+@app.get("/gamification/ledger/stats", summary="XP Ledger Write-Behind Queue Statistics")
+def get_xp_ledger_stats():
+    return xp_ledger.get_stats()
+
 @app.get("/gamification/{student_id}", response_model=GamificationProfile, summary="Get Student Gamification Profile")
 def get_gamification_profile(student_id: str, db: Session = Depends(get_db)):
     try:
@@ -157,17 +284,12 @@ def get_gamification_profile(student_id: str, db: Session = Depends(get_db)):
 @app.get("/leaderboard", response_model=LeaderboardResponse, summary="Get Leaderboard")
 def get_leaderboard(limit: int = 10, student_id: str = None, db: Session = Depends(get_db)):
     try:
-        from src.database.models import StudentGamification
         if student_id:
             gamification_service.get_or_create_profile(db, student_id)
-        all_students = db.query(StudentGamification).order_by(StudentGamification.total_xp.desc()).all()
-        if not all_students:
-            return LeaderboardResponse(entries=[], total_students=0, current_user_rank=None)
-        top_students = all_students[:limit]
-        entries = [LeaderboardEntry(rank=idx+1, student_id=s.student_id, display_name=f"Student {s.student_id[-8:]}", total_xp=s.total_xp, level=s.level, badge_count=len(s.badges), is_current_user=(s.student_id == student_id)) for idx, s in enumerate(top_students)]
-        current_rank = next((idx+1 for idx, s in enumerate(all_students) if s.student_id == student_id), None) if student_id else None
+        leaderboard = gamification_service.get_leaderboard(db, limit, student_id)
+        entries = [LeaderboardEntry(**entry) for entry in leaderboard["entries"]]
         logger.info(f"Retrieved leaderboard with {len(entries)} entries")
-        return LeaderboardResponse(entries=entries, total_students=len(all_students), current_user_rank=current_rank)
+        return LeaderboardResponse(entries=entries, total_students=leaderboard["total_students"], current_user_rank=leaderboard["current_user_rank"])
     except Exception as e:
         logger.error(f"Failed to get leaderboard: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
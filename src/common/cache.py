@@ -0,0 +1,173 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+
+def _default_sizeof(value: Any) -> int:
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return 0
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with optional TTL and byte budget, plus hit/miss counters."""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: Optional[float] = None, max_bytes: Optional[int] = None, sizeof: Callable[[Any], int] = _default_sizeof):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"entries": len(self._data), "bytes": self._bytes, "hits": self.hits, "misses": self.misses, "evictions": self.evictions, "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+
+class SQLiteCache:
+    """
+    Persistent key/value cache in a standalone SQLite file with TTL and size-based (least recently used) eviction.
+    The byte total is read once on open and then kept as a running count, so writes never sum the whole table; with
+    several processes on one file each count only sees its own writes until it reopens.
+    """
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_last_access ON cache_entries (last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_created_at ON cache_entries (created_at)")
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM cache_entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.ttl_seconds and created_at + self.ttl_seconds < now:
+                self._delete(key)
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE cache_entries SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: bytes):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        if self.max_bytes is not None and len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._delete(key)
+            self._conn.execute("INSERT INTO cache_entries (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)", (key, value, len(value), now, now))
+            self._bytes += len(value)
+            self._evict(now)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries")
+            self._bytes = 0
+
+    def _delete(self, key: str):
+        row = self._conn.execute("SELECT size FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            self._bytes -= row[0]
+
+    def _evict(self, now: float):
+        if self.ttl_seconds:
+            cutoff = now - self.ttl_seconds
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE created_at < ?", (cutoff,)).fetchone()
+            if count:
+                self._conn.execute("DELETE FROM cache_entries WHERE created_at < ?", (cutoff,))
+                self._bytes -= size
+                self.evictions += count
+        if self.max_bytes is None:
+            return
+        while self._bytes > self.max_bytes:
+            row = self._conn.execute("SELECT key FROM cache_entries ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                self._bytes = 0
+                break
+            self._delete(row[0])
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+        lookups = self.hits + self.misses
+        return {"entries": entries, "bytes": total, "hits": self.hits, "misses": self.misses, "evictions": self.evictions, "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
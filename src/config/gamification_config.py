@@ -27,6 +27,12 @@ BADGE_DEFINITIONS = {
     "CHAT_ENTHUSIAST": {"name": "Chat Enthusiast", "description": "Have 50 chat interactions", "criteria": {"chat_count": 50}},
 }
 
+# Badge ids keyed by each stat their criteria reference, so a stat change only re-checks the badges it can affect
+BADGES_BY_STAT: dict[str, list[str]] = {}
+for _badge_id, _badge in BADGE_DEFINITIONS.items():
+    for _stat in _badge["criteria"]:
+        BADGES_BY_STAT.setdefault(_stat, []).append(_badge_id)
+
 # Level Thresholds (XP required for each level)
 LEVEL_THRESHOLDS = [
     0,      # Level 1: 0-99 XP
@@ -55,12 +61,18 @@ def get_level_from_xp(xp: int) -> int:
     return 1
 
 
-def check_badge_eligibility(stats: dict) -> list[str]:
-    """Check which badges the student is eligible for based on their stats"""
-    return [badge_id for badge_id, badge in BADGE_DEFINITIONS.items() 
+def check_badge_eligibility(stats: dict, badge_ids: list[str] = None) -> list[str]:
+    """Check which badges the student is eligible for based on their stats, optionally limited to `badge_ids`"""
+    candidates = BADGE_DEFINITIONS if badge_ids is None else {badge_id: BADGE_DEFINITIONS[badge_id] for badge_id in badge_ids}
+    return [badge_id for badge_id, badge in candidates.items()
             if all(stats.get(key, 0) >= value for key, value in badge["criteria"].items())]
 
 
+def badges_for_stats(changed_stats) -> list[str]:
+    """Badge ids whose criteria reference any of the changed stats"""
+    return list(dict.fromkeys(badge_id for stat in changed_stats for badge_id in BADGES_BY_STAT.get(stat, [])))
+
+
 def get_xp_for_next_level(current_xp: int) -> int:
     """Calculate XP needed to reach the next level"""
     current_level = get_level_from_xp(current_xp)
@@ -1,4 +1,5 @@
 import os
+import warnings
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -6,9 +7,15 @@ load_dotenv()
 class Settings():
 
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-    
-    if not GROQ_API_KEY:
-        raise ValueError("GROQ_API_KEY environment variable is not set. Please set it in your .env file.")
+
+    # LLM backend: "groq" calls the Groq API, "fake" serves synthetic responses offline,
+    # "record" calls Groq and appends every completion to LLM_FIXTURES_PATH, and "replay"
+    # serves those recordings (synthetic responses for prompts that were never recorded).
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "groq").lower()
+
+    if not GROQ_API_KEY and LLM_BACKEND in ("groq", "record"):
+        # Fail on the first LLM call rather than at import so the rest of the API still starts
+        warnings.warn("GROQ_API_KEY environment variable is not set. Please set it in your .env file, or use LLM_BACKEND=fake to run offline.")
 
     # Recommended models for AI tutor (in order of quality):
     # 1. "llama-3.3-70b-versatile" - Best quality, latest knowledge (Dec 2024)
@@ -22,5 +29,190 @@ class Settings():
 
     MAX_RETRIES = 3
 
+    # Shared HTTP connection pool used by every LLM client (see src/llm/groq_client.py)
+    LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20"))
+
+    LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10"))
+
+    LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "60"))
+
+    LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+
+    LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+
+    # LLM retry policy (src/llm/resilience.py): transient provider errors are retried up to LLM_RETRY_MAX_ATTEMPTS
+    # times per call with full-jitter exponential backoff; each API request may make at most LLM_REQUEST_MAX_CALLS
+    # LLM calls (retries included) within LLM_REQUEST_MAX_SECONDS
+    LLM_RETRY_MAX_ATTEMPTS = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3"))
+
+    LLM_RETRY_BASE_DELAY_SECONDS = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "0.5"))
+
+    LLM_RETRY_MAX_DELAY_SECONDS = float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", "8"))
+
+    LLM_REQUEST_MAX_CALLS = int(os.getenv("LLM_REQUEST_MAX_CALLS", "30"))
+
+    LLM_REQUEST_MAX_SECONDS = float(os.getenv("LLM_REQUEST_MAX_SECONDS", "90"))
+
+    # Process-wide circuit breaker: opens when LLM_BREAKER_ERROR_RATE of the calls in the last
+    # LLM_BREAKER_WINDOW_SECONDS failed (with at least LLM_BREAKER_MIN_CALLS), fails fast for the cooldown, then probes
+    LLM_BREAKER_WINDOW_SECONDS = float(os.getenv("LLM_BREAKER_WINDOW_SECONDS", "30"))
+
+    LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "20"))
+
+    LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+
+    LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "15"))
+
+    # Outbound LLM admission control (src/llm/admission.py): calls queue by priority and per-student fairness to stay
+    # under the provider's per-minute limits. On by default only for backends that call the provider.
+    LLM_ADMISSION_ENABLED = os.getenv("LLM_ADMISSION_ENABLED", "true" if LLM_BACKEND in ("groq", "record") else "false").lower() == "true"
+
+    LLM_RATE_LIMIT_RPM = float(os.getenv("LLM_RATE_LIMIT_RPM", "30"))
+
+    LLM_RATE_LIMIT_TPM = float(os.getenv("LLM_RATE_LIMIT_TPM", "12000"))
+
+    # Completion tokens assumed per call when charging the tokens/min bucket; corrected once the provider reports usage
+    LLM_ADMISSION_COMPLETION_TOKENS = int(os.getenv("LLM_ADMISSION_COMPLETION_TOKENS", "400"))
+
+    # LLM response cache for calls at or below LLM_CACHE_MAX_TEMPERATURE: in-memory LRU over an optional
+    # SQLite file (LLM_CACHE_PATH, empty for memory only)
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+
+    LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.2"))
+
+    LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "512"))
+
+    LLM_CACHE_MEMORY_MAX_BYTES = int(os.getenv("LLM_CACHE_MEMORY_MAX_BYTES", str(16 * 1024 * 1024)))
+
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./cache/llm_responses.db")
+
+    LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+    LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    # Offline backends (LLM_BACKEND=fake/replay); latency in milliseconds per completion,
+    # distribution one of "fixed", "uniform", "normal", "lognormal"
+    FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "800"))
+
+    FAKE_LLM_LATENCY_JITTER_MS = float(os.getenv("FAKE_LLM_LATENCY_JITTER_MS", "300"))
+
+    FAKE_LLM_LATENCY_DISTRIBUTION = os.getenv("FAKE_LLM_LATENCY_DISTRIBUTION", "lognormal")
+
+    FAKE_LLM_FAILURE_RATE = float(os.getenv("FAKE_LLM_FAILURE_RATE", "0"))
+
+    FAKE_LLM_GARBAGE_RATE = float(os.getenv("FAKE_LLM_GARBAGE_RATE", "0"))
+
+    FAKE_LLM_SEED = int(os.environ["FAKE_LLM_SEED"]) if os.getenv("FAKE_LLM_SEED") else None
+
+    LLM_FIXTURES_PATH = os.getenv("LLM_FIXTURES_PATH", "./fixtures/llm_responses.jsonl")
+
+    # Replay recorded latencies instead of sampling FAKE_LLM_LATENCY_*
+    LLM_REPLAY_LATENCY = os.getenv("LLM_REPLAY_LATENCY", "true").lower() == "true"
+
+    # Quiz generation: "sequential" awaits one question at a time, "concurrent" fans out
+    # the per-question LLM calls as asyncio tasks capped by QUIZ_MAX_CONCURRENCY, and
+    # "batch" asks for all questions in a single JSON-array completion.
+    QUIZ_GENERATION_MODE = os.getenv("QUIZ_GENERATION_MODE", "concurrent")
+
+    QUIZ_MAX_CONCURRENCY = int(os.getenv("QUIZ_MAX_CONCURRENCY", "4"))
+
+    QUIZ_MAX_ATTEMPTS_PER_QUESTION = 5
+
+    # Near-duplicate questions: Jaccard similarity of key terms above which a question counts as a repeat, and how many
+    # (student, topic) histories of served questions stay indexed in memory (rebuilt from the database on a miss)
+    QUIZ_SIMILARITY_THRESHOLD = float(os.getenv("QUIZ_SIMILARITY_THRESHOLD", "0.7"))
+
+    QUIZ_HISTORY_INDEX_SCOPES = int(os.getenv("QUIZ_HISTORY_INDEX_SCOPES", "1000"))
+
+    # Pre-generated question bank, keyed by (topic, difficulty, question_type)
+    QUESTION_BANK_ENABLED = os.getenv("QUESTION_BANK_ENABLED", "true").lower() == "true"
+
+    QUESTION_BANK_LOW_WATER = int(os.getenv("QUESTION_BANK_LOW_WATER", "30"))
+
+    QUESTION_BANK_HIGH_WATER = int(os.getenv("QUESTION_BANK_HIGH_WATER", "60"))
+
+    QUESTION_BANK_MAX_PER_BUCKET = int(os.getenv("QUESTION_BANK_MAX_PER_BUCKET", "500"))
+
+    QUESTION_BANK_POPULAR_BUCKETS = int(os.getenv("QUESTION_BANK_POPULAR_BUCKETS", "40"))
+
+    QUESTION_BANK_REFILL_BATCH = 10
+
+    QUESTION_BANK_REFILL_INTERVAL_SECONDS = float(os.getenv("QUESTION_BANK_REFILL_INTERVAL_SECONDS", "60"))
+
+    # Daily problem: generated once per UTC day; optionally pre-generated ahead of the rollover
+    DAILY_PROBLEM_PREGENERATE = os.getenv("DAILY_PROBLEM_PREGENERATE", "true").lower() == "true"
+
+    DAILY_PROBLEM_PREGENERATE_MINUTES = int(os.getenv("DAILY_PROBLEM_PREGENERATE_MINUTES", "30"))
+
+    # Knowledge graph cache: in-memory LRU of rendered HTML over a SQLite store of extracted graphs
+    KG_CACHE_ENABLED = os.getenv("KG_CACHE_ENABLED", "true").lower() == "true"
+
+    KG_CACHE_MEMORY_ENTRIES = int(os.getenv("KG_CACHE_MEMORY_ENTRIES", "128"))
+
+    KG_CACHE_PATH = os.getenv("KG_CACHE_PATH", "./cache/knowledge_graphs.db")
+
+    KG_CACHE_TTL_SECONDS = float(os.getenv("KG_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+    KG_CACHE_MAX_BYTES = int(os.getenv("KG_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+    # Top-N leaderboard page cache; ranks may lag XP changes by up to this many seconds
+    LEADERBOARD_CACHE_TTL_SECONDS = float(os.getenv("LEADERBOARD_CACHE_TTL_SECONDS", "10"))
+
+    # Database engine. sqlite:///... gets the tuned SQLite profile (WAL, synchronous=NORMAL, mmap, busy
+    # timeout); postgresql+psycopg://... gets a pre-pinged connection pool. DB_ECHO logs every statement.
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./studdy_buddy.db")
+
+    DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+
+    # XP ledger: xp_transactions rows are queued after the awarding transaction commits and bulk-inserted by a
+    # background worker every XP_LEDGER_FLUSH_INTERVAL_SECONDS or once XP_LEDGER_BATCH_SIZE are waiting.
+    # Entries still queued when the process dies are lost (balances are not); set XP_LEDGER_WRITE_BEHIND=false to insert inline
+    XP_LEDGER_WRITE_BEHIND = os.getenv("XP_LEDGER_WRITE_BEHIND", "true").lower() == "true"
+
+    XP_LEDGER_BATCH_SIZE = int(os.getenv("XP_LEDGER_BATCH_SIZE", "200"))
+
+    XP_LEDGER_FLUSH_INTERVAL_SECONDS = float(os.getenv("XP_LEDGER_FLUSH_INTERVAL_SECONDS", "1.0"))
+
+    # Failed flushes of a batch before its entries are written one by one and the ones that still fail are dropped (logged)
+    XP_LEDGER_MAX_RETRIES = int(os.getenv("XP_LEDGER_MAX_RETRIES", "5"))
+
+    # Queue length past which new entries are inserted inline instead of queued
+    XP_LEDGER_MAX_QUEUED = int(os.getenv("XP_LEDGER_MAX_QUEUED", "10000"))
+
+    # Tutor chat: messages of context per prompt, and how many conversations keep them cached in memory
+    # (per process; 0 disables the cache, e.g. for multi-worker deployments without sticky sessions)
+    CHAT_CONTEXT_MESSAGES = int(os.getenv("CHAT_CONTEXT_MESSAGES", "10"))
+
+    CHAT_CONTEXT_CACHE_CONVERSATIONS = int(os.getenv("CHAT_CONTEXT_CACHE_CONVERSATIONS", "1000"))
+
+    # Tutor prompt budget (estimated tokens, system prompt included); a single message is clipped to
+    # CHAT_MESSAGE_TOKEN_LIMIT, and turns that no longer fit are folded into a rolling summary
+    CHAT_PROMPT_TOKEN_BUDGET = int(os.getenv("CHAT_PROMPT_TOKEN_BUDGET", "2000"))
+
+    CHAT_MESSAGE_TOKEN_LIMIT = int(os.getenv("CHAT_MESSAGE_TOKEN_LIMIT", "600"))
+
+    CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+
+    # Recent messages left verbatim after a summary refresh, so refreshes happen every few turns rather than every turn
+    CHAT_SUMMARY_KEEP_MESSAGES = int(os.getenv("CHAT_SUMMARY_KEEP_MESSAGES", "4"))
+
+    # Per-student AI feedback cache, keyed by a fingerprint of the analytics it was generated from
+    FEEDBACK_CACHE_ENTRIES = int(os.getenv("FEEDBACK_CACHE_ENTRIES", "2048"))
+
 
-settings = Settings()  
\ No newline at end of file
+settings = Settings()
\ No newline at end of file
@@ -0,0 +1,38 @@
+from sqlalchemy import case, func, update
+from sqlalchemy.orm import Session
+from src.database.database import engine, init_db
+from src.database.models import StudentGamification, StudentQuizAttempt, XPTransaction, ChatMessageDB, Conversation
+from src.services.gamification_service import GamificationService
+
+def run_backfill(award_badges: bool = True):
+    """One-off: recompute the denormalized badge counters on student_gamification from the history tables"""
+    init_db()
+    with Session(engine) as db:
+        quizzes = {sid: (completed, perfect) for sid, completed, perfect in db.query(
+            StudentQuizAttempt.student_id, func.count(StudentQuizAttempt.id),
+            func.sum(case((StudentQuizAttempt.correct_count == StudentQuizAttempt.total_questions, 1), else_=0))
+        ).group_by(StudentQuizAttempt.student_id)}
+        graphs = dict(db.query(XPTransaction.student_id, func.count(XPTransaction.id)).filter(XPTransaction.activity_type == "graph_creation").group_by(XPTransaction.student_id))
+        chats = dict(db.query(Conversation.student_id, func.count(ChatMessageDB.id)).join(ChatMessageDB).filter(ChatMessageDB.role == "student").group_by(Conversation.student_id))
+
+        student_ids = [sid for (sid,) in db.query(StudentGamification.student_id)]
+        rows = [{
+            "student_id": sid,
+            "quizzes_completed": quizzes.get(sid, (0, 0))[0],
+            "perfect_quizzes": quizzes.get(sid, (0, 0))[1] or 0,
+            "graphs_created": graphs.get(sid, 0),
+            "chat_count": chats.get(sid, 0),
+        } for sid in student_ids]
+        if rows:
+            db.execute(update(StudentGamification), rows)
+        db.commit()
+        print(f"✅ Backfilled badge counters for {len(rows)} students")
+
+        if award_badges:
+            # Badge checks now only look at stats that just changed, so award anything already earned once
+            service = GamificationService()
+            awarded = sum(len(service.check_and_award_badges(db, sid, changed_stats=None)["new_badges"]) for sid in student_ids)
+            print(f"✅ Awarded {awarded} badges earned before the backfill")
+
+if __name__ == "__main__":
+    run_backfill()
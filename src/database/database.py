@@ -1,13 +1,81 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from src.database.models import Base
+from sqlalchemy.pool import StaticPool
+from src.database.migrations import run_migrations
+from src.config.settings import settings
 
-DATABASE_URL = "sqlite:///./studdy_buddy.db"
-engine = create_engine(DATABASE_URL, echo=True)
+DATABASE_URL = settings.DATABASE_URL
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the single writer; NORMAL only fsyncs at checkpoints in WAL mode
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def _engine_options(url: str) -> dict:
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}}
+        if url.split("://", 1)[1] in ("", "/:memory:"):
+            options["poolclass"] = StaticPool
+        else:
+            # SQLite has one writer at a time, so a large pool only adds lock contention
+            options.update(pool_size=settings.DB_POOL_SIZE, max_overflow=0, pool_timeout=settings.DB_POOL_TIMEOUT)
+        return options
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+def create_db_engine(url: str = DATABASE_URL, tuned: bool = True, echo: bool = settings.DB_ECHO) -> Engine:
+    """Builds the engine profile for the URL's backend; tuned=False gives SQLAlchemy defaults (used for benchmarking)."""
+    if not tuned:
+        return create_engine(url, echo=echo)
+    sync_engine = create_engine(url, echo=echo, **_engine_options(url))
+    if url.startswith("sqlite"):
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+    return sync_engine
+
+def async_database_url(url: str) -> str:
+    """Maps the configured URL onto an asyncio driver: aiosqlite for SQLite, psycopg (async mode) for PostgreSQL."""
+    scheme, rest = url.split("://", 1)
+    if scheme in ("sqlite", "sqlite+pysqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    if scheme in ("postgresql", "postgresql+psycopg2"):
+        return f"postgresql+psycopg://{rest}"
+    return url
+
+def create_async_db_engine(url: str = DATABASE_URL, echo: bool = settings.DB_ECHO) -> AsyncEngine:
+    async_url = async_database_url(url)
+    options = _engine_options(url)
+    if options.get("poolclass") is StaticPool:
+        # An in-memory database would be a different database per engine, so share nothing here
+        options.pop("poolclass")
+    async_engine = create_async_engine(async_url, echo=echo, **options)
+    if url.startswith("sqlite"):
+        event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return async_engine
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Used by async endpoints so database I/O does not block the event loop. Service code stays synchronous and runs
+# against the AsyncSession's underlying Session through AsyncSession.run_sync.
+async_engine = create_async_db_engine()
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    """Creates or upgrades the schema through the versioned migrations in src/database/migrations."""
+    run_migrations(engine)
 
 def get_db():
     db = SessionLocal()
@@ -15,3 +83,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,13 +1,13 @@
 from src.database.database import engine
-from src.database.models import Base
+from src.database.migrations import run_migrations
 
 def run_migration():
-    """Create gamification tables in the database"""
-    Base.metadata.create_all(bind=engine)
-    print("✅ Gamification tables created successfully!")
-    print("   - student_gamification")
-    print("   - student_badges")
-    print("   - xp_transactions")
+    """Bring the database schema (gamification tables included) up to the latest migration"""
+    applied = run_migrations(engine)
+    if applied:
+        print(f"✅ Applied migrations: {', '.join(str(version) for version in applied)}")
+    else:
+        print("✅ Database schema is up to date")
 
 if __name__ == "__main__":
     run_migration()
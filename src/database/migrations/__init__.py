@@ -0,0 +1,46 @@
+"""
+Versioned schema migrations. Each vNNN_*.py module defines VERSION, DESCRIPTION and upgrade(conn); run_migrations
+applies the ones newer than the database's schema_version, in order, each in its own transaction. Add new
+migrations to MIGRATIONS and keep them idempotent (see ops), since a new database is built by create_all at v1.
+"""
+from datetime import datetime
+from typing import List
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from src.common.logger import get_logger
+from src.database.migrations import v001_baseline, v002_hot_path_indexes, v003_question_store
+
+logger = get_logger("Migrations")
+
+MIGRATIONS = [v001_baseline, v002_hot_path_indexes, v003_question_store]
+
+schema_version = Table(
+    "schema_version", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def applied_versions(bind: Engine) -> set:
+    schema_version.create(bind, checkfirst=True)
+    with bind.connect() as conn:
+        return set(conn.execute(select(schema_version.c.version)).scalars())
+
+def run_migrations(bind: Engine) -> List[int]:
+    """Brings the database up to the latest version and returns the versions applied."""
+    applied, done = applied_versions(bind), []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.VERSION):
+        if migration.VERSION in applied:
+            continue
+        try:
+            with bind.begin() as conn:
+                migration.upgrade(conn)
+                conn.execute(insert(schema_version).values(version=migration.VERSION, description=migration.DESCRIPTION, applied_at=datetime.utcnow()))
+        except IntegrityError:
+            # Another process starting at the same time recorded this version first
+            logger.info(f"Migration {migration.VERSION} was applied concurrently")
+            continue
+        logger.info(f"Applied migration {migration.VERSION}: {migration.DESCRIPTION}")
+        done.append(migration.VERSION)
+    return done
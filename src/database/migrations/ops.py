@@ -0,0 +1,53 @@
+from typing import Optional
+from sqlalchemy import Table, inspect, text
+from sqlalchemy.engine import Connection
+from src.database.models import Base
+
+# Small idempotent DDL helpers for migrations. Each one checks the live schema first, so a migration can run against
+# a database that create_all already built at the latest schema as well as one that predates it. Helpers that build
+# DDL from a table definition take the migration's own frozen Table; the current model is only the default, for
+# migrations whose change the model still matches exactly.
+
+def add_column(conn: Connection, table_name: str, column_name: str, table: Optional[Table] = None):
+    """Adds a declared column. It needs a server default or must be nullable to be added to existing rows."""
+    if column_name in {column["name"] for column in inspect(conn).get_columns(table_name)}:
+        return
+    column = (table if table is not None else Base.metadata.tables[table_name]).c[column_name]
+    ddl = f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    conn.execute(text(ddl))
+
+def create_index(conn: Connection, index_name: str):
+    """Creates an index declared on the models, looked up by name."""
+    index = next(index for table in Base.metadata.tables.values() for index in table.indexes if index.name == index_name)
+    index.create(bind=conn, checkfirst=True)
+
+def drop_index(conn: Connection, index_name: str):
+    conn.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+
+def drop_not_null(conn: Connection, table_name: str, *column_names: str, table: Optional[Table] = None):
+    live = {column["name"]: column for column in inspect(conn).get_columns(table_name)}
+    if all(live[name]["nullable"] for name in column_names):
+        return
+    if conn.dialect.name != "sqlite":
+        for name in column_names:
+            conn.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {name} DROP NOT NULL"))
+        return
+    rebuild_table(conn, table_name, table)
+
+def rebuild_table(conn: Connection, table_name: str, table: Optional[Table] = None):
+    """SQLite cannot alter a column, so recreate the table (and its indexes) from its definition and copy the rows over."""
+    inspector = inspect(conn)
+    live_columns = [column["name"] for column in inspector.get_columns(table_name)]
+    live_indexes = [index["name"] for index in inspector.get_indexes(table_name)]
+    table = table if table is not None else Base.metadata.tables[table_name]
+    conn.execute(text(f"ALTER TABLE {table_name} RENAME TO _{table_name}_old"))
+    for index_name in live_indexes:
+        drop_index(conn, index_name)
+    table.create(bind=conn)
+    columns = ", ".join(name for name in live_columns if name in table.c)
+    conn.execute(text(f"INSERT INTO {table_name} ({columns}) SELECT {columns} FROM _{table_name}_old"))
+    conn.execute(text(f"DROP TABLE _{table_name}_old"))
@@ -0,0 +1,15 @@
+from sqlalchemy.engine import Connection
+from src.database.models import Base
+from src.database.migrations import ops
+
+VERSION = 1
+DESCRIPTION = "Baseline: create missing tables, plus the columns and index added in place before versioned migrations"
+
+def upgrade(conn: Connection):
+    # Only creates tables that do not exist yet; a new database gets the latest schema here and later migrations no-op
+    Base.metadata.create_all(bind=conn)
+    for column in ("quizzes_completed", "perfect_quizzes", "graphs_created", "chat_count"):
+        ops.add_column(conn, "student_gamification", column)
+    ops.add_column(conn, "conversations", "summary")
+    ops.add_column(conn, "conversations", "summarized_message_count")
+    ops.create_index(conn, "ix_student_gamification_total_xp")
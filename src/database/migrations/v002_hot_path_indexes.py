@@ -0,0 +1,35 @@
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.engine import Connection
+from src.database.models import Base
+from src.database.migrations import ops
+
+VERSION = 2
+DESCRIPTION = "Composite indexes for the per-student and per-conversation hot paths; unique (student_id, topic)"
+
+def _merge_duplicate_topic_rows(conn: Connection):
+    """Concurrent first attempts could create two rows for one (student_id, topic); fold them into the oldest."""
+    perf = Base.metadata.tables["student_topic_performance"]
+    duplicates = conn.execute(select(perf.c.student_id, perf.c.topic).group_by(perf.c.student_id, perf.c.topic).having(func.count() > 1)).all()
+    for student_id, topic in duplicates:
+        rows = conn.execute(select(perf).where(perf.c.student_id == student_id, perf.c.topic == topic).order_by(perf.c.id)).all()
+        distribution = {}
+        for row in rows:
+            for difficulty, count in (row.difficulty_distribution or {}).items():
+                distribution[difficulty] = distribution.get(difficulty, 0) + count
+        conn.execute(update(perf).where(perf.c.id == rows[0].id).values(
+            total_attempts=sum(row.total_attempts or 0 for row in rows),
+            correct_answers=sum(row.correct_answers or 0 for row in rows),
+            last_attempted=max((row.last_attempted for row in rows if row.last_attempted), default=None),
+            difficulty_distribution=distribution,
+        ))
+        conn.execute(delete(perf).where(perf.c.id.in_([row.id for row in rows[1:]])))
+
+def upgrade(conn: Connection):
+    _merge_duplicate_topic_rows(conn)
+    ops.create_index(conn, "uq_student_topic_performance")
+    ops.create_index(conn, "ix_chat_messages_conversation_timestamp")
+    ops.create_index(conn, "ix_student_quiz_attempts_student_timestamp")
+    ops.create_index(conn, "ix_xp_transactions_student_activity")
+    # Each is the leading column of one of the composite indexes above, so it only added write cost
+    for index_name in ("ix_student_topic_performance_student_id", "ix_chat_messages_conversation_id", "ix_student_quiz_attempts_student_id", "ix_xp_transactions_student_id"):
+        ops.drop_index(conn, index_name)
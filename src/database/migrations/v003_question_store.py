@@ -0,0 +1,61 @@
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, MetaData, String, Table, bindparam, null, select, update
+from sqlalchemy.engine import Connection
+from src.database.migrations import ops
+from src.database.question_store import store_questions
+
+VERSION = 3
+DESCRIPTION = "Content-addressed questions table; attempts reference question ids instead of copying the texts"
+
+BATCH_SIZE = 500
+
+# The two tables as this migration leaves them. Frozen here rather than read from the models, so replaying v003 on an
+# old database keeps producing this schema after the models move on; later changes belong in later migrations.
+metadata = MetaData()
+
+questions = Table(
+    "questions", metadata,
+    Column("id", String, primary_key=True),
+    Column("text", String, nullable=False),
+    Column("times_answered", Integer, server_default="0", nullable=False, index=True),
+    Column("times_correct", Integer, server_default="0", nullable=False),
+    Column("created_at", DateTime),
+)
+
+attempts = Table(
+    "student_quiz_attempts", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("quiz_id", String, nullable=False),
+    Column("student_id", String, nullable=False),
+    Column("topic", String, nullable=False),
+    Column("difficulty", String, nullable=False),
+    Column("timestamp", DateTime),
+    Column("questions", JSON, nullable=True),
+    Column("answers", JSON, nullable=True),
+    Column("question_ids", JSON, nullable=True),
+    Column("correctness", String, nullable=True),
+    Column("correct_count", Integer, nullable=False),
+    Column("total_questions", Integer, nullable=False),
+    Index("ix_student_quiz_attempts_student_timestamp", "student_id", "timestamp"),
+)
+
+def _convert_attempts(conn: Connection):
+    """Moves each attempt's question texts into the questions table, keeping only the ids on the attempt.
+    Legacy attempts never stored which answers were right, so their correctness stays NULL (and they do not count
+    towards the per-question counters); their raw answers are kept."""
+    last_id = 0
+    while True:
+        rows = conn.execute(select(attempts.c.id, attempts.c.questions).where(attempts.c.id > last_id, attempts.c.question_ids.is_(None), attempts.c.questions.is_not(None)).order_by(attempts.c.id).limit(BATCH_SIZE)).all()
+        if not rows:
+            return
+        texts = [text for row in rows for text in (row.questions or [])]
+        ids = iter(store_questions(conn, texts, questions))
+        params = [{"attempt_id": row.id, "ids": [next(ids) for _ in (row.questions or [])]} for row in rows]
+        conn.execute(update(attempts).where(attempts.c.id == bindparam("attempt_id")).values(question_ids=bindparam("ids"), questions=null()), params)
+        last_id = rows[-1].id
+
+def upgrade(conn: Connection):
+    questions.create(bind=conn, checkfirst=True)
+    ops.add_column(conn, "student_quiz_attempts", "question_ids", attempts)
+    ops.add_column(conn, "student_quiz_attempts", "correctness", attempts)
+    ops.drop_not_null(conn, "student_quiz_attempts", "questions", "answers", table=attempts)
+    _convert_attempts(conn)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, JSON, ForeignKey, create_engine
+from sqlalchemy import Column, String, Integer, Float, Date, DateTime, JSON, ForeignKey, Index, UniqueConstraint, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -9,49 +9,73 @@ class StudentQuizAttempt(Base):
     __tablename__ = "student_quiz_attempts"
     id = Column(Integer, primary_key=True, autoincrement=True)
     quiz_id = Column(String, nullable=False)
-    student_id = Column(String, nullable=False, index=True)
+    student_id = Column(String, nullable=False)
     topic = Column(String, nullable=False)
     difficulty = Column(String, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
-    questions = Column(JSON, nullable=False)
-    answers = Column(JSON, nullable=False)
+    # Legacy per-attempt copies; new attempts reference the questions table and store only correctness
+    questions = Column(JSON, nullable=True)
+    answers = Column(JSON, nullable=True)
+    question_ids = Column(JSON, nullable=True)
+    # One character per question, in order: "1" answered correctly, "0" not. NULL for attempts recorded before it existed
+    correctness = Column(String, nullable=True)
     correct_count = Column(Integer, nullable=False)
     total_questions = Column(Integer, nullable=False)
+    __table_args__ = (Index("ix_student_quiz_attempts_student_timestamp", "student_id", "timestamp"),)
+
+class Question(Base):
+    """Each distinct question text once, keyed by a hash of its content (see src/database/question_store.py)"""
+    __tablename__ = "questions"
+    id = Column(String, primary_key=True)
+    text = Column(String, nullable=False)
+    times_answered = Column(Integer, default=0, server_default="0", nullable=False, index=True)
+    times_correct = Column(Integer, default=0, server_default="0", nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 class StudentTopicPerformance(Base):
     __tablename__ = "student_topic_performance"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    student_id = Column(String, nullable=False, index=True)
+    student_id = Column(String, nullable=False)
     topic = Column(String, nullable=False)
     total_attempts = Column(Integer, default=0)
     correct_answers = Column(Integer, default=0)
     last_attempted = Column(DateTime, default=datetime.utcnow)
     difficulty_distribution = Column(JSON, default=dict)
+    __table_args__ = (Index("uq_student_topic_performance", "student_id", "topic", unique=True),)
 
 class Conversation(Base):
     __tablename__ = "conversations"
     id = Column(String, primary_key=True)
     student_id = Column(String, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Rolling summary of the first summarized_message_count messages, which are no longer sent verbatim
+    summary = Column(String, nullable=True)
+    summarized_message_count = Column(Integer, default=0, server_default="0", nullable=False)
     messages = relationship("ChatMessageDB", back_populates="conversation", cascade="all, delete-orphan")
 
 class ChatMessageDB(Base):
     __tablename__ = "chat_messages"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    conversation_id = Column(String, ForeignKey("conversations.id"), nullable=False, index=True)
+    conversation_id = Column(String, ForeignKey("conversations.id"), nullable=False)
     role = Column(String, nullable=False)
     content = Column(String, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
     conversation = relationship("Conversation", back_populates="messages")
+    __table_args__ = (Index("ix_chat_messages_conversation_timestamp", "conversation_id", "timestamp"),)
 
 class StudentGamification(Base):
     __tablename__ = "student_gamification"
     student_id = Column(String, primary_key=True, index=True)
-    total_xp = Column(Integer, default=0)
+    total_xp = Column(Integer, default=0, index=True)
     level = Column(Integer, default=1)
     current_streak = Column(Integer, default=0)
     longest_streak = Column(Integer, default=0)
     last_activity_date = Column(DateTime, nullable=True)
+    # Denormalized badge stats, incremented by the write paths (see GamificationService.increment_counters)
+    quizzes_completed = Column(Integer, default=0, server_default="0", nullable=False)
+    perfect_quizzes = Column(Integer, default=0, server_default="0", nullable=False)
+    graphs_created = Column(Integer, default=0, server_default="0", nullable=False)
+    chat_count = Column(Integer, default=0, server_default="0", nullable=False)
     badges = relationship("StudentBadge", back_populates="student", cascade="all, delete-orphan")
     transactions = relationship("XPTransaction", back_populates="student", cascade="all, delete-orphan")
 
@@ -67,9 +91,53 @@ class StudentBadge(Base):
 class XPTransaction(Base):
     __tablename__ = "xp_transactions"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    student_id = Column(String, ForeignKey("student_gamification.student_id"), nullable=False, index=True)
+    student_id = Column(String, ForeignKey("student_gamification.student_id"), nullable=False)
     xp_amount = Column(Integer, nullable=False)
     activity_type = Column(String, nullable=False, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     description = Column(String, nullable=True)
     student = relationship("StudentGamification", back_populates="transactions")
+    __table_args__ = (Index("ix_xp_transactions_student_activity", "student_id", "activity_type"),)
+
+class BankedQuestion(Base):
+    __tablename__ = "question_bank"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    topic = Column(String, nullable=False)
+    difficulty = Column(String, nullable=False)
+    question_type = Column(String, nullable=False)
+    question = Column(String, nullable=False)
+    options = Column(JSON, default=list)
+    correct_answer = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (UniqueConstraint("topic", "difficulty", "question_type", "question", name="uq_question_bank_question"),)
+
+class QuestionBankBucket(Base):
+    __tablename__ = "question_bank_buckets"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    topic = Column(String, nullable=False)
+    difficulty = Column(String, nullable=False)
+    question_type = Column(String, nullable=False)
+    display_topic = Column(String, nullable=False)
+    request_count = Column(Integer, default=0)
+    miss_count = Column(Integer, default=0)
+    last_requested = Column(DateTime, default=datetime.utcnow, index=True)
+    __table_args__ = (UniqueConstraint("topic", "difficulty", "question_type", name="uq_question_bank_bucket"),)
+
+class ServedBankQuestion(Base):
+    __tablename__ = "served_bank_questions"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    student_id = Column(String, nullable=False)
+    question_id = Column(Integer, ForeignKey("question_bank.id"), nullable=False)
+    served_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (UniqueConstraint("student_id", "question_id", name="uq_served_bank_question"),)
+
+class DailyProblem(Base):
+    __tablename__ = "daily_problems"
+    problem_date = Column(Date, primary_key=True)
+    topic = Column(String, nullable=False)
+    difficulty = Column(String, nullable=False)
+    question_type = Column(String, nullable=False, default="MCQ")
+    question = Column(String, nullable=False)
+    options = Column(JSON, nullable=False)
+    correct_answer = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
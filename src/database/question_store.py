@@ -0,0 +1,47 @@
+import hashlib
+from collections import Counter
+from typing import List, Sequence, Union
+from sqlalchemy import Table, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from src.database.models import Question
+
+# Works on an ORM Session (services) or a Connection (migrations)
+Executor = Union[Session, Connection]
+
+def question_content_id(text: str) -> str:
+    """Stable id for a question text. Changing it orphans every stored reference, so don't."""
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()[:32]
+
+def store_questions(db: Executor, texts: Sequence[str], table: Table = Question.__table__) -> List[str]:
+    """Makes sure every text has a row in the questions table and returns their ids, in order. Migrations pass their
+    own frozen definition of the table."""
+    ids = [question_content_id(text) for text in texts]
+    rows = list({qid: {"id": qid, "text": text.strip()} for qid, text in zip(ids, texts)}.values())
+    if not rows:
+        return ids
+    dialect = (db.get_bind() if isinstance(db, Session) else db).dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        # Insert-or-ignore, so concurrent attempts on the same new question cannot collide
+        insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        db.execute(insert(table).values(rows).on_conflict_do_nothing(index_elements=["id"]))
+    else:
+        existing = set(db.scalars(select(table.c.id).where(table.c.id.in_([row["id"] for row in rows]))))
+        missing = [row for row in rows if row["id"] not in existing]
+        if missing:
+            db.execute(table.insert(), missing)
+    return ids
+
+def record_question_results(db: Executor, question_ids: Sequence[str], correctness: str):
+    """Bumps the per-question answered/correct counters for one attempt, once per occurrence of a question in it."""
+    answered = Counter(question_ids)
+    correct = Counter(qid for qid, mark in zip(question_ids, correctness) if mark == "1")
+    for column, counts in ((Question.times_answered, answered), (Question.times_correct, correct)):
+        # One UPDATE per distinct increment, which is a single statement unless the quiz repeats a question
+        by_increment = {}
+        for qid, count in counts.items():
+            by_increment.setdefault(count, []).append(qid)
+        for count, ids in by_increment.items():
+            db.execute(update(Question).where(Question.id.in_(ids)).values({column: column + count}))
@@ -0,0 +1,128 @@
+"""
+Runs the services' database queries against a freshly migrated SQLite database and checks each one with
+EXPLAIN QUERY PLAN. Fails (exit code 1) if any query scans a whole table instead of using an index.
+
+Usage: python -m src.database.test_query_plans
+"""
+import os
+import re
+import sys
+import tempfile
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from src.config.settings import settings
+from src.database.database import create_db_engine
+from src.database.migrations import run_migrations
+from src.models.api_schemas import QuizQuestion, QuizSettings
+from src.models.progress_schemas import QuizAttemptRequest
+from src.services.chat_service import ChatService
+from src.services.gamification_service import GamificationService
+from src.services.progress_service import ProgressService
+from src.services.question_bank_service import QuestionBankService
+
+# "SCAN <table>" with no index is a full table scan; "SCAN <table> USING [COVERING] INDEX" walks an index in order
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+# Queries that are expected to read every row, with the reason
+ALLOWED_SCANS = {}
+
+
+def run_workload(Session):
+    """Exercises the service methods that back the API endpoints, in the order a student would hit them."""
+    gamification, progress, chat, bank = GamificationService(), ProgressService(), ChatService(), QuestionBankService()
+    with Session() as db:
+        for student_id in ("s1", "s2"):
+            with gamification.unit_of_work(db, student_id):
+                gamification.update_streak(db, student_id, commit=False)
+                gamification.award_xp(db, student_id, "daily_login", commit=False)
+                gamification.check_and_award_badges(db, student_id, commit=False)
+            attempt = QuizAttemptRequest(student_id=student_id, topic="Python", difficulty="easy", questions=["q1", "q2"], user_answers=["a", "b"], correct_answers=["a", "c"])
+            with gamification.unit_of_work(db, student_id):
+                progress.record_quiz_attempt(db, attempt, commit=False)
+                gamification.award_xp(db, student_id, "quiz_completion", commit=False)
+                gamification.check_and_award_badges(db, student_id, commit=False)
+            gamification.record_graph_creation(db, student_id, "Graph")
+            gamification.record_chat_message(db, student_id)
+        progress.get_student_analytics(db, "s1")
+        progress.get_hardest_questions(db, min_answers=1)
+        gamification.get_student_gamification(db, "s1")
+        gamification.get_leaderboard(db, limit=10, student_id="s1")
+        gamification.check_and_award_badges(db, "s1", changed_stats=None)
+
+        conv_id = chat.start_turn(db, "s1", None, "hello")
+        chat.add_message_to_history(db, conv_id, "tutor", "hi")
+        chat.context_cache.clear()
+        chat.build_tutor_prompt(db, conv_id)
+        chat._load_messages(db, conv_id, 0, 2)
+
+        quiz = QuizSettings(topic="Python", question_type="Multiple Choice", difficulty="easy", num_questions=2, student_id="s1")
+        key = bank.bucket_key(quiz.topic, quiz.difficulty, quiz.question_type)
+        bank._reserve(db, key, quiz)
+        banked, _ = bank._deposit(db, key, [QuizQuestion(type="MCQ", question=f"Question {i}?", options=["a", "b"], correct_answer="a") for i in range(3)])
+        bank._mark_served(db, quiz.student_id, banked)
+        db.commit()
+        bank._reserve(db, key, quiz)
+        for bucket in bank._popular_buckets(db):
+            bank._stock(db, bucket)
+            bank._recent_questions(db, bucket)
+        db.commit()
+
+
+def collect_statements(engine) -> list:
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE"):
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        run_workload(sessionmaker(bind=engine, autoflush=False))
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    unique = {}
+    for statement, parameters in statements:
+        unique.setdefault(statement, parameters)
+    return list(unique.items())
+
+
+def check_query_plans() -> list:
+    """Returns (statement, plan) for every captured query whose plan contains a full table scan."""
+    # Ledger rows would otherwise be flushed through the app's own engine; restored afterwards so nothing else sees it
+    write_behind, settings.XP_LEDGER_WRITE_BEHIND = settings.XP_LEDGER_WRITE_BEHIND, False
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'query_plans.db')}", echo=False)
+            try:
+                run_migrations(engine)
+                return _explain(engine)
+            finally:
+                engine.dispose()
+    finally:
+        settings.XP_LEDGER_WRITE_BEHIND = write_behind
+
+
+def _explain(engine) -> list:
+    failures = []
+    with engine.connect() as conn:
+        for statement, parameters in collect_statements(engine):
+            plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            scans = [step for step in plan if FULL_SCAN.match(step)]
+            if scans and statement not in ALLOWED_SCANS:
+                failures.append((statement, plan))
+    return failures
+
+
+def test_service_queries_use_indexes():
+    write_behind = settings.XP_LEDGER_WRITE_BEHIND
+    failures = check_query_plans()
+    assert settings.XP_LEDGER_WRITE_BEHIND == write_behind
+    assert not failures, "\n\n".join(f"{statement}\n  -> {plan}" for statement, plan in failures)
+
+
+if __name__ == "__main__":
+    failures = check_query_plans()
+    for statement, plan in failures:
+        print(f"❌ Full table scan:\n{statement}\n  -> {' | '.join(plan)}\n")
+    print(f"{'❌' if failures else '✅'} {len(failures)} queries fall back to a full table scan")
+    sys.exit(1 if failures else 0)
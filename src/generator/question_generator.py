@@ -2,14 +2,18 @@ from langchain.output_parsers import PydanticOutputParser
 from src.models.question_schemas import MCQQuestion,FillBlankQuestion
 from src.prompts.templates import (
     mcq_prompt_template, mcq_prompt_with_context_template,
-    fill_blank_prompt_template, fill_blank_prompt_with_context_template
+    fill_blank_prompt_template, fill_blank_prompt_with_context_template,
+    mcq_batch_prompt_template, mcq_batch_prompt_with_context_template,
+    fill_blank_batch_prompt_template, fill_blank_batch_prompt_with_context_template
 )
 from src.llm.groq_client import get_groq_llm
+from src.llm.resilience import LLMUnavailableError
 from src.config.settings import settings
 from src.common.logger import get_logger
 from src.common.custom_exception import CustomException
+import json
 import random
-from typing import List, Optional
+from typing import Callable, List, Optional, Type
 
 # Note: All methods using the LLM are now asynchronous.
 
@@ -30,6 +34,7 @@ class QuestionGenerator:
     async def _retry_and_parse(self, prompt, parser, topic, difficulty, previous_questions: Optional[List[str]] = None):
         """
         Retries the LLM call and attempts to parse the output asynchronously.
+        Provider errors are already retried with backoff by the LLM client; this loop re-asks on unparseable output.
         """
         for attempt in range(settings.MAX_RETRIES): # The number of max retries is 3
             try:
@@ -57,6 +62,9 @@ class QuestionGenerator:
 
                 return parsed
 
+            except LLMUnavailableError:
+                # Budget spent or provider down: another attempt would be refused as well
+                raise
             except Exception as e:
                 self.logger.error(f"Error-Failed to parse/generate question: {str(e)} on attempt {attempt + 1}")
                 if attempt == settings.MAX_RETRIES - 1:
@@ -76,16 +84,7 @@ class QuestionGenerator:
 
             # Await the async retry function
             question = await self._retry_and_parse(prompt, parser, topic, difficulty, previous_questions)
-
-            # Normalize for comparison
-            normalized_options = [opt.strip() for opt in question.options]
-            normalized_answer = question.correct_answer.strip()
-
-            if len(question.options) != 4:
-                raise ValueError(f"MCQ must have exactly 4 options, got {len(question.options)}")
-
-            if normalized_answer not in normalized_options:
-                raise ValueError(f"Correct answer '{question.correct_answer}' not found in options: {question.options}")
+            self._validate_mcq(question)
 
             self.logger.info("Generated a valid MCQ Question")
             return question
@@ -109,9 +108,7 @@ class QuestionGenerator:
 
             # Await the async retry function
             question = await self._retry_and_parse(prompt, parser, topic, difficulty, previous_questions)
-
-            if "___" not in question.question:
-                raise ValueError("Fill in blanks should contain '___'")
+            self._validate_fill_blank(question)
 
             self.logger.info("Generated a valid Fill in Blanks Question")
             return question
@@ -120,4 +117,97 @@ class QuestionGenerator:
             self.logger.error(f"Failed to generate fillups : {str(e)}")
             if isinstance(e, CustomException):
                 raise
-            raise CustomException("Fill in blanks generation failed" , e)
\ No newline at end of file
+            raise CustomException("Fill in blanks generation failed" , e)
+
+    async def generate_mcq_batch(self, topic: str, count: int, difficulty: str = 'medium', previous_questions: Optional[List[str]] = None) -> List[MCQQuestion]:
+        """Generates up to `count` MCQs from a single JSON-array completion, re-requesting only the missing items."""
+        return await self._generate_batch(
+            MCQQuestion, self._validate_mcq, mcq_batch_prompt_template, mcq_batch_prompt_with_context_template,
+            topic, count, difficulty, previous_questions
+        )
+
+    async def generate_fill_blank_batch(self, topic: str, count: int, difficulty: str = 'medium', previous_questions: Optional[List[str]] = None) -> List[FillBlankQuestion]:
+        """Generates up to `count` fill-in-the-blank questions from a single JSON-array completion."""
+        return await self._generate_batch(
+            FillBlankQuestion, self._validate_fill_blank, fill_blank_batch_prompt_template, fill_blank_batch_prompt_with_context_template,
+            topic, count, difficulty, previous_questions
+        )
+
+    async def _generate_batch(self, schema: Type, validate: Callable, prompt, prompt_with_context, topic: str, count: int, difficulty: str, previous_questions: Optional[List[str]]) -> list:
+        accepted = []
+        seen = set(previous_questions or [])
+
+        for attempt in range(settings.MAX_RETRIES):
+            missing = count - len(accepted)
+            if missing <= 0:
+                break
+
+            # Every round only asks for the items still missing, with the accepted ones as context
+            context = (previous_questions or []) + [q.question for q in accepted]
+            template = prompt_with_context if context else prompt
+            variables = {"count": missing, "topic": topic, "difficulty": difficulty}
+            if context:
+                variables["previous_questions"] = "\n".join([f"- {q}" for q in context])
+
+            try:
+                self.logger.info(f"Generating batch of {missing} questions for topic {topic} with difficulty {difficulty}, attempt {attempt + 1}")
+                llm = self._get_llm_with_variation()
+                response = await llm.ainvoke(template.format(**variables))
+                items = self._parse_json_array(response.content)
+            except LLMUnavailableError:
+                if accepted:
+                    break
+                raise
+            except Exception as e:
+                self.logger.error(f"Error-Failed to parse/generate question batch: {str(e)} on attempt {attempt + 1}")
+                continue
+
+            for item in items:
+                if len(accepted) >= count:
+                    break
+                try:
+                    question = validate(schema.model_validate(item))
+                except Exception as e:
+                    self.logger.warning(f"Dropping invalid batch item: {str(e)}")
+                    continue
+                if question.question in seen:
+                    self.logger.warning(f"Dropping duplicate batch item: '{question.question}'")
+                    continue
+                seen.add(question.question)
+                accepted.append(question)
+
+        if not accepted:
+            raise CustomException(f"Failed to generate question batch after {settings.MAX_RETRIES} attempts")
+        if len(accepted) < count:
+            self.logger.warning(f"Batch generation returned {len(accepted)}/{count} valid questions")
+        return accepted
+
+    @staticmethod
+    def _parse_json_array(content: str) -> list:
+        """Extracts the JSON array from a completion, tolerating code fences or surrounding text."""
+        start, end = content.find("["), content.rfind("]")
+        if start == -1 or end <= start:
+            raise ValueError("Response does not contain a JSON array")
+        items = json.loads(content[start:end + 1])
+        if not isinstance(items, list):
+            raise ValueError("Response is not a JSON array")
+        return items
+
+    @staticmethod
+    def _validate_mcq(question: MCQQuestion) -> MCQQuestion:
+        # Normalize for comparison
+        normalized_options = [opt.strip() for opt in question.options]
+        normalized_answer = question.correct_answer.strip()
+
+        if len(question.options) != 4:
+            raise ValueError(f"MCQ must have exactly 4 options, got {len(question.options)}")
+
+        if normalized_answer not in normalized_options:
+            raise ValueError(f"Correct answer '{question.correct_answer}' not found in options: {question.options}")
+        return question
+
+    @staticmethod
+    def _validate_fill_blank(question: FillBlankQuestion) -> FillBlankQuestion:
+        if "___" not in question.question:
+            raise ValueError("Fill in blanks should contain '___'")
+        return question
@@ -0,0 +1,238 @@
+"""
+Admission control for outbound LLM calls. Every attempt made through GuardedChatModel waits here until the
+provider's rate limits can take it:
+
+- two token buckets, LLM_RATE_LIMIT_RPM requests and LLM_RATE_LIMIT_TPM (estimated) tokens per minute, each allowing
+  a burst of one minute's worth;
+- waiting calls are served strictly by priority class (interactive tutor chat, then standard user-facing work such
+  as quizzes, then background pre-generation), and within a class by self-clocked weighted fair queuing across
+  students, so one student's 10-question quiz cannot push everyone else's calls to the back.
+
+The caller (priority, student) comes from a contextvar set by llm_caller() or set_llm_caller(); unset means standard
+and anonymous.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from src.config.settings import settings
+from src.common.logger import get_logger
+
+logger = get_logger("LLMAdmission")
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_STANDARD = "standard"
+PRIORITY_BACKGROUND = "background"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_STANDARD, PRIORITY_BACKGROUND)
+
+
+@dataclass(frozen=True)
+class LLMCaller:
+    priority: str = PRIORITY_STANDARD
+    student_id: Optional[str] = None
+    weight: float = 1.0
+
+
+_current_caller: ContextVar[LLMCaller] = ContextVar("llm_caller", default=LLMCaller())
+
+
+def set_llm_caller(priority: str, student_id: Optional[str] = None, weight: float = 1.0):
+    """Tags every LLM call made from here on in the current context, e.g. the rest of an API request, streamed body included."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority '{priority}', expected one of {PRIORITIES}")
+    return _current_caller.set(LLMCaller(priority, student_id, weight))
+
+
+@contextmanager
+def llm_caller(priority: str, student_id: Optional[str] = None, weight: float = 1.0):
+    """Tags the LLM calls made inside the block (and by tasks started from it) for admission scheduling."""
+    token = set_llm_caller(priority, student_id, weight)
+    try:
+        yield
+    finally:
+        _current_caller.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = max(per_minute, 1.0)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def drain(self):
+        self.level = min(self.level, 0.0)
+
+
+@dataclass(order=True)
+class _Waiter:
+    rank: int
+    finish: float
+    seq: int
+    tokens: int = field(compare=False)
+    priority: str = field(compare=False)
+    enqueued: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class AdmissionController:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = TokenBucket(settings.LLM_RATE_LIMIT_RPM)
+        self._tokens = TokenBucket(settings.LLM_RATE_LIMIT_TPM)
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        # Fair queuing state: the finish tag of the last call admitted, and of each student's last queued call
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.admitted = {p: 0 for p in PRIORITIES}
+        self.throttled = 0
+        self.rate_limited = 0
+        self.max_queue_depth = 0
+        self._waits_ms = {p: deque(maxlen=1000) for p in PRIORITIES}
+
+    def _cost(self, tokens: int) -> int:
+        # A call larger than the bucket could otherwise never be admitted; it waits for a full bucket instead
+        return min(tokens, int(self._tokens.capacity))
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        return max(self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+
+    def _admit(self, priority: str, tokens: int, enqueued: float, now: float):
+        self._requests.take(1)
+        self._tokens.take(tokens)
+        self.admitted[priority] += 1
+        self._waits_ms[priority].append((now - enqueued) * 1000)
+
+    async def acquire(self, estimated_tokens: int):
+        """Waits until the call may be sent. Cancelling the wait (e.g. a request timeout) leaves the queue cleanly."""
+        if not settings.LLM_ADMISSION_ENABLED:
+            return
+        caller, tokens = _current_caller.get(), self._cost(estimated_tokens)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            now = time.monotonic()
+            if not self._queue and self._wait_time(tokens, now) == 0:
+                self._admit(caller.priority, tokens, now, now)
+                return
+            flow = caller.student_id or ""
+            start = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+            finish = start + tokens / max(caller.weight, 1e-6)
+            self._last_finish[flow] = finish
+            waiter = _Waiter(PRIORITIES.index(caller.priority), finish, next(self._seq), tokens, caller.priority, now, loop.create_future())
+            heapq.heappush(self._queue, waiter)
+            self.throttled += 1
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            self._dispatch(loop)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                waiter.future.cancel()
+                # Whoever was queued behind it may be able to go now
+                self._dispatch(loop)
+            raise
+
+    def _dispatch(self, loop: asyncio.AbstractEventLoop):
+        """Admits queued calls in order while the buckets allow, then sleeps until the head of the queue fits. Holds _lock."""
+        now = time.monotonic()
+        while self._queue:
+            head = self._queue[0]
+            if head.future.done():
+                heapq.heappop(self._queue)
+                continue
+            wait = self._wait_time(head.tokens, now)
+            if wait > 0:
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._timer = loop.call_later(wait, self._on_timer, loop)
+                return
+            heapq.heappop(self._queue)
+            self._virtual_time = head.finish
+            self._admit(head.priority, head.tokens, head.enqueued, now)
+            head.future.set_result(None)
+        if len(self._last_finish) > 10000:
+            self._last_finish = {flow: finish for flow, finish in self._last_finish.items() if finish > self._virtual_time}
+
+    def _on_timer(self, loop: asyncio.AbstractEventLoop):
+        with self._lock:
+            self._timer = None
+            self._dispatch(loop)
+
+    def acquire_sync(self, estimated_tokens: int):
+        """Blocking variant for sync callers: respects the rate limits but does not take part in fair queuing."""
+        if not settings.LLM_ADMISSION_ENABLED:
+            return
+        caller, tokens, enqueued = _current_caller.get(), self._cost(estimated_tokens), time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._wait_time(tokens, now)
+                if wait == 0 and not self._queue:
+                    self._admit(caller.priority, tokens, enqueued, now)
+                    return
+            time.sleep(max(wait, 0.05))
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Corrects the token bucket once the provider reports what a call really used."""
+        if settings.LLM_ADMISSION_ENABLED and actual_tokens:
+            with self._lock:
+                self._tokens.take(actual_tokens - self._cost(estimated_tokens))
+
+    def on_rate_limited(self):
+        """The provider answered 429: our buckets are fuller than its own, so stop admitting until they refill."""
+        with self._lock:
+            self.rate_limited += 1
+            self._requests.drain()
+            self._tokens.drain()
+
+    @staticmethod
+    def _percentile(values, pct: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 1)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._requests._refill(now)
+            self._tokens._refill(now)
+            waiting = [w for w in self._queue if not w.future.done()]
+            return {
+                "enabled": settings.LLM_ADMISSION_ENABLED,
+                "queue_depth": len(waiting),
+                "queue_depth_by_priority": {p: sum(1 for w in waiting if w.priority == p) for p in PRIORITIES},
+                "max_queue_depth": self.max_queue_depth,
+                "admitted": dict(self.admitted),
+                "throttled": self.throttled,
+                "rate_limited": self.rate_limited,
+                "wait_ms_p50": {p: self._percentile(self._waits_ms[p], 0.5) for p in PRIORITIES},
+                "wait_ms_p95": {p: self._percentile(self._waits_ms[p], 0.95) for p in PRIORITIES},
+                "requests_available": round(self._requests.level, 1),
+                "tokens_available": round(self._tokens.level),
+                "rate_limit_rpm": settings.LLM_RATE_LIMIT_RPM,
+                "rate_limit_tpm": settings.LLM_RATE_LIMIT_TPM,
+            }
+
+
+admission = AdmissionController()
@@ -0,0 +1,335 @@
+"""
+Offline LLM stand-ins for benchmarking and load testing without calling Groq.
+
+FakeChatModel synthesises schema-valid responses for every prompt the backend sends (quiz
+questions, tutor replies, feedback, topic content, knowledge-graph extraction) with a configurable
+latency distribution and failure/garbage rates. RecordingChatModel wraps a real client and appends
+each completion to a JSONL fixture file, which FakeChatModel replays when given a FixtureStore.
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, PrivateAttr
+
+CONCEPTS = [
+    "Caching", "Indexing", "Concurrency", "Recursion", "Serialization", "Encapsulation", "Inheritance",
+    "Polymorphism", "Immutability", "Memoization", "Pagination", "Sharding", "Replication", "Hashing",
+    "Tokenization", "Normalization", "Validation", "Middleware", "Dependency Injection", "Event Loop",
+    "Garbage Collection", "Type Inference", "Lazy Evaluation", "Backpropagation", "Regularization",
+    "Gradient Descent", "Embeddings", "Attention", "Batching", "Streaming", "Load Balancing",
+    "Rate Limiting", "Idempotency", "Transactions", "Locking", "Profiling", "Vectorization", "Closures",
+    "Generators", "Decorators", "Context Managers", "Iterators", "Coroutines", "Threads", "Schedulers",
+    "Compilers", "Interpreters", "Bytecode",
+]
+
+RELATIONS = ["RELATES_TO", "PART_OF", "USES", "DEPENDS_ON", "IMPROVES", "CONTRASTS_WITH"]
+
+QUESTION_PATTERNS = [
+    "In {topic}, how does {a} change the behaviour of {b} during {c}?",
+    "Which statement best explains the role of {a} alongside {b} in {topic} ({c} case)?",
+    "When applying {topic}, why would {a} be preferred over {b} for {c}?",
+    "What trade-off appears between {a} and {b} in {topic} once {c} is introduced?",
+]
+
+BLANK_PATTERNS = [
+    "In {topic}, _____ is the technique that lets {b} scale alongside {c}.",
+    "When {b} meets {c} in {topic}, engineers usually rely on _____.",
+    "The {topic} feature most closely tied to {b} and {c} is _____.",
+]
+
+REPLY_SENTENCES = [
+    "Think of {a} as the piece that keeps {b} predictable.",
+    "A good way to practise this is to build a small example that combines {a} and {b}.",
+    "The key idea is that {a} trades a little memory for a lot of speed.",
+    "If {b} feels confusing, start from what problem {a} is trying to solve.",
+    "Most real systems combine {a} with {b} rather than choosing one.",
+    "You are making good progress, keep connecting new ideas to ones you already know.",
+]
+
+
+class FakeLLMError(RuntimeError):
+    """Simulated provider failure raised at the configured failure rate."""
+
+
+def prompt_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+def messages_to_prompt(messages: List[BaseMessage]) -> str:
+    if len(messages) == 1:
+        return str(messages[0].content)
+    return "\n\n".join(f"{m.type}: {m.content}" for m in messages)
+
+
+class FixtureStore:
+    """Append-only JSONL file of recorded completions, indexed by prompt hash for replay."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[dict]] = {}
+        self._cursor: Dict[str, int] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._entries.setdefault(record["key"], []).append(record)
+
+    def __len__(self):
+        return sum(len(v) for v in self._entries.values())
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """Returns the next recorded response for a prompt, cycling when it was recorded several times."""
+        with self._lock:
+            records = self._entries.get(key)
+            if not records:
+                return None
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            return records[index % len(records)]
+
+    def append(self, model: str, prompt: str, response: str, latency_ms: float):
+        record = {"key": prompt_key(model, prompt), "model": model, "prompt": prompt, "response": response, "latency_ms": round(latency_ms, 1)}
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            self._entries.setdefault(record["key"], []).append(record)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that never leaves the process. It does not implement tool calling, so
+    LLMGraphTransformer falls back to its JSON prompt, which this model answers.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model_name: str = "fake"
+    temperature: float = 0.9
+    latency_ms: float = 800.0
+    latency_jitter_ms: float = 300.0
+    # "fixed", "uniform", "normal" or "lognormal"
+    latency_distribution: str = "lognormal"
+    failure_rate: float = 0.0
+    garbage_rate: float = 0.0
+    stream_chunk_words: int = 3
+    seed: Optional[int] = None
+    fixtures: Optional[FixtureStore] = None
+    replay_latency: bool = True
+
+    _rng: random.Random = PrivateAttr(default=None)
+    _counter: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any):
+        self._rng = random.Random(self.seed)
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "temperature": self.temperature}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text, latency = self._complete(messages_to_prompt(messages))
+        time.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text, latency = self._complete(messages_to_prompt(messages))
+        await asyncio.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        text, latency = self._complete(messages_to_prompt(messages))
+        chunks = self._split(text)
+        for i, piece in enumerate(chunks):
+            time.sleep(self._chunk_delay(i, len(chunks), latency))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        text, latency = self._complete(messages_to_prompt(messages))
+        chunks = self._split(text)
+        for i, piece in enumerate(chunks):
+            await asyncio.sleep(self._chunk_delay(i, len(chunks), latency))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+    def _split(self, text: str) -> List[str]:
+        words = re.findall(r"\S+\s*", text) or [text]
+        size = max(1, self.stream_chunk_words)
+        return ["".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+    @staticmethod
+    def _chunk_delay(index: int, total: int, latency: float) -> float:
+        # A quarter of the latency goes to the first token, the rest is spread over the stream
+        if index == 0:
+            return latency * 0.25
+        return latency * 0.75 / max(1, total - 1)
+
+    def _complete(self, prompt: str):
+        """Picks the response text and latency (seconds) for a call, or raises a simulated failure."""
+        with self._lock:
+            roll_failure, roll_garbage = self._rng.random(), self._rng.random()
+            latency = self._sample_latency()
+        if roll_failure < self.failure_rate:
+            raise FakeLLMError(f"Simulated LLM failure from {self.model_name}")
+        if self.fixtures is not None:
+            record = self.fixtures.lookup(prompt_key(self.model_name, prompt))
+            if record is not None:
+                if self.replay_latency:
+                    latency = record.get("latency_ms", latency * 1000) / 1000
+                return record["response"], latency
+        text = self._respond(prompt)
+        if roll_garbage < self.garbage_rate:
+            text = self._garble(text)
+        return text, latency
+
+    def _sample_latency(self) -> float:
+        mean, spread = max(self.latency_ms, 0.0), max(self.latency_jitter_ms, 0.0)
+        if self.latency_distribution == "fixed" or spread == 0 or mean == 0:
+            value = mean
+        elif self.latency_distribution == "uniform":
+            value = self._rng.uniform(mean - spread, mean + spread)
+        elif self.latency_distribution == "normal":
+            value = self._rng.gauss(mean, spread)
+        else:
+            # Lognormal with the configured mean and standard deviation: long right tail like real APIs
+            sigma = math.sqrt(math.log(1 + (spread / mean) ** 2))
+            value = self._rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+        return max(value, 0.0) / 1000
+
+    def _garble(self, text: str) -> str:
+        with self._lock:
+            choice = self._rng.randrange(3)
+        if choice == 0:
+            return text[: max(1, len(text) // 2)]
+        if choice == 1:
+            return "I'm sorry, I can't produce that in the requested format right now."
+        return "Sure! Here you go:\n```\n" + text.replace('"', "'") + "\n```"
+
+    def _pick(self, population, k: int = 1):
+        with self._lock:
+            return self._rng.sample(population, k)
+
+    def _respond(self, prompt: str) -> str:
+        batch = re.search(r"Generate (\d+) UNIQUE (\w+) (multiple-choice|fill-in-the-blank) questions about (.+?)\.\n", prompt)
+        if batch:
+            count, _, kind, topic = batch.groups()
+            make = self._mcq if kind == "multiple-choice" else self._fill_blank
+            return json.dumps([make(topic) for _ in range(int(count))], indent=2)
+        single = re.search(r"Generate a UNIQUE (\w+) (multiple-choice|fill-in-the-blank) question about (.+?)\.\n", prompt)
+        if single:
+            _, kind, topic = single.groups()
+            return json.dumps(self._mcq(topic) if kind == "multiple-choice" else self._fill_blank(topic), indent=2)
+        if '"head_type"' in prompt and "knowledge graph" in prompt:
+            return json.dumps(self._graph(prompt.rsplit("Text:", 1)[-1]))
+        topic = re.search(r"technical summary of the topic: '(.+?)'", prompt)
+        if topic:
+            return self._content(topic.group(1))
+        if "Conversation History:" in prompt:
+            return self._reply(4)
+        if prompt.rstrip().endswith(("Feedback:", "Insight:", "Updated summary:")):
+            return self._reply(2)
+        return self._reply(3)
+
+    def _mcq(self, topic: str) -> dict:
+        a, b, c, d, e = self._pick(CONCEPTS, 5)
+        n = next(self._counter)
+        question = self._pick(QUESTION_PATTERNS)[0].format(topic=topic, a=a, b=b, c=c)
+        options = [f"{a} reduces the cost of {b}", f"{d} replaces {b} entirely", f"{e} only matters for {c}", f"{a} and {b} are unrelated"]
+        correct = options[0]
+        with self._lock:
+            self._rng.shuffle(options)
+        return {"question": f"{question} [#{n}]", "options": options, "correct_answer": correct}
+
+    def _fill_blank(self, topic: str) -> dict:
+        a, b, c = self._pick(CONCEPTS, 3)
+        n = next(self._counter)
+        question = self._pick(BLANK_PATTERNS)[0].format(topic=topic, b=b, c=c)
+        return {"question": f"{question} [#{n}]", "answer": a}
+
+    def _graph(self, text: str) -> list:
+        found = [c for c in CONCEPTS if c.lower() in text.lower()]
+        entities = (found or self._pick(CONCEPTS, 6))[:10]
+        if len(entities) < 2:
+            entities += self._pick([c for c in CONCEPTS if c not in entities], 2)
+        relations = []
+        for i, head in enumerate(entities):
+            tail = entities[(i + 1) % len(entities)]
+            relations.append({"head": head, "head_type": "Concept", "relation": RELATIONS[i % len(RELATIONS)], "tail": tail, "tail_type": "Concept"})
+        return relations
+
+    def _content(self, topic: str) -> str:
+        terms = self._pick(CONCEPTS, 8)
+        sentences = [f"{topic} builds on {terms[0]} and {terms[1]}."]
+        for i in range(2, len(terms), 2):
+            sentences.append(f"{terms[i]} is commonly used together with {terms[i + 1]} to keep {topic} systems efficient and correct.")
+        return " ".join(sentences)
+
+    def _reply(self, sentences: int) -> str:
+        a, b = self._pick(CONCEPTS, 2)
+        return " ".join(s.format(a=a, b=b) for s in self._pick(REPLY_SENTENCES, sentences))
+
+
+class RecordingChatModel(BaseChatModel):
+    """Delegates to a real chat model and appends every completion to a FixtureStore for later replay."""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    delegate: BaseChatModel
+    fixtures: FixtureStore
+    model_name: str
+    temperature: float = 0.9
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording-chat-model"
+
+    def _target(self) -> BaseChatModel:
+        return self.delegate.model_copy(update={"temperature": self.temperature})
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        start = time.perf_counter()
+        result = self._target()._generate(messages, stop=stop, **kwargs)
+        self.fixtures.append(self.model_name, messages_to_prompt(messages), result.generations[0].message.content, (time.perf_counter() - start) * 1000)
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        start = time.perf_counter()
+        result = await self._target()._agenerate(messages, stop=stop, **kwargs)
+        self.fixtures.append(self.model_name, messages_to_prompt(messages), result.generations[0].message.content, (time.perf_counter() - start) * 1000)
+        return result
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        start = time.perf_counter()
+        parts = []
+        async for chunk in self._target()._astream(messages, stop=stop, **kwargs):
+            parts.append(chunk.text)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        self.fixtures.append(self.model_name, messages_to_prompt(messages), "".join(parts), (time.perf_counter() - start) * 1000)
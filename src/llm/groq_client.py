@@ -1,14 +1,205 @@
+import threading
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_groq import ChatGroq
+from src.llm.fake_llm import FakeChatModel, FixtureStore, RecordingChatModel
+from src.llm.admission import admission
+from src.llm.resilience import GuardedChatModel, llm_guard
+from src.llm.response_cache import response_cache
 from src.config.settings import settings
-from typing import Optional
+from src.common.logger import get_logger
+from src.common.custom_exception import CustomException
+from typing import Dict, Optional
 
-def get_groq_llm(temperature: Optional[float] = None):
+logger = get_logger("LLMClientRegistry")
+
+
+class _PoolStats:
+    """Thread-safe counters for the shared LLM connection pool."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clients_created = 0
+        self.client_lookups = 0
+        self.requests_total = 0
+        self.request_errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def request_started(self):
+        with self._lock:
+            self.requests_total += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def request_finished(self, failed: bool):
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.request_errors += 1
+
+
+class _CountingAsyncTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats: _PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request):
+        self.stats.request_started()
+        failed = False
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.stats.request_finished(failed)
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    def __init__(self, stats: _PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request):
+        self.stats.request_started()
+        failed = False
+        try:
+            return super().handle_request(request)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.stats.request_finished(failed)
+
+
+class LLMClientRegistry:
+    """
+    Process-wide registry of chat clients. Every client shares one keep-alive HTTP connection
+    pool (sync and async), so connections and TLS sessions are reused across requests.
+    The client type follows settings.LLM_BACKEND (groq, fake, record or replay).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[str, BaseChatModel] = {}
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self._fixtures: Optional[FixtureStore] = None
+        self.stats = _PoolStats()
+
+    def _pool_options(self) -> dict:
+        return {
+            "limits": httpx.Limits(
+                max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.LLM_POOL_KEEPALIVE_EXPIRY,
+            ),
+        }
+
+    def _timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(settings.LLM_REQUEST_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+
+    def _ensure_http_clients(self):
+        if self._http_async_client is None:
+            self._http_async_client = httpx.AsyncClient(transport=_CountingAsyncTransport(self.stats, **self._pool_options()), timeout=self._timeout())
+        if self._http_client is None:
+            self._http_client = httpx.Client(transport=_CountingTransport(self.stats, **self._pool_options()), timeout=self._timeout())
+
+    def _fixture_store(self) -> FixtureStore:
+        if self._fixtures is None:
+            self._fixtures = FixtureStore(settings.LLM_FIXTURES_PATH)
+        return self._fixtures
+
+    def _build_client(self, model: str) -> BaseChatModel:
+        backend = settings.LLM_BACKEND
+        if backend in ("fake", "replay"):
+            return FakeChatModel(
+                model_name=model,
+                temperature=settings.TEMPERATURE,
+                latency_ms=settings.FAKE_LLM_LATENCY_MS,
+                latency_jitter_ms=settings.FAKE_LLM_LATENCY_JITTER_MS,
+                latency_distribution=settings.FAKE_LLM_LATENCY_DISTRIBUTION,
+                failure_rate=settings.FAKE_LLM_FAILURE_RATE,
+                garbage_rate=settings.FAKE_LLM_GARBAGE_RATE,
+                seed=settings.FAKE_LLM_SEED,
+                fixtures=self._fixture_store() if backend == "replay" else None,
+                replay_latency=settings.LLM_REPLAY_LATENCY,
+            )
+        if backend not in ("groq", "record"):
+            raise CustomException(f"Unknown LLM_BACKEND '{backend}', expected groq, fake, record or replay")
+        if not settings.GROQ_API_KEY:
+            raise CustomException("GROQ_API_KEY environment variable is not set. Please set it in your .env file, or use LLM_BACKEND=fake to run offline.")
+        self._ensure_http_clients()
+        client = ChatGroq(
+            api_key=settings.GROQ_API_KEY,
+            model=model,
+            temperature=settings.TEMPERATURE,
+            streaming=False,
+            # Retries belong to llm_guard (backoff, request budget, circuit breaker); SDK retries would multiply them
+            max_retries=0,
+            request_timeout=self._timeout(),
+            http_client=self._http_client,
+            http_async_client=self._http_async_client,
+        )
+        if backend == "record":
+            return RecordingChatModel(delegate=client, fixtures=self._fixture_store(), model_name=model, temperature=settings.TEMPERATURE)
+        return client
+
+    def get_client(self, model: str) -> BaseChatModel:
+        with self._lock:
+            self.stats.client_lookups += 1
+            client = self._clients.get(model)
+            if client is None:
+                client = self._build_client(model)
+                self._clients[model] = client
+                self.stats.clients_created += 1
+                logger.info(f"Created {settings.LLM_BACKEND} LLM client for model {model}")
+            return client
+
+    def get_stats(self) -> dict:
+        pool = getattr(getattr(self._http_async_client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        return {
+            "backend": settings.LLM_BACKEND,
+            "clients": len(self._clients),
+            "clients_created": self.stats.clients_created,
+            "client_lookups": self.stats.client_lookups,
+            "requests_total": self.stats.requests_total,
+            "request_errors": self.stats.request_errors,
+            "in_flight": self.stats.in_flight,
+            "peak_in_flight": self.stats.peak_in_flight,
+            "open_connections": len(connections),
+            "idle_connections": sum(1 for c in connections if c.is_idle()),
+            "max_connections": settings.LLM_POOL_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.LLM_POOL_MAX_KEEPALIVE,
+            "recorded_fixtures": len(self._fixtures) if self._fixtures is not None else 0,
+            "resilience": llm_guard.get_stats(),
+            "admission": admission.get_stats(),
+            "response_cache": response_cache.get_stats(),
+        }
+
+    async def aclose(self):
+        with self._lock:
+            http_client, http_async_client = self._http_client, self._http_async_client
+            self._clients.clear()
+            self._http_client = self._http_async_client = None
+        if http_async_client is not None:
+            await http_async_client.aclose()
+        if http_client is not None:
+            http_client.close()
+
+
+llm_registry = LLMClientRegistry()
+
+
+def get_groq_llm(temperature: Optional[float] = None, model: Optional[str] = None, bypass_cache: bool = False) -> BaseChatModel:
     # Use provided temperature or default to setting
     # The default setting value is 0.9
     temp = temperature if temperature is not None else settings.TEMPERATURE
-    return ChatGroq(
-        api_key = settings.GROQ_API_KEY,
-        model = settings.MODEL_NAME,
-        temperature=temp,
-        streaming=False
-    )
\ No newline at end of file
+    client = llm_registry.get_client(model or settings.MODEL_NAME)
+    # Per-call settings go on a shallow copy that shares the pooled SDK and HTTP clients,
+    # so no connection pool or TLS session is rebuilt. ChatGroq maps 0 to 1e-8 on construction.
+    return GuardedChatModel(delegate=client.model_copy(update={"temperature": temp or 1e-8}), bypass_cache=bypass_cache)
+
+
+def get_llm_pool_stats() -> dict:
+    return llm_registry.get_stats()
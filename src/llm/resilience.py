@@ -0,0 +1,397 @@
+"""
+Retry policy for outbound LLM calls. Every call made through GuardedChatModel is:
+
+- charged against the current request's LLMCallBudget (total calls, retries included, and wall time), set per HTTP
+  request by llm_call_budget() and shared by every task the request starts;
+- refused by a process-wide CircuitBreaker while the provider's recent error rate is above the threshold;
+- retried on transient provider errors (connection errors, timeouts, 429, 5xx) with exponential backoff and full
+  jitter, as long as the budget can afford the wait.
+
+Each admitted attempt then waits its turn in the admission controller (src/llm/admission.py) before it is sent.
+Callers with their own loops (quiz slots, parse retries) should stop on LLMUnavailableError rather than retry.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+import groq
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+from src.llm.admission import admission
+from src.llm.fake_llm import FakeLLMError
+from src.llm.response_cache import response_cache
+from src.llm.tokens import estimate_tokens
+from src.config.settings import settings
+from src.common.custom_exception import CustomException
+from src.common.logger import get_logger
+
+logger = get_logger("LLMGuard")
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailableError(CustomException):
+    """The call was refused before reaching the provider; retrying within the same request will not help."""
+
+
+class LLMBudgetExhaustedError(LLMUnavailableError):
+    pass
+
+
+class LLMCircuitOpenError(LLMUnavailableError):
+    pass
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (FakeLLMError, httpx.TransportError, groq.APIConnectionError, TimeoutError, ConnectionError)):
+        return True
+    return isinstance(error, groq.APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+
+class LLMCallBudget:
+    def __init__(self, max_calls: int, max_seconds: float):
+        self._lock = threading.Lock()
+        self.max_calls = max_calls
+        self.max_seconds = max_seconds
+        self.deadline = time.monotonic() + max_seconds
+        self.calls = 0
+
+    def remaining_seconds(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def charge(self):
+        with self._lock:
+            if self.calls >= self.max_calls:
+                raise LLMBudgetExhaustedError(f"Request used up its budget of {self.max_calls} LLM calls")
+            if self.remaining_seconds() <= 0:
+                raise LLMBudgetExhaustedError(f"Request used up its {self.max_seconds:g}s LLM time budget")
+            self.calls += 1
+
+
+_current_budget: ContextVar[Optional[LLMCallBudget]] = ContextVar("llm_call_budget", default=None)
+
+
+@contextmanager
+def llm_call_budget(max_calls: Optional[int] = None, max_seconds: Optional[float] = None):
+    """Caps the LLM calls made inside the block, including those of tasks started from it. Without one, calls are unbudgeted."""
+    budget = LLMCallBudget(max_calls or settings.LLM_REQUEST_MAX_CALLS, max_seconds or settings.LLM_REQUEST_MAX_SECONDS)
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+class CircuitBreaker:
+    """
+    Closed: calls pass and their outcomes are kept for LLM_BREAKER_WINDOW_SECONDS. Once at least LLM_BREAKER_MIN_CALLS
+    are in the window and LLM_BREAKER_ERROR_RATE of them failed, the circuit opens and calls fail fast for
+    LLM_BREAKER_COOLDOWN_SECONDS. Then a single probe call is let through (half-open): success closes the circuit,
+    failure re-opens it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._outcomes = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.state = "closed"
+        self.opens = 0
+
+    def before_call(self) -> bool:
+        """Raises LLMCircuitOpenError if the call may not proceed; returns True if it is the half-open probe."""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < settings.LLM_BREAKER_COOLDOWN_SECONDS:
+                    raise LLMCircuitOpenError("LLM provider is failing, circuit breaker open")
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._probing:
+                    raise LLMCircuitOpenError("LLM provider is failing, circuit breaker probing")
+                self._probing = True
+                return True
+            return False
+
+    def record(self, failed: bool, probe: bool):
+        with self._lock:
+            now = time.monotonic()
+            if probe:
+                self._probing = False
+                if failed:
+                    self._open(now)
+                else:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                    self._failures = 0
+                    logger.info("LLM circuit breaker closed")
+                return
+            self._outcomes.append((now, failed))
+            self._failures += failed
+            while self._outcomes and now - self._outcomes[0][0] > settings.LLM_BREAKER_WINDOW_SECONDS:
+                self._failures -= self._outcomes.popleft()[1]
+            total = len(self._outcomes)
+            if self.state == "closed" and total >= settings.LLM_BREAKER_MIN_CALLS and self._failures / total >= settings.LLM_BREAKER_ERROR_RATE:
+                self._open(now)
+
+    def release(self, probe: bool):
+        """The call ended without an outcome (cancelled); lets another probe through."""
+        if probe:
+            with self._lock:
+                self._probing = False
+
+    def _open(self, now: float):
+        self.state = "open"
+        self._opened_at = now
+        self.opens += 1
+        logger.warning(f"LLM circuit breaker opened ({self._failures}/{len(self._outcomes)} recent calls failed)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "opens": self.opens, "window_calls": len(self._outcomes), "window_failures": self._failures}
+
+
+class LLMGuard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.breaker = CircuitBreaker()
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.budget_exhausted = 0
+        self.circuit_rejections = 0
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _admit(self) -> bool:
+        budget = _current_budget.get()
+        # Breaker first, so a call rejected by the open circuit costs the request none of its budget
+        try:
+            probe = self.breaker.before_call()
+        except LLMCircuitOpenError:
+            self._count("circuit_rejections")
+            raise
+        try:
+            if budget is not None:
+                budget.charge()
+        except LLMBudgetExhaustedError:
+            self.breaker.release(probe)
+            self._count("budget_exhausted")
+            raise
+        self._count("calls")
+        return probe
+
+    def _failed(self, error: Exception, probe: bool, attempt: int, can_retry: bool = True) -> Optional[float]:
+        """Records a failed call; returns the backoff before retrying it, or None if the error should be raised."""
+        retryable = is_retryable(error)
+        # Only provider trouble counts towards opening the circuit; a rejected request says nothing about its health
+        self.breaker.record(retryable, probe)
+        self._count("failures")
+        if not (retryable and can_retry) or attempt >= settings.LLM_RETRY_MAX_ATTEMPTS:
+            return None
+        delay = random.uniform(0, min(settings.LLM_RETRY_MAX_DELAY_SECONDS, settings.LLM_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1)))
+        budget = _current_budget.get()
+        if budget is not None and delay >= budget.remaining_seconds():
+            return None
+        self._count("retries")
+        logger.warning(f"LLM call failed ({type(error).__name__}: {str(error)}), retrying in {delay:.2f}s (attempt {attempt + 1}/{settings.LLM_RETRY_MAX_ATTEMPTS})")
+        return delay
+
+    def _budget_timeout(self, probe: bool) -> LLMBudgetExhaustedError:
+        self.breaker.release(probe)
+        self._count("budget_exhausted")
+        return LLMBudgetExhaustedError(f"Request used up its {_current_budget.get().max_seconds:g}s LLM time budget")
+
+    async def acall(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        attempt = 0
+        while True:
+            attempt += 1
+            probe = self._admit()
+            budget = _current_budget.get()
+            try:
+                result = await asyncio.wait_for(call(), budget.remaining_seconds() if budget is not None else None)
+            except TimeoutError as e:
+                if budget is not None and budget.remaining_seconds() <= 0:
+                    raise self._budget_timeout(probe) from e
+                delay = self._failed(e, probe, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except Exception as e:
+                delay = self._failed(e, probe, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release(probe)
+                raise
+            self.breaker.record(False, probe)
+            return result
+
+    def call(self, call: Callable[[], Any]) -> Any:
+        attempt = 0
+        while True:
+            attempt += 1
+            probe = self._admit()
+            try:
+                result = call()
+            except Exception as e:
+                delay = self._failed(e, probe, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release(probe)
+                raise
+            self.breaker.record(False, probe)
+            return result
+
+    async def astream(self, stream: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Streams are retried only if they fail before the first chunk; after that the caller has already seen output."""
+        attempt = 0
+        while True:
+            attempt += 1
+            probe = self._admit()
+            started = False
+            try:
+                async for chunk in stream():
+                    started = True
+                    yield chunk
+            except Exception as e:
+                delay = self._failed(e, probe, attempt, can_retry=not started)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release(probe)
+                raise
+            self.breaker.record(False, probe)
+            return
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = {"calls": self.calls, "failures": self.failures, "retries": self.retries, "budget_exhausted": self.budget_exhausted, "circuit_rejections": self.circuit_rejections}
+        return {**stats, "circuit": self.breaker.stats()}
+
+
+llm_guard = LLMGuard()
+
+
+class GuardedChatModel(BaseChatModel):
+    """Runs every call of the wrapped chat model through llm_guard. Tool binding is delegated, so structured output
+    keeps working exactly as it does on the wrapped model. Low-temperature completions are answered from
+    response_cache when possible; pass bypass_cache=True (per call, or on the model) to always ask the provider."""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    delegate: BaseChatModel
+    bypass_cache: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return self.delegate._llm_type
+
+    @property
+    def _identifying_params(self) -> dict:
+        return self.delegate._identifying_params
+
+    def bind_tools(self, tools, **kwargs):
+        # The delegate formats the tools for its provider; the resulting call kwargs are bound to this wrapper instead
+        return self.bind(**self.delegate.bind_tools(tools, **kwargs).kwargs)
+
+    def _cache_key(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: dict) -> Optional[str]:
+        """Pops the per-call bypass_cache flag from kwargs; returns the response cache key, or None if the call is not cached."""
+        bypass = kwargs.pop("bypass_cache", False) or self.bypass_cache
+        temperature = getattr(self.delegate, "temperature", None)
+        if not response_cache.is_cacheable(temperature):
+            return None
+        if bypass:
+            response_cache.record_bypass()
+            return None
+        return response_cache.key(getattr(self.delegate, "model_name", self._llm_type), temperature, messages, stop, kwargs)
+
+    @staticmethod
+    def _estimate_tokens(messages: List[BaseMessage]) -> int:
+        return sum(estimate_tokens(str(m.content)) for m in messages) + settings.LLM_ADMISSION_COMPLETION_TOKENS
+
+    @staticmethod
+    def _settle(estimated: int, result: ChatResult):
+        usage = getattr(result.generations[0].message, "usage_metadata", None) if result.generations else None
+        admission.settle(estimated, usage.get("total_tokens") if usage else None)
+
+    @staticmethod
+    def _check_rate_limited(error: Exception):
+        if isinstance(error, groq.RateLimitError):
+            admission.on_rate_limited()
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        key = self._cache_key(messages, stop, kwargs)
+        if key is not None and (cached := response_cache.get(key)) is not None:
+            return cached
+        estimated = self._estimate_tokens(messages)
+
+        def attempt() -> ChatResult:
+            admission.acquire_sync(estimated)
+            try:
+                result = self.delegate._generate(messages, stop=stop, **kwargs)
+            except Exception as e:
+                self._check_rate_limited(e)
+                raise
+            self._settle(estimated, result)
+            return result
+        result = llm_guard.call(attempt)
+        if key is not None:
+            response_cache.set(key, result)
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        key = self._cache_key(messages, stop, kwargs)
+        if key is not None and (cached := await response_cache.aget(key)) is not None:
+            return cached
+        estimated = self._estimate_tokens(messages)
+
+        async def attempt() -> ChatResult:
+            await admission.acquire(estimated)
+            try:
+                result = await self.delegate._agenerate(messages, stop=stop, **kwargs)
+            except Exception as e:
+                self._check_rate_limited(e)
+                raise
+            self._settle(estimated, result)
+            return result
+        result = await llm_guard.acall(attempt)
+        if key is not None:
+            await response_cache.aset(key, result)
+        return result
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        # Streams (tutor replies) are never cached
+        kwargs.pop("bypass_cache", None)
+        estimated = self._estimate_tokens(messages)
+
+        async def attempt() -> AsyncIterator[ChatGenerationChunk]:
+            await admission.acquire(estimated)
+            try:
+                async for chunk in self.delegate._astream(messages, stop=stop, **kwargs):
+                    yield chunk
+            except Exception as e:
+                self._check_rate_limited(e)
+                raise
+
+        # BaseChatModel.astream reports each yielded chunk to the callbacks itself
+        async for chunk in llm_guard.astream(attempt):
+            yield chunk
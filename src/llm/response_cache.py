@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import json
+import threading
+from typing import List, Optional
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from src.common.cache import LRUCache, SQLiteCache
+from src.config.settings import settings
+
+
+class ResponseCache:
+    """
+    Completions of near-deterministic calls (temperature <= LLM_CACHE_MAX_TEMPERATURE, e.g. topic content at 0.1 and
+    graph extraction at 0), keyed by model, temperature and a hash of the prompt, stop words and bound call options
+    (tools). Level 1 is an in-memory LRU, level 2 an optional SQLite file shared across restarts and workers.
+    """
+
+    def __init__(self):
+        self.memory = LRUCache(max_entries=settings.LLM_CACHE_MEMORY_ENTRIES, ttl_seconds=settings.LLM_CACHE_TTL_SECONDS, max_bytes=settings.LLM_CACHE_MEMORY_MAX_BYTES)
+        self._store: Optional[SQLiteCache] = None
+        self._lock = threading.Lock()
+        self.bypassed = 0
+
+    def store(self) -> Optional[SQLiteCache]:
+        # Opened on first use so importing the client never creates the cache file
+        if self._store is None and settings.LLM_CACHE_PATH:
+            with self._lock:
+                if self._store is None:
+                    self._store = SQLiteCache(settings.LLM_CACHE_PATH, ttl_seconds=settings.LLM_CACHE_TTL_SECONDS, max_bytes=settings.LLM_CACHE_MAX_BYTES)
+        return self._store
+
+    @staticmethod
+    def is_cacheable(temperature: Optional[float]) -> bool:
+        return settings.LLM_CACHE_ENABLED and temperature is not None and temperature <= settings.LLM_CACHE_MAX_TEMPERATURE
+
+    @staticmethod
+    def key(model: str, temperature: float, messages: List[BaseMessage], stop: Optional[List[str]], options: dict) -> str:
+        request = json.dumps({"messages": messages_to_dict(messages), "stop": stop, "options": options}, sort_keys=True, default=str)
+        return f"{model}:{round(temperature, 3)}:{hashlib.sha256(request.encode('utf-8')).hexdigest()}"
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def get(self, key: str) -> Optional[ChatResult]:
+        payload = self.memory.get(key)
+        return self._decode(payload if payload is not None else self._get_stored(key))
+
+    async def aget(self, key: str) -> Optional[ChatResult]:
+        """Like get, but the SQLite level is read on a worker thread so the event loop never waits on disk."""
+        payload = self.memory.get(key)
+        if payload is None and settings.LLM_CACHE_PATH:
+            payload = await asyncio.to_thread(self._get_stored, key)
+        return self._decode(payload)
+
+    def set(self, key: str, result: ChatResult):
+        payload = self._encode(result)
+        self.memory.set(key, payload)
+        self._set_stored(key, payload)
+
+    async def aset(self, key: str, result: ChatResult):
+        payload = self._encode(result)
+        self.memory.set(key, payload)
+        if settings.LLM_CACHE_PATH:
+            await asyncio.to_thread(self._set_stored, key, payload)
+
+    def _get_stored(self, key: str) -> Optional[str]:
+        store = self.store()
+        stored = store.get(key) if store is not None else None
+        if stored is None:
+            return None
+        payload = stored.decode("utf-8")
+        self.memory.set(key, payload)
+        return payload
+
+    def _set_stored(self, key: str, payload: str):
+        store = self.store()
+        if store is not None:
+            store.set(key, payload)
+
+    @staticmethod
+    def _encode(result: ChatResult) -> str:
+        return json.dumps(messages_to_dict([generation.message for generation in result.generations]), default=str)
+
+    @staticmethod
+    def _decode(payload: Optional[str]) -> Optional[ChatResult]:
+        if payload is None:
+            return None
+        return ChatResult(generations=[ChatGeneration(message=message) for message in messages_from_dict(json.loads(payload))])
+
+    def clear(self):
+        """Drops every cached response, in memory and in the SQLite store."""
+        self.memory.clear()
+        if self.store() is not None:
+            self._store.clear()
+
+    def get_stats(self) -> dict:
+        memory = self.memory.stats()
+        store = self._store.stats() if self._store is not None else None
+        lookups = memory["hits"] + memory["misses"]
+        hits = memory["hits"] + (store["hits"] if store else 0)
+        return {
+            "enabled": settings.LLM_CACHE_ENABLED,
+            "max_temperature": settings.LLM_CACHE_MAX_TEMPERATURE,
+            "lookups": lookups,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "bypassed": self.bypassed,
+            "memory": memory,
+            "store": store,
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,39 @@
+import asyncio
+from langchain_core.callbacks import AsyncCallbackHandler
+from src.llm.fake_llm import FakeChatModel
+from src.llm.resilience import GuardedChatModel
+
+PROMPT = "Student: what is a generator?\n\nTutor:"
+
+
+class TokenCounter(AsyncCallbackHandler):
+    def __init__(self):
+        self.tokens = []
+
+    async def on_llm_new_token(self, token, **kwargs):
+        self.tokens.append(token)
+
+
+def fake(**kwargs) -> FakeChatModel:
+    return FakeChatModel(latency_ms=0, latency_jitter_ms=0, latency_distribution="fixed", seed=1, **kwargs)
+
+
+def stream_with_counter(llm):
+    counter = TokenCounter()
+
+    async def run():
+        return [chunk.content async for chunk in llm.astream(PROMPT, config={"callbacks": [counter]})]
+    return asyncio.run(run()), counter.tokens
+
+
+def test_streamed_tokens_reach_callbacks_once():
+    chunks, tokens = stream_with_counter(GuardedChatModel(delegate=fake(temperature=0.7)))
+    assert len(chunks) > 1
+    assert tokens == chunks
+
+
+def test_streamed_generation_reports_each_token_once():
+    counter = TokenCounter()
+    reply = asyncio.run(GuardedChatModel(delegate=fake(temperature=0.7)).ainvoke(PROMPT, config={"callbacks": [counter]}, stream=True))
+    assert len(counter.tokens) > 1
+    assert "".join(counter.tokens) == reply.content
@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from src.common.cache import SQLiteCache
+from src.config.settings import settings
+from src.llm import resilience
+from src.llm.fake_llm import FakeChatModel
+from src.llm.resilience import GuardedChatModel, llm_guard
+from src.llm.response_cache import ResponseCache
+
+PROMPT = "Explain recursion in one sentence."
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_CACHE_PATH", str(tmp_path / "responses.db"))
+    cache = ResponseCache()
+    monkeypatch.setattr(resilience, "response_cache", cache)
+    return cache
+
+
+def model(temperature: float) -> GuardedChatModel:
+    return GuardedChatModel(delegate=FakeChatModel(temperature=temperature, latency_ms=0, latency_jitter_ms=0, latency_distribution="fixed", seed=1))
+
+
+def provider_calls(invoke) -> int:
+    before = llm_guard.calls
+    invoke()
+    return llm_guard.calls - before
+
+
+def result(text: str) -> ChatResult:
+    return ChatResult(generations=[ChatGeneration(message=AIMessage(text))])
+
+
+def test_repeated_low_temperature_call_is_answered_from_cache(cache):
+    llm = model(0.1)
+    replies = []
+    assert provider_calls(lambda: replies.append(asyncio.run(llm.ainvoke(PROMPT)).content)) == 1
+    assert provider_calls(lambda: replies.append(asyncio.run(llm.ainvoke(PROMPT)).content)) == 0
+    assert provider_calls(lambda: replies.append(llm.invoke(PROMPT).content)) == 0
+    assert len(set(replies)) == 1
+    assert cache.get_stats()["hits"] == 2
+
+
+def test_bypass_and_high_temperature_calls_always_reach_the_provider(cache):
+    llm = model(0.1)
+    assert provider_calls(lambda: [asyncio.run(llm.ainvoke(PROMPT, bypass_cache=True)) for _ in range(2)]) == 2
+    assert provider_calls(lambda: [asyncio.run(model(0.1).model_copy(update={"bypass_cache": True}).ainvoke(PROMPT)) for _ in range(2)]) == 2
+    assert provider_calls(lambda: [asyncio.run(model(0.7).ainvoke(PROMPT)) for _ in range(2)]) == 2
+    stats = cache.get_stats()
+    assert stats["bypassed"] == 4 and stats["memory"]["entries"] == 0
+
+
+def test_sqlite_level_survives_restart_until_cleared(cache):
+    key = cache.key("m", 0.0, [HumanMessage(PROMPT)], None, {})
+    asyncio.run(cache.aset(key, result("Stored")))
+
+    restarted = ResponseCache()
+    assert asyncio.run(restarted.aget(key)).generations[0].message.content == "Stored"
+    assert restarted.get_stats()["store"]["hits"] == 1
+
+    restarted.clear()
+    assert ResponseCache().get(key) is None
+    assert restarted.get(key) is None
+
+
+def test_sqlite_cache_keeps_a_running_byte_total(tmp_path):
+    store = SQLiteCache(str(tmp_path / "store.db"), max_bytes=30)
+    store.set("a", b"x" * 10)
+    store.set("b", b"y" * 10)
+    store.set("a", b"z" * 5)
+    assert store._bytes == store.stats()["bytes"] == 15
+    store.get("b")
+    store.set("c", b"w" * 20)
+    # Over 30 bytes: the least recently used entry ("a") goes first
+    assert store.get("a") is None and store.get("b") == b"y" * 10
+    assert store._bytes == store.stats()["bytes"] == 30
+    store.delete("b")
+    assert store._bytes == store.stats()["bytes"] == 20
+    assert SQLiteCache(str(tmp_path / "store.db"))._bytes == 20
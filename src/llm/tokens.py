@@ -0,0 +1,18 @@
+import math
+
+# English prose and code average about four characters per token for the models we use; close enough for
+# budgeting prompts without shipping a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """Shortens text to about max_tokens, keeping its head and tail (where questions and error messages usually are)."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    keep = max(max_tokens * CHARS_PER_TOKEN - 40, 0)
+    head, tail = text[:keep * 2 // 3], text[len(text) - keep // 3:] if keep // 3 else ""
+    return f"{head}\n...[{len(text) - len(head) - len(tail)} characters omitted]...\n{tail}"
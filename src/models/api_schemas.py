@@ -10,6 +10,7 @@ class QuizSettings(BaseModel):
     question_type: str = Field(..., description="The type of question: 'Multiple Choice' or 'Fill in the blank'.")
     difficulty: str = Field(..., description="The difficulty level: 'easy', 'medium', or 'hard'.")
     num_questions: int = Field(5, description="The number of questions to generate (max 10).", ge=1, le=10)
+    student_id: Optional[str] = Field(None, description="Student requesting the quiz; banked questions are never served to the same student twice.")
 
 class QuizQuestion(BaseModel):
     """Structure for a single question in the quiz response."""
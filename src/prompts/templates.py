@@ -94,4 +94,108 @@ tutor_system_prompt = (
     "If you genuinely don't know something, admit it honestly rather than guessing. "
     "Use clear examples and practical scenarios to illustrate concepts. "
     "Be encouraging and patient, adapting explanations to the student's level."
-)
\ No newline at end of file
+)
+
+conversation_summary_prompt_template = PromptTemplate(
+    template=(
+        "You maintain a running summary of a tutoring conversation between a student and an AI tutor.\n"
+        "Update the summary with the new messages below. Keep the topics covered, what the student understood or "
+        "struggled with, and any open questions. Drop greetings and code listings. Use at most {max_words} words.\n\n"
+        "Current summary:\n{summary}\n\n"
+        "New messages:\n{messages}\n\n"
+        "Updated summary:"
+    ),
+    input_variables=["summary", "messages", "max_words"]
+)
+
+mcq_batch_prompt_template = PromptTemplate(
+    template=(
+        "Generate {count} UNIQUE {difficulty} multiple-choice questions about {topic}.\n"
+        "IMPORTANT: Each question must cover a different aspect of the topic.\n"
+        "Do not repeat or rephrase a question within the list.\n\n"
+        "Return ONLY a JSON array of {count} objects, each with these exact fields:\n"
+        "- 'question': A clear, specific question that tests understanding\n"
+        "- 'options': An array of exactly 4 plausible answers\n"
+        "- 'correct_answer': One of the options that is the correct answer\n\n"
+        "Example format:\n"
+        '[\n'
+        '    {{\n'
+        '        "question": "What is the capital of France?",\n'
+        '        "options": ["London", "Berlin", "Paris", "Madrid"],\n'
+        '        "correct_answer": "Paris"\n'
+        '    }}\n'
+        ']\n\n'
+        "Your response:"
+    ),
+    input_variables=["count", "topic", "difficulty"]
+)
+
+mcq_batch_prompt_with_context_template = PromptTemplate(
+    template=(
+        "Generate {count} UNIQUE {difficulty} multiple-choice questions about {topic}.\n\n"
+        "CRITICAL: Avoid generating questions similar to these already created:\n"
+        "{previous_questions}\n\n"
+        "Requirements:\n"
+        "1. Every question MUST cover a DIFFERENT aspect or concept\n"
+        "2. DO NOT rephrase or slightly modify existing questions\n"
+        "3. Do not repeat a question within the list\n\n"
+        "Return ONLY a JSON array of {count} objects, each with these exact fields:\n"
+        "- 'question': A clear, specific question testing DIFFERENT knowledge\n"
+        "- 'options': An array of exactly 4 plausible answers\n"
+        "- 'correct_answer': One of the options that is the correct answer\n\n"
+        "Example format:\n"
+        '[\n'
+        '    {{\n'
+        '        "question": "What is the capital of France?",\n'
+        '        "options": ["London", "Berlin", "Paris", "Madrid"],\n'
+        '        "correct_answer": "Paris"\n'
+        '    }}\n'
+        ']\n\n'
+        "Your response:"
+    ),
+    input_variables=["count", "topic", "difficulty", "previous_questions"]
+)
+
+fill_blank_batch_prompt_template = PromptTemplate(
+    template=(
+        "Generate {count} UNIQUE {difficulty} fill-in-the-blank questions about {topic}.\n"
+        "IMPORTANT: Each question must cover a different aspect of the topic.\n"
+        "Do not repeat or rephrase a question within the list.\n\n"
+        "Return ONLY a JSON array of {count} objects, each with these exact fields:\n"
+        "- 'question': A sentence with '_____' marking where the blank should be\n"
+        "- 'answer': The correct word or phrase that belongs in the blank\n\n"
+        "Example format:\n"
+        '[\n'
+        '    {{\n'
+        '        "question": "The capital of France is _____.",\n'
+        '        "answer": "Paris"\n'
+        '    }}\n'
+        ']\n\n'
+        "Your response:"
+    ),
+    input_variables=["count", "topic", "difficulty"]
+)
+
+fill_blank_batch_prompt_with_context_template = PromptTemplate(
+    template=(
+        "Generate {count} UNIQUE {difficulty} fill-in-the-blank questions about {topic}.\n\n"
+        "CRITICAL: Avoid generating questions similar to these already created:\n"
+        "{previous_questions}\n\n"
+        "Requirements:\n"
+        "1. Every question MUST cover a DIFFERENT aspect or concept\n"
+        "2. DO NOT rephrase or slightly modify existing questions\n"
+        "3. Do not repeat a question within the list\n\n"
+        "Return ONLY a JSON array of {count} objects, each with these exact fields:\n"
+        "- 'question': A sentence with '_____' marking where the blank should be\n"
+        "- 'answer': The correct word or phrase that belongs in the blank\n\n"
+        "Example format:\n"
+        '[\n'
+        '    {{\n'
+        '        "question": "The capital of France is _____.",\n'
+        '        "answer": "Paris"\n'
+        '    }}\n'
+        ']\n\n'
+        "Your response:"
+    ),
+    input_variables=["count", "topic", "difficulty", "previous_questions"]
+)
@@ -1,32 +1,221 @@
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from src.database.database import AsyncSessionLocal
 from src.database.models import Conversation, ChatMessageDB
 from src.models.api_schemas import ChatMessage
 from src.llm.groq_client import get_groq_llm
-from src.prompts.templates import tutor_system_prompt
-from typing import List
+from src.llm.resilience import llm_call_budget
+from src.llm.admission import PRIORITY_BACKGROUND, llm_caller
+from src.services.conversation_context import ConversationContextManager, ConversationWindow
+from src.common.cache import LRUCache
+from src.common.logger import get_logger
+from src.config.settings import settings
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import threading
+import time
 import uuid
 
+@dataclass
+class _InFlight:
+    loads: int = 0
+    appends: int = 0
+    # Bumped when an append begins and when it ends
+    epoch: int = 0
+
 class ChatService:
-    def create_or_get_conversation(self, db: Session, student_id: str, conversation_id: str = None) -> str:
+    def __init__(self):
+        self.logger = get_logger(self.__class__.__name__)
+        # conversation_id -> ConversationWindow (summary plus last CHAT_CONTEXT_MESSAGES messages), kept current write-through
+        self.context_cache = LRUCache(max_entries=settings.CHAT_CONTEXT_CACHE_CONVERSATIONS)
+        self._cache_lock = threading.Lock()
+        # conversation_id -> window loads and message appends in flight, kept only while there are any. A load only
+        # caches what it read if no append began or ended meanwhile, so it can never cache a window missing a message
+        self._inflight: Dict[str, _InFlight] = {}
+        self.context = ConversationContextManager()
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
+
+    def create_or_get_conversation(self, db: Session, student_id: str, conversation_id: str = None, commit: bool = True) -> str:
         if conversation_id:
             return conversation_id
         new_id = f"conv_{uuid.uuid4().hex[:12]}"
         db.add(Conversation(id=new_id, student_id=student_id))
-        db.commit()
+        if commit:
+            db.commit()
+        # A new conversation has no history, so it can be served from the cache straight away
+        self.context_cache.set(new_id, ConversationWindow())
         return new_id
 
     def add_message_to_history(self, db: Session, conversation_id: str, role: str, content: str):
-        db.add(ChatMessageDB(conversation_id=conversation_id, role=role, content=content))
-        db.commit()
+        message = ChatMessageDB(conversation_id=conversation_id, role=role, content=content, timestamp=datetime.utcnow())
+        db.add(message)
+        self._begin(conversation_id, appending=True)
+        committed = False
+        try:
+            db.commit()
+            committed = True
+        finally:
+            self._end_append(conversation_id, ChatMessage(role=role, content=content, timestamp=message.timestamp) if committed else None)
+
+    def start_turn(self, db: Session, student_id: str, conversation_id: str, message: str) -> str:
+        """Creates the conversation if needed and stores the student's message, in one commit."""
+        conv_id = self.create_or_get_conversation(db, student_id, conversation_id, commit=False)
+        self.add_message_to_history(db, conv_id, "student", message)
+        return conv_id
+
+    def _begin(self, conversation_id: str, appending: bool) -> int:
+        """Registers a load or append in flight and returns the conversation's epoch."""
+        with self._cache_lock:
+            flight = self._inflight.setdefault(conversation_id, _InFlight())
+            if appending:
+                flight.appends += 1
+                flight.epoch += 1
+            else:
+                flight.loads += 1
+            return flight.epoch
+
+    def _finish(self, conversation_id: str, flight: _InFlight, appending: bool):
+        """Unregisters a load or append. Holds _cache_lock."""
+        if appending:
+            flight.appends -= 1
+        else:
+            flight.loads -= 1
+        if not flight.loads and not flight.appends:
+            del self._inflight[conversation_id]
+
+    def _end_append(self, conversation_id: str, message: Optional[ChatMessage]):
+        with self._cache_lock:
+            flight = self._inflight[conversation_id]
+            flight.epoch += 1
+            window = self.context_cache.get(conversation_id)
+            # Only extend a cached window; an uncached conversation is loaded in full on its next read
+            if message is not None and window is not None:
+                self.context_cache.set(conversation_id, window.append(message, settings.CHAT_CONTEXT_MESSAGES))
+            self._finish(conversation_id, flight, appending=True)
+
+    def get_window(self, db: Session, conversation_id: str) -> ConversationWindow:
+        window = self.context_cache.get(conversation_id)
+        return window if window is not None else self._load_window(db, conversation_id)
+
+    def _load_window(self, db: Session, conversation_id: str) -> ConversationWindow:
+        epoch = self._begin(conversation_id, appending=False)
+        try:
+            conversation = db.get(Conversation, conversation_id)
+            message_count = db.query(func.count(ChatMessageDB.id)).filter(ChatMessageDB.conversation_id == conversation_id).scalar()
+            messages = db.query(ChatMessageDB).filter(ChatMessageDB.conversation_id == conversation_id).order_by(ChatMessageDB.timestamp.desc(), ChatMessageDB.id.desc()).limit(settings.CHAT_CONTEXT_MESSAGES).all()
+            window = ConversationWindow(
+                summary=(conversation.summary or "") if conversation else "",
+                summarized_count=conversation.summarized_message_count if conversation else 0,
+                message_count=message_count,
+                messages=tuple(ChatMessage(role=msg.role, content=msg.content, timestamp=msg.timestamp) for msg in reversed(messages)),
+            )
+        finally:
+            with self._cache_lock:
+                flight = self._inflight[conversation_id]
+                # An append that began or ended meanwhile may be missing from what was read; the next read reloads
+                fresh = flight.epoch == epoch and not flight.appends
+                self._finish(conversation_id, flight, appending=False)
+        if fresh:
+            with self._cache_lock:
+                if self.context_cache.get(conversation_id) is None:
+                    self.context_cache.set(conversation_id, window)
+        return window
+
+    def _load_messages(self, db: Session, conversation_id: str, start: int, stop: int) -> List[ChatMessageDB]:
+        return db.query(ChatMessageDB).filter(ChatMessageDB.conversation_id == conversation_id).order_by(ChatMessageDB.timestamp, ChatMessageDB.id).offset(start).limit(stop - start).all()
 
     def format_conversation_context(self, db: Session, conversation_id: str) -> List[ChatMessage]:
-        messages = db.query(ChatMessageDB).filter(ChatMessageDB.conversation_id == conversation_id).order_by(ChatMessageDB.timestamp.desc()).limit(10).all()
-        return [ChatMessage(role=msg.role, content=msg.content, timestamp=msg.timestamp) for msg in reversed(messages)]
+        return list(self.get_window(db, conversation_id).messages)
+
+    def build_tutor_prompt(self, db: Session, conversation_id: str) -> str:
+        return self.context.build_prompt(self.get_window(db, conversation_id)).text
+
+    # Async variants for async endpoints: the sync methods run on the AsyncSession's Session via run_sync,
+    # so the database I/O is awaited instead of blocking the event loop
+    async def acreate_or_get_conversation(self, db: AsyncSession, student_id: str, conversation_id: str = None) -> str:
+        return await db.run_sync(self.create_or_get_conversation, student_id, conversation_id)
 
-    async def get_tutor_response(self, db: Session, conversation_id: str, student_message: str) -> str:
-        context = self.format_conversation_context(db, conversation_id)
-        history_text = "\n".join([f"{msg.role.capitalize()}: {msg.content}" for msg in context])
-        prompt = f"{tutor_system_prompt}\n\nConversation History:\n{history_text}\n\nTutor:"
+    async def aadd_message_to_history(self, db: AsyncSession, conversation_id: str, role: str, content: str):
+        await db.run_sync(self.add_message_to_history, conversation_id, role, content)
+
+    async def astart_turn(self, db: AsyncSession, student_id: str, conversation_id: str, message: str) -> str:
+        return await db.run_sync(self.start_turn, student_id, conversation_id, message)
+
+    async def aget_window(self, db: AsyncSession, conversation_id: str) -> ConversationWindow:
+        # Cache hits are answered without a trip through the session
+        window = self.context_cache.get(conversation_id)
+        return window if window is not None else await db.run_sync(self._load_window, conversation_id)
+
+    async def aformat_conversation_context(self, db: AsyncSession, conversation_id: str) -> List[ChatMessage]:
+        return list((await self.aget_window(db, conversation_id)).messages)
+
+    async def abuild_tutor_prompt(self, db: AsyncSession, conversation_id: str) -> str:
+        return self.context.build_prompt(await self.aget_window(db, conversation_id)).text
+
+    async def get_tutor_response(self, db: AsyncSession, conversation_id: str, student_message: str) -> str:
+        prompt = await self.abuild_tutor_prompt(db, conversation_id)
+        # A cache miss read the window on the session; release its connection while the LLM answers
+        await db.commit()
         llm = get_groq_llm(temperature=0.7)
+        start = time.perf_counter()
         response = await llm.ainvoke(prompt)
+        self.context.metrics.record_latency((time.perf_counter() - start) * 1000)
         return response.content
+
+    async def stream_tutor_response(self, prompt: str) -> AsyncIterator[str]:
+        """Yields the tutor reply token by token as the model produces it."""
+        llm = get_groq_llm(temperature=0.7)
+        start = time.perf_counter()
+        async for chunk in llm.astream(prompt):
+            if chunk.content:
+                yield chunk.content
+        self.context.metrics.record_latency((time.perf_counter() - start) * 1000)
+
+    def schedule_summary_refresh(self, conversation_id: str):
+        """Folds turns that no longer fit the prompt into the conversation's rolling summary, in the background."""
+        window = self.context_cache.get(conversation_id)
+        if conversation_id in self._summary_tasks or (window is not None and not self.context.needs_summary(window)):
+            return
+        # An uncached window (evicted, restarted, or caching disabled for multi-worker setups) is loaded by the task
+        task = asyncio.create_task(self._refresh_summary(conversation_id, window))
+        self._summary_tasks[conversation_id] = task
+        task.add_done_callback(lambda _: self._summary_tasks.pop(conversation_id, None))
+
+    async def _refresh_summary(self, conversation_id: str, window: Optional[ConversationWindow]):
+        try:
+            async with AsyncSessionLocal() as db:
+                if window is None:
+                    window = await db.run_sync(self._load_window, conversation_id)
+                if not self.context.needs_summary(window):
+                    return
+                target = self.context.summary_target(window)
+                messages = await db.run_sync(self._load_messages, conversation_id, window.summarized_count, target)
+            # Runs after the request that scheduled it, so it neither draws on that request's LLM budget nor
+            # competes with live tutor replies
+            with llm_call_budget(), llm_caller(PRIORITY_BACKGROUND):
+                response = await get_groq_llm(temperature=0.3).ainvoke(self.context.build_summary_prompt(window.summary, messages))
+            summary = self.context.clip_summary(response.content)
+            async with AsyncSessionLocal() as db:
+                # Guarded on the count we summarized from, so a concurrent refresh (e.g. another worker) wins cleanly
+                result = await db.execute(update(Conversation).where(Conversation.id == conversation_id, Conversation.summarized_message_count == window.summarized_count).values(summary=summary, summarized_message_count=target))
+                await db.commit()
+        except Exception as e:
+            self.context.metrics.record_summary(None)
+            self.logger.error(f"Failed to refresh summary for conversation {conversation_id}: {str(e)}")
+            return
+
+        with self._cache_lock:
+            current = self.context_cache.get(conversation_id)
+            if not result.rowcount:
+                self.context_cache.delete(conversation_id)
+            elif current is not None and current.summarized_count == window.summarized_count:
+                self.context_cache.set(conversation_id, replace(current, summary=summary, summarized_count=target))
+        if result.rowcount:
+            self.context.metrics.record_summary(target - window.summarized_count)
+            self.logger.info(f"Summarized {target - window.summarized_count} messages of conversation {conversation_id}")
+
+    def get_stats(self) -> dict:
+        return {"context_cache": self.context_cache.stats(), "prompts": self.context.metrics.stats(), "summaries_in_flight": len(self._summary_tasks)}
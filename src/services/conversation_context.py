@@ -0,0 +1,148 @@
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from src.config.settings import settings
+from src.llm.tokens import clip_to_tokens, estimate_tokens
+from src.models.api_schemas import ChatMessage
+from src.prompts.templates import conversation_summary_prompt_template, tutor_system_prompt
+
+
+@dataclass(frozen=True)
+class ConversationWindow:
+    """What a tutor prompt is built from: the rolling summary and the most recent messages of a conversation."""
+    summary: str = ""
+    summarized_count: int = 0
+    message_count: int = 0
+    messages: Tuple[ChatMessage, ...] = ()
+
+    def append(self, message: ChatMessage, keep: int) -> "ConversationWindow":
+        return ConversationWindow(self.summary, self.summarized_count, self.message_count + 1, (self.messages + (message,))[-keep:] if keep > 0 else ())
+
+
+@dataclass
+class TutorPrompt:
+    text: str
+    tokens: int
+    # Index of the first message sent verbatim; anything before it should be covered by the summary
+    first_message_index: int
+    truncated_messages: int = 0
+
+
+class PromptMetrics:
+    """Thread-safe prompt size and tutor latency counters, with percentiles over a recent sample."""
+    def __init__(self, sample_size: int = 1000):
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.prompt_tokens_total = 0
+        self.prompt_tokens_max = 0
+        self.truncated_messages = 0
+        self.dropped_messages = 0
+        self.summaries_refreshed = 0
+        self.summary_failures = 0
+        self.messages_summarized = 0
+        self._prompt_tokens = deque(maxlen=sample_size)
+        self._latencies_ms = deque(maxlen=sample_size)
+
+    def record_prompt(self, prompt: TutorPrompt, dropped: int):
+        with self._lock:
+            self.prompts += 1
+            self.prompt_tokens_total += prompt.tokens
+            self.prompt_tokens_max = max(self.prompt_tokens_max, prompt.tokens)
+            self.truncated_messages += prompt.truncated_messages
+            self.dropped_messages += dropped
+            self._prompt_tokens.append(prompt.tokens)
+
+    def record_latency(self, latency_ms: float):
+        with self._lock:
+            self._latencies_ms.append(latency_ms)
+
+    def record_summary(self, folded: Optional[int]):
+        with self._lock:
+            if folded is None:
+                self.summary_failures += 1
+            else:
+                self.summaries_refreshed += 1
+                self.messages_summarized += folded
+
+    @staticmethod
+    def _percentile(values, pct: float) -> float:
+        if not values:
+            return 0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+    def stats(self) -> dict:
+        with self._lock:
+            tokens, latencies = list(self._prompt_tokens), list(self._latencies_ms)
+            return {
+                "prompts": self.prompts,
+                "prompt_tokens_avg": round(self.prompt_tokens_total / self.prompts, 1) if self.prompts else 0.0,
+                "prompt_tokens_p50": self._percentile(tokens, 0.5),
+                "prompt_tokens_p95": self._percentile(tokens, 0.95),
+                "prompt_tokens_max": self.prompt_tokens_max,
+                "prompt_token_budget": settings.CHAT_PROMPT_TOKEN_BUDGET,
+                "truncated_messages": self.truncated_messages,
+                "dropped_messages": self.dropped_messages,
+                "summaries_refreshed": self.summaries_refreshed,
+                "summary_failures": self.summary_failures,
+                "messages_summarized": self.messages_summarized,
+                "reply_latency_ms_p50": round(self._percentile(latencies, 0.5), 1),
+                "reply_latency_ms_p95": round(self._percentile(latencies, 0.95), 1),
+            }
+
+
+class ConversationContextManager:
+    """Fits tutor prompts into CHAT_PROMPT_TOKEN_BUDGET: the system prompt, the rolling summary, then as many of the
+    newest unsummarized messages as fit (each clipped to CHAT_MESSAGE_TOKEN_LIMIT), newest first."""
+
+    def __init__(self):
+        self.metrics = PromptMetrics()
+
+    def _header(self, summary: str) -> str:
+        header = tutor_system_prompt
+        if summary:
+            header += f"\n\nSummary of the conversation so far:\n{summary}"
+        return header + "\n\nConversation History:\n"
+
+    def build_prompt(self, window: ConversationWindow, record: bool = True) -> TutorPrompt:
+        header, footer = self._header(window.summary), "\n\nTutor:"
+        available = settings.CHAT_PROMPT_TOKEN_BUDGET - estimate_tokens(header) - estimate_tokens(footer)
+        window_start = window.message_count - len(window.messages)
+        candidates = list(window.messages)[max(window.summarized_count - window_start, 0):]
+
+        lines, truncated = [], 0
+        for message in reversed(candidates):
+            # The newest message is always sent, clipped to whatever room is left
+            limit = settings.CHAT_MESSAGE_TOKEN_LIMIT if lines else min(settings.CHAT_MESSAGE_TOKEN_LIMIT, max(available - 4, 0))
+            content = clip_to_tokens(message.content, limit)
+            line = f"{message.role.capitalize()}: {content}"
+            cost = estimate_tokens(line) + 1
+            if lines and cost > available:
+                break
+            truncated += content != message.content
+            lines.append(line)
+            available -= cost
+
+        text = header + "\n".join(reversed(lines)) + footer
+        prompt = TutorPrompt(text=text, tokens=estimate_tokens(text), first_message_index=window.message_count - len(lines), truncated_messages=truncated)
+        if record:
+            self.metrics.record_prompt(prompt, dropped=max(prompt.first_message_index - window.summarized_count, 0))
+        return prompt
+
+    def needs_summary(self, window: ConversationWindow) -> bool:
+        """True when messages have fallen out of the prompt (budget or cache window) without being summarized."""
+        return self.build_prompt(window, record=False).first_message_index > window.summarized_count
+
+    def summary_target(self, window: ConversationWindow) -> int:
+        """How many messages the summary should cover after a refresh: everything that no longer fits, and enough
+        more that only CHAT_SUMMARY_KEEP_MESSAGES stay verbatim, so the next refresh is several turns away."""
+        first_in_prompt = self.build_prompt(window, record=False).first_message_index
+        return max(first_in_prompt, window.message_count - settings.CHAT_SUMMARY_KEEP_MESSAGES, window.summarized_count)
+
+    def build_summary_prompt(self, summary: str, messages) -> str:
+        transcript = "\n".join(f"{m.role.capitalize()}: {clip_to_tokens(m.content, settings.CHAT_MESSAGE_TOKEN_LIMIT // 2)}" for m in messages)
+        return conversation_summary_prompt_template.format(summary=summary or "(none yet)", messages=transcript, max_words=settings.CHAT_SUMMARY_MAX_TOKENS * 3 // 4)
+
+    def clip_summary(self, summary: str) -> str:
+        return clip_to_tokens(summary.strip(), settings.CHAT_SUMMARY_MAX_TOKENS)
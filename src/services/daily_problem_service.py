@@ -1,6 +1,15 @@
+import asyncio
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from src.generator.question_generator import QuestionGenerator
+from src.database.database import AsyncSessionLocal
+from src.database.models import DailyProblem
+from src.llm.resilience import llm_call_budget
+from src.llm.admission import PRIORITY_BACKGROUND, llm_caller
 from src.models.api_schemas import DailyProblemResponse
-from src.models.question_schemas import MCQQuestion
+from src.config.settings import settings
 from src.common.logger import get_logger
 
 class DailyProblemService:
@@ -9,23 +18,80 @@ class DailyProblemService:
         self.logger = get_logger(self.__class__.__name__)
         self.default_topic = "Python programming"
         self.default_difficulty = "hard"
+        # Single-flight: concurrent first requests for a day share one generation task
+        self._inflight: Dict[date, asyncio.Task] = {}
 
-    def _format_mcq_response(self, mcq_q: MCQQuestion) -> DailyProblemResponse:
+    def _format_response(self, problem: DailyProblem) -> DailyProblemResponse:
         return DailyProblemResponse(
-            question_type="MCQ",
-            topic=self.default_topic,
-            difficulty=self.default_difficulty,
-            question=mcq_q.question,
-            options=mcq_q.options,
-            correct_answer=mcq_q.correct_answer
+            question_type=problem.question_type,
+            topic=problem.topic,
+            difficulty=problem.difficulty,
+            question=problem.question,
+            options=problem.options,
+            correct_answer=problem.correct_answer
         )
 
-    # In a production app, this would implement caching to serve the same question for 24h.
-    async def get_daily_problem(self) -> DailyProblemResponse:
-        """Generates a challenging daily MCQ problem (hardcoded to Python/hard)."""
-        self.logger.info(f"Generating daily problem for topic: {self.default_topic}, difficulty: {self.default_difficulty}")
-        
-        # Await the asynchronous generator call
-        mcq_q = await self.generator.generate_mcq(self.default_topic, self.default_difficulty)
-        
-        return self._format_mcq_response(mcq_q)
\ No newline at end of file
+    async def get_daily_problem(self, db: AsyncSession, day: Optional[date] = None) -> DailyProblemResponse:
+        """Returns the problem for the given UTC day (default today), generating and persisting it on first use."""
+        day = day or datetime.utcnow().date()
+        problem = await db.get(DailyProblem, day)
+        if problem:
+            return self._format_response(problem)
+        # The shared generation stores the problem on its own session; don't hold this one's connection meanwhile
+        await db.commit()
+        return await self._generate_single_flight(day)
+
+    async def _generate_single_flight(self, day: date) -> DailyProblemResponse:
+        task = self._inflight.get(day)
+        if task is None:
+            task = asyncio.create_task(self._generate_and_store(day))
+            self._inflight[day] = task
+            task.add_done_callback(lambda _: self._inflight.pop(day, None))
+        # Shield so a disconnecting client does not cancel the generation other requests are waiting on
+        return await asyncio.shield(task)
+
+    async def _generate_and_store(self, day: date) -> DailyProblemResponse:
+        self.logger.info(f"Generating daily problem for {day}, topic: {self.default_topic}, difficulty: {self.default_difficulty}")
+
+        # Shared by every request waiting on it, so it gets its own LLM budget rather than the first caller's
+        with llm_call_budget():
+            mcq_q = await self.generator.generate_mcq(self.default_topic, self.default_difficulty)
+
+        async with AsyncSessionLocal() as db:
+            problem = DailyProblem(problem_date=day, topic=self.default_topic, difficulty=self.default_difficulty, question_type="MCQ", question=mcq_q.question, options=mcq_q.options, correct_answer=mcq_q.correct_answer)
+            db.add(problem)
+            try:
+                await db.commit()
+            except IntegrityError:
+                # Another worker persisted the day's problem first; everyone serves that one
+                await db.rollback()
+                problem = await db.get(DailyProblem, day)
+                self.logger.info(f"Daily problem for {day} was already stored by another worker")
+            return self._format_response(problem)
+
+    async def ensure_daily_problem(self, day: date) -> DailyProblemResponse:
+        async with AsyncSessionLocal() as db:
+            return await self.get_daily_problem(db, day)
+
+    async def run_pregeneration_worker(self, stop_event: asyncio.Event):
+        """Background loop that generates tomorrow's problem shortly before the UTC day rolls over."""
+        lead = timedelta(minutes=settings.DAILY_PROBLEM_PREGENERATE_MINUTES)
+        while not stop_event.is_set():
+            now = datetime.utcnow()
+            tomorrow = now.date() + timedelta(days=1)
+            rollover = datetime.combine(tomorrow, time.min)
+            if rollover - now <= lead:
+                try:
+                    with llm_caller(PRIORITY_BACKGROUND):
+                        await self.ensure_daily_problem(tomorrow)
+                    self.logger.info(f"Pre-generated daily problem for {tomorrow}")
+                    wait = (rollover - now).total_seconds() + 1
+                except Exception as e:
+                    self.logger.error(f"Failed to pre-generate daily problem for {tomorrow}: {str(e)}")
+                    wait = 60
+            else:
+                wait = (rollover - lead - now).total_seconds()
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=max(wait, 1))
+            except asyncio.TimeoutError:
+                pass
@@ -1,12 +1,15 @@
-from langchain_groq import ChatGroq
-from src.config.settings import settings
+from src.llm.groq_client import get_groq_llm
 from src.common.logger import get_logger
 
 class FeedbackGenerator:
     def __init__(self):
-        self.llm = ChatGroq(model=settings.MODEL_NAME, temperature=0.7, groq_api_key=settings.GROQ_API_KEY)
         self.logger = get_logger(self.__class__.__name__)
 
+    @property
+    def llm(self):
+        # Resolved per call so the service can be constructed before an LLM backend is usable
+        return get_groq_llm(temperature=0.7)
+
     async def generate_strength_feedback(self, strongest_topic: str, accuracy: float, attempts: int) -> str:
         prompt = f"""You are an encouraging AI tutor. A student has shown strength in {strongest_topic} with {accuracy}% accuracy over {attempts} attempts.
 
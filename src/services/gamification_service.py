@@ -1,36 +1,75 @@
 """
 Gamification Service - Business logic for XP, streaks, and badges
 """
+from contextlib import contextmanager
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from src.database.models import StudentGamification, StudentBadge, XPTransaction
-from src.config.gamification_config import XP_REWARDS, get_level_from_xp, check_badge_eligibility
+from src.services.xp_ledger import xp_ledger
+from src.config.gamification_config import XP_REWARDS, get_level_from_xp, check_badge_eligibility, badges_for_stats
+from src.config.settings import settings
+from src.common.cache import LRUCache
 from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+# Activities whose XP award also bumps a badge counter
+ACTIVITY_COUNTERS = {"graph_creation": "graphs_created"}
+
+# Session.info key for the stats changed since the last badge check, per student
+CHANGED_STATS_KEY = "gamification_changed_stats"
 
 class GamificationService:
     """Service for managing student gamification features"""
     
-    def get_or_create_profile(self, db: Session, student_id: str) -> StudentGamification:
-        student = db.query(StudentGamification).filter_by(student_id=student_id).first()
+    def __init__(self):
+        # limit -> (top rows, total students); short TTL instead of invalidating on every XP award
+        self.leaderboard_cache = LRUCache(max_entries=32, ttl_seconds=settings.LEADERBOARD_CACHE_TTL_SECONDS)
+    
+    @contextmanager
+    def unit_of_work(self, db: Session, student_id: str):
+        """
+        Loads the student's profile once (row-locked where the database supports it) and commits every change
+        made inside the block in a single transaction. Calls inside the block pass commit=False and reuse the
+        profile from the session's identity map instead of re-querying it.
+        """
+        profile = self.get_or_create_profile(db, student_id, commit=False, for_update=True)
+        try:
+            yield profile
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    
+    def get_or_create_profile(self, db: Session, student_id: str, commit: bool = True, for_update: bool = False) -> StudentGamification:
+        # Session.get answers from the identity map when the profile is already loaded in this session
+        student = db.get(StudentGamification, student_id, with_for_update=for_update or None)
         if not student:
             student = StudentGamification(student_id=student_id, total_xp=0, level=1, current_streak=0, longest_streak=0)
             db.add(student)
-            db.commit()
+            if commit:
+                db.commit()
+            else:
+                db.flush()
         return student
     
-    def award_xp(self, db: Session, student_id: str, activity_type: str, description: str = None) -> dict:
+    def award_xp(self, db: Session, student_id: str, activity_type: str, description: str = None, commit: bool = True) -> dict:
         xp_amount = XP_REWARDS.get(activity_type, 0)
-        student = self.get_or_create_profile(db, student_id)
+        student = self.get_or_create_profile(db, student_id, commit=commit)
         student.total_xp += xp_amount
         old_level = student.level
         student.level = get_level_from_xp(student.total_xp)
-        transaction = XPTransaction(student_id=student_id, xp_amount=xp_amount, activity_type=activity_type, description=description or f"{activity_type.replace('_', ' ').title()}")
-        db.add(transaction)
-        db.commit()
-        db.refresh(student)
+        # The ledger row is written behind, after this transaction commits; the balance above is updated now
+        xp_ledger.record(db, student_id, xp_amount, activity_type, description or f"{activity_type.replace('_', ' ').title()}")
+        self._mark_changed(db, student_id, "total_xp", "level")
+        if activity_type in ACTIVITY_COUNTERS:
+            self.increment_counters(db, student_id, **{ACTIVITY_COUNTERS[activity_type]: 1})
+        if commit:
+            db.commit()
         return {"xp_awarded": xp_amount, "total_xp": student.total_xp, "level": student.level, "level_up": student.level > old_level}
     
-    def update_streak(self, db: Session, student_id: str) -> dict:
-        student = self.get_or_create_profile(db, student_id)
+    def update_streak(self, db: Session, student_id: str, commit: bool = True) -> dict:
+        student = self.get_or_create_profile(db, student_id, commit=commit)
         today = datetime.utcnow().date()
         last_date = student.last_activity_date.date() if student.last_activity_date else None
         if last_date == today:
@@ -44,35 +83,101 @@ class GamificationService:
             student.current_streak = 1
             student.last_activity_date = datetime.utcnow()
             streak_status = "reset"
-        db.commit()
+        self._mark_changed(db, student_id, "current_streak", "longest_streak")
+        if commit:
+            db.commit()
         return {"current_streak": student.current_streak, "longest_streak": student.longest_streak, "streak_status": streak_status}
     
-    def check_and_award_badges(self, db: Session, student_id: str) -> dict:
-        student = db.query(StudentGamification).filter_by(student_id=student_id).first()
+    def record_graph_creation(self, db: Session, student_id: str, description: str) -> dict:
+        with self.unit_of_work(db, student_id):
+            result = self.award_xp(db, student_id, "graph_creation", description, commit=False)
+            self.check_and_award_badges(db, student_id, commit=False)
+        return result
+    
+    def record_chat_message(self, db: Session, student_id: str) -> dict:
+        with self.unit_of_work(db, student_id):
+            self.increment_counters(db, student_id, chat_count=1)
+            return self.check_and_award_badges(db, student_id, commit=False)
+    
+    # Async variants for async endpoints; the unit of work runs on the AsyncSession's Session via run_sync
+    async def arecord_graph_creation(self, db: AsyncSession, student_id: str, description: str) -> dict:
+        return await db.run_sync(self.record_graph_creation, student_id, description)
+    
+    async def arecord_chat_message(self, db: AsyncSession, student_id: str) -> dict:
+        return await db.run_sync(self.record_chat_message, student_id)
+    
+    def increment_counters(self, db: Session, student_id: str, **deltas: int):
+        """Atomically bumps badge counters (quizzes_completed, perfect_quizzes, graphs_created, chat_count). The caller commits."""
+        deltas = {stat: delta for stat, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        self.get_or_create_profile(db, student_id, commit=False)
+        db.query(StudentGamification).filter_by(student_id=student_id).update({getattr(StudentGamification, stat): getattr(StudentGamification, stat) + delta for stat, delta in deltas.items()})
+        self._mark_changed(db, student_id, *deltas)
+    
+    def check_and_award_badges(self, db: Session, student_id: str, changed_stats: Optional[Iterable[str]] = None, commit: bool = True) -> dict:
+        """Evaluates only badges referencing `changed_stats`, by default the stats this session changed; all badges if none were tracked."""
+        if changed_stats is None:
+            changed_stats = db.info.get(CHANGED_STATS_KEY, {}).pop(student_id, None)
+        badge_ids = None if changed_stats is None else badges_for_stats(changed_stats)
+        student = db.get(StudentGamification, student_id)
         if not student:
             return {"new_badges": [], "total_badges": 0}
-        existing_badges = {badge.badge_id for badge in student.badges}
+        existing_badges = set(db.scalars(select(StudentBadge.badge_id).where(StudentBadge.student_id == student_id)))
+        if badge_ids == []:
+            return {"new_badges": [], "total_badges": len(existing_badges)}
         stats = self._get_student_stats(db, student_id)
-        eligible_badges = check_badge_eligibility(stats)
+        eligible_badges = check_badge_eligibility(stats, badge_ids)
         new_badges = [badge_id for badge_id in eligible_badges if badge_id not in existing_badges]
         for badge_id in new_badges:
             db.add(StudentBadge(student_id=student_id, badge_id=badge_id, badge_type="achievement"))
-        db.commit()
-        return {"new_badges": new_badges, "total_badges": len(eligible_badges)}
+        if commit:
+            db.commit()
+        return {"new_badges": new_badges, "total_badges": len(existing_badges) + len(new_badges)}
+    
+    @staticmethod
+    def _mark_changed(db: Session, student_id: str, *stats: str):
+        db.info.setdefault(CHANGED_STATS_KEY, {}).setdefault(student_id, set()).update(stats)
     
     def get_student_gamification(self, db: Session, student_id: str) -> dict:
         student = self.get_or_create_profile(db, student_id)
         badges = [{"badge_id": b.badge_id, "badge_type": b.badge_type, "earned_date": b.earned_date.isoformat()} for b in student.badges]
-        recent_transactions = [{"xp_amount": t.xp_amount, "activity_type": t.activity_type, "description": t.description, "timestamp": t.timestamp.isoformat()} for t in student.transactions[:10]]
+        # Newest first: ledger entries still waiting to be flushed, then the latest persisted rows
+        transactions = [{key: entry[key] for key in ("xp_amount", "activity_type", "description", "timestamp")} for entry in reversed(xp_ledger.pending_for(student_id))]
+        persisted = db.scalars(select(XPTransaction).where(XPTransaction.student_id == student_id).order_by(XPTransaction.timestamp.desc(), XPTransaction.id.desc()).limit(10))
+        transactions += [{"xp_amount": t.xp_amount, "activity_type": t.activity_type, "description": t.description, "timestamp": t.timestamp} for t in persisted]
+        recent_transactions = [{**t, "timestamp": t["timestamp"].isoformat()} for t in transactions[:10]]
         return {"student_id": student_id, "total_xp": student.total_xp, "level": student.level, "current_streak": student.current_streak, "longest_streak": student.longest_streak, "last_activity_date": student.last_activity_date.isoformat() if student.last_activity_date else None, "badges": badges, "recent_transactions": recent_transactions}
     
+    def get_leaderboard(self, db: Session, limit: int = 10, student_id: Optional[str] = None) -> dict:
+        """Top `limit` students by XP plus the caller's rank. Tied students share a rank."""
+        page = self.leaderboard_cache.get(limit)
+        if page is None:
+            page = (self._top_students(db, limit), db.query(func.count(StudentGamification.student_id)).scalar())
+            self.leaderboard_cache.set(limit, page)
+        rows, total_students = page
+        entries = [{**row, "is_current_user": row["student_id"] == student_id} for row in rows]
+        current_rank = self.get_rank(db, student_id) if student_id else None
+        return {"entries": entries, "total_students": total_students, "current_user_rank": current_rank}
+    
+    def get_rank(self, db: Session, student_id: str) -> Optional[int]:
+        total_xp = db.query(StudentGamification.total_xp).filter_by(student_id=student_id).scalar()
+        if total_xp is None:
+            return None
+        return db.query(func.count(StudentGamification.student_id)).filter(StudentGamification.total_xp > total_xp).scalar() + 1
+    
+    def _top_students(self, db: Session, limit: int) -> list:
+        badge_count = select(func.count(StudentBadge.id)).where(StudentBadge.student_id == StudentGamification.student_id).correlate(StudentGamification).scalar_subquery()
+        rows = db.query(StudentGamification.student_id, StudentGamification.total_xp, StudentGamification.level, badge_count).order_by(StudentGamification.total_xp.desc(), StudentGamification.student_id).limit(limit).all()
+        entries = []
+        for idx, (sid, total_xp, level, badges) in enumerate(rows):
+            # Same competition ranking as get_rank: 1 + number of students with strictly more XP
+            rank = entries[-1]["rank"] if entries and entries[-1]["total_xp"] == total_xp else idx + 1
+            entries.append({"rank": rank, "student_id": sid, "display_name": f"Student {sid[-8:]}", "total_xp": total_xp, "level": level, "badge_count": badges})
+        return entries
+    
     def _get_student_stats(self, db: Session, student_id: str) -> dict:
-        from src.database.models import StudentQuizAttempt, ChatMessageDB, Conversation
-        student = db.query(StudentGamification).filter_by(student_id=student_id).first()
+        student = db.get(StudentGamification, student_id)
         if not student:
             return {"quizzes_completed": 0, "graphs_created": 0, "longest_streak": 0, "current_streak": 0, "total_xp": 0, "perfect_quizzes": 0, "level": 1, "chat_count": 0}
-        quizzes = db.query(StudentQuizAttempt).filter_by(student_id=student_id).all()
-        chats = db.query(ChatMessageDB).join(Conversation).filter(Conversation.student_id == student_id, ChatMessageDB.role == "student").count()
-        perfect_quizzes = sum(1 for q in quizzes if q.correct_count == q.total_questions)
-        graphs_created = sum(1 for t in student.transactions if t.activity_type == "graph_creation")
-        return {"quizzes_completed": len(quizzes), "graphs_created": graphs_created, "longest_streak": student.longest_streak, "current_streak": student.current_streak, "total_xp": student.total_xp, "perfect_quizzes": perfect_quizzes, "level": student.level, "chat_count": chats}
+        return {"quizzes_completed": student.quizzes_completed, "graphs_created": student.graphs_created, "longest_streak": student.longest_streak, "current_streak": student.current_streak, "total_xp": student.total_xp, "perfect_quizzes": student.perfect_quizzes, "level": student.level, "chat_count": student.chat_count}
@@ -1,16 +1,21 @@
-from src.utils.generate_knowledge_graph import generate_knowledge_graph as generate_kg_util
+from src.utils.generate_knowledge_graph import generate_knowledge_graph as generate_kg_util, encode_html_base64
 from src.models.api_schemas import KnowledgeGraphRequest, KnowledgeGraphResponse
 from src.common.custom_exception import CustomException
 
 class KnowledgeGraphService:
     async def create_knowledge_graph(self, request: KnowledgeGraphRequest) -> KnowledgeGraphResponse:
-        """Calls the utility function and returns the knowledge graph HTML content."""
-        
+        """Calls the utility function and returns the knowledge graph HTML content, base64 encoded."""
+        html_content = await self.render_knowledge_graph(request)
+        return KnowledgeGraphResponse(html_content=encode_html_base64(html_content))
+
+    async def render_knowledge_graph(self, request: KnowledgeGraphRequest) -> str:
+        """Returns the raw knowledge graph HTML."""
+
         # The utility function handles the logic of content generation if only a topic is provided.
         html_content = await generate_kg_util(text=request.text, topic=request.topic)
-        
+
         if "No graph data extracted" in html_content or "Could not generate content" in html_content:
             # Propagate error with a clearer message
             raise CustomException(f"Knowledge Graph generation failed: {html_content.replace('<html><body>', '').replace('</body></html>', '')}")
-            
-        return KnowledgeGraphResponse(html_content=html_content)
\ No newline at end of file
+
+        return html_content
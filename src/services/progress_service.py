@@ -1,32 +1,47 @@
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from src.database.models import StudentQuizAttempt, StudentTopicPerformance
+from src.database.models import Question, StudentQuizAttempt, StudentTopicPerformance
+from src.database.question_store import record_question_results, store_questions
 from src.models.progress_schemas import QuizAttemptRequest
 from src.services.feedback_service import FeedbackGenerator
 from src.services.gamification_service import GamificationService
+from src.common.cache import LRUCache
+from src.config.settings import settings
 from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import json
 import uuid
 
 class ProgressService:
     def __init__(self):
         self.feedback_generator = FeedbackGenerator()
         self.gamification_service = GamificationService()
+        # student_id -> (analytics fingerprint, strength feedback, weakness feedback)
+        self.feedback_cache = LRUCache(max_entries=settings.FEEDBACK_CACHE_ENTRIES)
 
-    def record_quiz_attempt(self, db: Session, attempt: QuizAttemptRequest) -> dict:
-        correct_count = sum(1 for user, correct in zip(attempt.user_answers, attempt.correct_answers) if user.strip().lower() == correct.strip().lower())
+    def record_quiz_attempt(self, db: Session, attempt: QuizAttemptRequest, commit: bool = True) -> dict:
+        marks = [user.strip().lower() == correct.strip().lower() for user, correct in zip(attempt.user_answers, attempt.correct_answers)]
+        correct_count = sum(marks)
         total = len(attempt.questions)
         accuracy = (correct_count / total * 100) if total > 0 else 0
         quiz_id = f"quiz_{uuid.uuid4().hex[:8]}"
+        # Questions are stored once in the questions table; the attempt keeps their ids and a per-question result
+        correctness = "".join("1" if i < len(marks) and marks[i] else "0" for i in range(total))
+        question_ids = store_questions(db, attempt.questions)
+        record_question_results(db, question_ids, correctness)
         
         quiz_attempt = StudentQuizAttempt(
             quiz_id=quiz_id, student_id=attempt.student_id, topic=attempt.topic,
-            difficulty=attempt.difficulty, questions=attempt.questions,
-            answers=attempt.user_answers, correct_count=correct_count, total_questions=total
+            difficulty=attempt.difficulty, question_ids=question_ids,
+            correctness=correctness, correct_count=correct_count, total_questions=total
         )
         db.add(quiz_attempt)
         
         topic_perf = db.query(StudentTopicPerformance).filter_by(student_id=attempt.student_id, topic=attempt.topic).first()
         if not topic_perf:
-            topic_perf = StudentTopicPerformance(student_id=attempt.student_id, topic=attempt.topic, difficulty_distribution={})
+            topic_perf = StudentTopicPerformance(student_id=attempt.student_id, topic=attempt.topic, total_attempts=0, correct_answers=0, difficulty_distribution={})
             db.add(topic_perf)
         
         topic_perf.total_attempts += 1
@@ -35,58 +50,72 @@ class ProgressService:
         diff_dist = topic_perf.difficulty_distribution or {}
         diff_dist[attempt.difficulty] = diff_dist.get(attempt.difficulty, 0) + 1
         topic_perf.difficulty_distribution = diff_dist
+        self.gamification_service.increment_counters(db, attempt.student_id, quizzes_completed=1, perfect_quizzes=int(correct_count == total))
         
-        db.commit()
+        if commit:
+            db.commit()
+        else:
+            # Assigns the attempt's timestamp without ending the caller's transaction
+            db.flush()
+        # The fingerprint would change anyway; dropping the entry frees it right away
+        self.feedback_cache.delete(attempt.student_id)
         
         return {"quiz_id": quiz_id, "accuracy": round(accuracy, 2), "correct_count": correct_count, "total_questions": total, "timestamp": quiz_attempt.timestamp}
 
     def get_student_analytics(self, db: Session, student_id: str) -> dict:
-        attempts = db.query(StudentQuizAttempt).filter_by(student_id=student_id).all()
-        if not attempts:
+        # All aggregation runs in SQL over the scalar columns; the questions/answers JSON is never loaded
+        attempt_count, total_correct, total_questions = db.query(
+            func.count(StudentQuizAttempt.id), func.sum(StudentQuizAttempt.correct_count), func.sum(StudentQuizAttempt.total_questions)
+        ).filter(StudentQuizAttempt.student_id == student_id).one()
+        if not attempt_count:
             return {"student_id": student_id, "overall_accuracy": 0, "total_attempts": 0, "topics": [], "weekly_trend": [], "strongest_topic": "N/A", "weakest_topic": "N/A", "difficulty_distribution": {}, "ai_strength_feedback": "Complete some quizzes to receive personalized feedback!", "ai_weakness_feedback": "Start your learning journey today!"}
         
-        total_correct = sum(a.correct_count for a in attempts)
-        total_questions = sum(a.total_questions for a in attempts)
-        overall_accuracy = (total_correct / total_questions * 100) if total_questions > 0 else 0
+        overall_accuracy = (total_correct / total_questions * 100) if total_questions else 0
         
-        topics_data = db.query(StudentTopicPerformance).filter_by(student_id=student_id).all()
+        questions_per_topic = dict(db.query(StudentQuizAttempt.topic, func.sum(StudentQuizAttempt.total_questions)).filter(StudentQuizAttempt.student_id == student_id).group_by(StudentQuizAttempt.topic).all())
+        topics_data = db.query(StudentTopicPerformance.topic, StudentTopicPerformance.total_attempts, StudentTopicPerformance.correct_answers).filter(StudentTopicPerformance.student_id == student_id).order_by(StudentTopicPerformance.id).all()
         topics = []
-        for t in topics_data:
-            total_q_for_topic = sum(a.total_questions for a in attempts if a.topic == t.topic)
-            topic_accuracy = (t.correct_answers / total_q_for_topic * 100) if total_q_for_topic > 0 else 0
+        for topic, topic_attempts, correct_answers in topics_data:
+            total_q_for_topic = questions_per_topic.get(topic) or 0
+            topic_accuracy = (correct_answers / total_q_for_topic * 100) if total_q_for_topic > 0 else 0
             topics.append({
-                "topic": t.topic,
+                "topic": topic,
                 "accuracy": round(topic_accuracy, 2),
-                "total_attempts": t.total_attempts,
-                "correct_answers": t.correct_answers,
+                "total_attempts": topic_attempts,
+                "correct_answers": correct_answers,
                 "total_questions": total_q_for_topic
             })
         
-        seven_days_ago = datetime.utcnow() - timedelta(days=7)
+        now = datetime.utcnow()
+        first_day = datetime.combine((now - timedelta(days=6)).date(), datetime.min.time())
+        attempt_day = func.date(StudentQuizAttempt.timestamp)
+        daily = {
+            str(day): (day_attempts, day_correct or 0, day_total or 0)
+            for day, day_attempts, day_correct, day_total in db.query(
+                attempt_day, func.count(StudentQuizAttempt.id), func.sum(StudentQuizAttempt.correct_count), func.sum(StudentQuizAttempt.total_questions)
+            ).filter(StudentQuizAttempt.student_id == student_id, StudentQuizAttempt.timestamp >= first_day).group_by(attempt_day).all()
+        }
         weekly_trend = []
         for i in range(7):
-            day = datetime.utcnow() - timedelta(days=6-i)
-            day_attempts = [a for a in attempts if a.timestamp.date() == day.date()]
-            day_correct = sum(a.correct_count for a in day_attempts)
-            day_total = sum(a.total_questions for a in day_attempts)
+            day = (now - timedelta(days=6-i)).strftime("%Y-%m-%d")
+            day_attempts, day_correct, day_total = daily.get(day, (0, 0, 0))
             day_accuracy = round((day_correct / day_total * 100) if day_total > 0 else 0, 2)
             weekly_trend.append({
-                "date": day.strftime("%Y-%m-%d"),
+                "date": day,
                 "accuracy": day_accuracy,
-                "attempts": len(day_attempts)
+                "attempts": day_attempts
             })
         
         strongest = max(topics, key=lambda x: x["accuracy"])["topic"] if topics else "N/A"
         weakest = min(topics, key=lambda x: x["accuracy"])["topic"] if topics else "N/A"
         
-        diff_dist = {}
-        for a in attempts:
-            diff_dist[a.difficulty] = diff_dist.get(a.difficulty, 0) + 1
+        # Ordered by first appearance, matching the order the attempts were taken
+        diff_dist = dict(db.query(StudentQuizAttempt.difficulty, func.count(StudentQuizAttempt.id)).filter(StudentQuizAttempt.student_id == student_id).group_by(StudentQuizAttempt.difficulty).order_by(func.min(StudentQuizAttempt.id)).all())
         
         return {
             "student_id": student_id,
             "overall_accuracy": round(overall_accuracy, 2),
-            "total_attempts": len(attempts),
+            "total_attempts": attempt_count,
             "topics": topics,
             "weekly_trend": weekly_trend,
             "strongest_topic": strongest,
@@ -94,25 +123,50 @@ class ProgressService:
             "difficulty_distribution": diff_dist
         }
 
-    async def get_student_analytics_with_ai_feedback(self, db: Session, student_id: str) -> dict:
-        analytics = self.get_student_analytics(db, student_id)
+    def get_hardest_questions(self, db: Session, limit: int = 10, min_answers: int = 5) -> list:
+        """Questions answered at least min_answers times, lowest accuracy first, from the per-question counters."""
+        accuracy = Question.times_correct * 100.0 / Question.times_answered
+        rows = db.query(Question.id, Question.text, Question.times_answered, Question.times_correct).filter(Question.times_answered >= max(min_answers, 1)).order_by(accuracy, Question.times_answered.desc()).limit(limit).all()
+        return [{"question_id": qid, "question": text, "times_answered": answered, "times_correct": correct, "accuracy": round(correct / answered * 100, 2)} for qid, text, answered, correct in rows]
+
+    async def aget_student_analytics(self, db: AsyncSession, student_id: str) -> dict:
+        return await db.run_sync(self.get_student_analytics, student_id)
+
+    async def get_student_analytics_with_ai_feedback(self, db: AsyncSession, student_id: str) -> dict:
+        analytics = await self.aget_student_analytics(db, student_id)
         
         if analytics["total_attempts"] == 0:
             return {**analytics, "ai_strength_feedback": "Complete some quizzes to receive personalized feedback!", "ai_weakness_feedback": "Start your learning journey today!"}
         
+        fingerprint = self._analytics_fingerprint(analytics)
+        cached = self.feedback_cache.get(student_id)
+        if cached and cached[0] == fingerprint:
+            return {**analytics, "ai_strength_feedback": cached[1], "ai_weakness_feedback": cached[2]}
+        
         strongest_topic_data = next((t for t in analytics["topics"] if t["topic"] == analytics["strongest_topic"]), None)
         weakest_topic_data = next((t for t in analytics["topics"] if t["topic"] == analytics["weakest_topic"]), None)
         
-        strength_feedback = await self.feedback_generator.generate_strength_feedback(
-            analytics["strongest_topic"],
-            strongest_topic_data["accuracy"] if strongest_topic_data else 0,
-            strongest_topic_data["total_attempts"] if strongest_topic_data else 0
-        )
-        
-        weakness_feedback = await self.feedback_generator.generate_weakness_feedback(
-            analytics["weakest_topic"],
-            weakest_topic_data["accuracy"] if weakest_topic_data else 0,
-            weakest_topic_data["total_attempts"] if weakest_topic_data else 0
+        # End the read transaction so the pooled connection is not held through the LLM calls
+        await db.commit()
+        # Both prompts are independent, so issue them concurrently
+        strength_feedback, weakness_feedback = await asyncio.gather(
+            self.feedback_generator.generate_strength_feedback(
+                analytics["strongest_topic"],
+                strongest_topic_data["accuracy"] if strongest_topic_data else 0,
+                strongest_topic_data["total_attempts"] if strongest_topic_data else 0
+            ),
+            self.feedback_generator.generate_weakness_feedback(
+                analytics["weakest_topic"],
+                weakest_topic_data["accuracy"] if weakest_topic_data else 0,
+                weakest_topic_data["total_attempts"] if weakest_topic_data else 0
+            )
         )
+        self.feedback_cache.set(student_id, (fingerprint, strength_feedback, weakness_feedback))
         
         return {**analytics, "ai_strength_feedback": strength_feedback, "ai_weakness_feedback": weakness_feedback}
+
+    @staticmethod
+    def _analytics_fingerprint(analytics: dict) -> str:
+        """Hash of the stats the feedback depends on; the weekly trend is left out since it shifts daily."""
+        payload = {key: analytics[key] for key in ("total_attempts", "overall_accuracy", "topics", "strongest_topic", "weakest_topic", "difficulty_distribution")}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
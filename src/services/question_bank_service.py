@@ -0,0 +1,222 @@
+"""
+Question Bank Service - Serves pre-generated quiz questions and keeps popular buckets stocked
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from src.database.database import AsyncSessionLocal
+from src.database.models import BankedQuestion, QuestionBankBucket, ServedBankQuestion
+from src.models.api_schemas import QuizQuestion, QuizResponse, QuizSettings
+from src.services.quiz_service import QuizService
+from src.utils.similarity_index import SimilarityIndex
+from src.common.cache import LRUCache
+from src.llm.resilience import llm_call_budget
+from src.llm.admission import PRIORITY_BACKGROUND, llm_caller
+from src.config.settings import settings as app_settings
+from src.common.logger import get_logger
+from src.common.custom_exception import CustomException
+
+BucketKey = Tuple[str, str, str]
+
+# Banked candidates drawn per requested question, so near-duplicates of the student's history can be skipped
+DRAW_OVERFETCH = 3
+
+class QuestionBankService:
+    """Serves quizzes from the question bank, falling back to live generation when a bucket runs dry"""
+
+    def __init__(self, quiz_service: Optional[QuizService] = None):
+        self.quiz_service = quiz_service or QuizService()
+        self.logger = get_logger(self.__class__.__name__)
+        # (student_id, topic) -> (SimilarityIndex of every question served to that student on that topic, highest
+        # served_bank_questions id read into it). Built from the table on first use, so it survives restarts, and
+        # caught up from the table before each use, so quizzes served by other workers are included
+        self.history_indexes = LRUCache(max_entries=app_settings.QUIZ_HISTORY_INDEX_SCOPES)
+
+    @staticmethod
+    def bucket_key(topic: str, difficulty: str, question_type: str) -> BucketKey:
+        return (" ".join(topic.lower().split()), difficulty.strip().lower(), question_type)
+
+    async def serve_quiz(self, db: AsyncSession, settings: QuizSettings) -> QuizResponse:
+        """Database steps run on the AsyncSession's Session via run_sync so they never block the event loop."""
+        key = self.bucket_key(settings.topic, settings.difficulty, settings.question_type)
+        bucket, banked, history = await db.run_sync(self._reserve, key, settings)
+        questions = [self._to_quiz_question(q) for q in banked]
+        missing = settings.num_questions - len(questions)
+
+        if missing > 0:
+            bucket.miss_count = (bucket.miss_count or 0) + missing
+            # Commit the demand counters now so the pooled connection is released while the LLM generates
+            await db.commit()
+            self.logger.info(f"Question bank short by {missing} for bucket {key}, generating live")
+            try:
+                live = await self.quiz_service.generate_questions(settings.model_copy(update={"num_questions": missing}), exclude_questions=[q.question for q in questions], history=history)
+                rows, fresh = await db.run_sync(self._deposit_live, key, settings.student_id, live.questions, banked)
+                banked += rows
+                questions += fresh
+            except Exception as e:
+                if not questions:
+                    raise
+                self.logger.warning(f"Live generation failed, serving {len(questions)} banked questions: {str(e)}")
+            if not questions:
+                await db.commit()
+                raise CustomException(f"Every question generated for bucket {key} was already served to student '{settings.student_id}'")
+        else:
+            self.logger.info(f"Served {len(questions)} questions from bank for bucket {key}")
+
+        await db.run_sync(self._mark_served, settings.student_id, banked)
+        await db.commit()
+        if history is not None:
+            for q in banked:
+                history.add(q.question)
+        return QuizResponse(questions=questions)
+
+    def _reserve(self, db: Session, key: BucketKey, settings: QuizSettings) -> Tuple[QuestionBankBucket, List[BankedQuestion], Optional[SimilarityIndex]]:
+        bucket = self._record_demand(db, key, settings.topic)
+        history = self._history_index(db, settings.student_id, key[0])
+        return bucket, self._draw(db, key, settings.student_id, settings.num_questions, history), history
+
+    def _history_index(self, db: Session, student_id: Optional[str], topic: str) -> Optional[SimilarityIndex]:
+        if not student_id:
+            return None
+        scope = (student_id, topic)
+        index, read_up_to = self.history_indexes.get(scope) or (SimilarityIndex(threshold=app_settings.QUIZ_SIMILARITY_THRESHOLD), 0)
+        served = db.execute(select(ServedBankQuestion.id, BankedQuestion.question).join(BankedQuestion, ServedBankQuestion.question_id == BankedQuestion.id).where(ServedBankQuestion.student_id == student_id, ServedBankQuestion.id > read_up_to, BankedQuestion.topic == topic)).all()
+        for served_id, question in served:
+            index.add(question)
+            read_up_to = max(read_up_to, served_id)
+        self.history_indexes.set(scope, (index, read_up_to))
+        return index
+
+    def _record_demand(self, db: Session, key: BucketKey, display_topic: str) -> QuestionBankBucket:
+        topic, difficulty, question_type = key
+        bucket = db.query(QuestionBankBucket).filter_by(topic=topic, difficulty=difficulty, question_type=question_type).first()
+        if not bucket:
+            bucket = QuestionBankBucket(topic=topic, difficulty=difficulty, question_type=question_type, display_topic=display_topic.strip(), request_count=0, miss_count=0)
+            db.add(bucket)
+        bucket.request_count = (bucket.request_count or 0) + 1
+        bucket.last_requested = datetime.utcnow()
+        return bucket
+
+    def _draw(self, db: Session, key: BucketKey, student_id: Optional[str], count: int, history: Optional[SimilarityIndex] = None) -> List[BankedQuestion]:
+        """Random unserved questions, skipping near-duplicates of the student's history and of each other."""
+        topic, difficulty, question_type = key
+        query = db.query(BankedQuestion).filter_by(topic=topic, difficulty=difficulty, question_type=question_type)
+        if student_id:
+            seen = select(ServedBankQuestion.question_id).where(ServedBankQuestion.student_id == student_id)
+            query = query.filter(BankedQuestion.id.not_in(seen))
+        drawn, picked = [], SimilarityIndex(threshold=app_settings.QUIZ_SIMILARITY_THRESHOLD)
+        for q in query.order_by(func.random()).limit(count * DRAW_OVERFETCH).all():
+            if len(drawn) == count:
+                break
+            if (history is not None and history.query(q.question)) or picked.query(q.question):
+                continue
+            drawn.append(q)
+            picked.add(q.question)
+        return drawn
+
+    def _deposit(self, db: Session, key: BucketKey, questions: List[QuizQuestion]) -> Tuple[List[BankedQuestion], int]:
+        """Banks the questions, returning the row of each one (new or already banked, in order) and how many were new."""
+        topic, difficulty, question_type = key
+        texts = [q.question for q in questions]
+        by_text = {row.question: row for row in db.scalars(select(BankedQuestion).filter_by(topic=topic, difficulty=difficulty, question_type=question_type).where(BankedQuestion.question.in_(texts)))}
+        created = []
+        for q in questions:
+            if q.question not in by_text:
+                by_text[q.question] = BankedQuestion(topic=topic, difficulty=difficulty, question_type=question_type, question=q.question, options=q.options, correct_answer=q.correct_answer)
+                created.append(by_text[q.question])
+        db.add_all(created)
+        db.flush()
+        return [by_text[text] for text in texts], len(created)
+
+    def _deposit_live(self, db: Session, key: BucketKey, student_id: Optional[str], questions: List[QuizQuestion], banked: List[BankedQuestion]) -> Tuple[List[BankedQuestion], List[QuizQuestion]]:
+        """Banks a live top-up and keeps only the questions that are new to this quiz and, for a known student, to them."""
+        rows, _ = self._deposit(db, key, questions)
+        taken = {q.id for q in banked}
+        if student_id:
+            taken.update(db.scalars(select(ServedBankQuestion.question_id).where(ServedBankQuestion.student_id == student_id, ServedBankQuestion.question_id.in_([row.id for row in rows]))))
+        kept_rows, kept = [], []
+        for row, q in zip(rows, questions):
+            if row.id in taken:
+                continue
+            taken.add(row.id)
+            kept_rows.append(row)
+            kept.append(q)
+        if len(kept) < len(questions):
+            self.logger.info(f"Dropped {len(questions) - len(kept)} live questions already served for bucket {key}")
+        return kept_rows, kept
+
+    def _mark_served(self, db: Session, student_id: Optional[str], banked: List[BankedQuestion]):
+        if student_id:
+            db.add_all([ServedBankQuestion(student_id=student_id, question_id=q.id) for q in banked])
+
+    @staticmethod
+    def _to_quiz_question(q: BankedQuestion) -> QuizQuestion:
+        return QuizQuestion(type='MCQ' if q.question_type == "Multiple Choice" else 'Fill in the blank', question=q.question, options=q.options or [], correct_answer=q.correct_answer)
+
+    async def refill_popular_buckets(self):
+        """Tops up the most requested buckets to the high-water mark once they fall below the low-water mark."""
+        async with AsyncSessionLocal() as db:
+            buckets = await db.run_sync(self._popular_buckets)
+            for bucket in buckets:
+                stock = await db.run_sync(self._stock, bucket)
+                if stock < app_settings.QUESTION_BANK_LOW_WATER:
+                    wanted = app_settings.QUESTION_BANK_HIGH_WATER - stock
+                elif bucket.miss_count:
+                    # Students ran dry on this bucket since the last pass, grow it by what they missed
+                    wanted = min(bucket.miss_count, app_settings.QUESTION_BANK_MAX_PER_BUCKET - stock)
+                else:
+                    continue
+                if wanted > 0:
+                    added = await self._refill_bucket(db, bucket, wanted)
+                    self.logger.info(f"Refilled bucket ({bucket.topic}, {bucket.difficulty}, {bucket.question_type}) with {added} questions, stock was {stock}")
+                bucket.miss_count = 0
+                await db.commit()
+
+    def _popular_buckets(self, db: Session) -> List[QuestionBankBucket]:
+        since = datetime.utcnow() - timedelta(days=7)
+        return db.query(QuestionBankBucket).filter(QuestionBankBucket.last_requested >= since).order_by(QuestionBankBucket.request_count.desc()).limit(app_settings.QUESTION_BANK_POPULAR_BUCKETS).all()
+
+    def _stock(self, db: Session, bucket: QuestionBankBucket) -> int:
+        return db.query(func.count(BankedQuestion.id)).filter_by(topic=bucket.topic, difficulty=bucket.difficulty, question_type=bucket.question_type).scalar()
+
+    def _recent_questions(self, db: Session, bucket: QuestionBankBucket, limit: int = 30) -> List[str]:
+        return list(db.scalars(select(BankedQuestion.question).filter_by(topic=bucket.topic, difficulty=bucket.difficulty, question_type=bucket.question_type).order_by(BankedQuestion.id.desc()).limit(limit)))
+
+    async def _refill_bucket(self, db: AsyncSession, bucket: QuestionBankBucket, wanted: int) -> int:
+        key = (bucket.topic, bucket.difficulty, bucket.question_type)
+        added = 0
+        while added < wanted:
+            batch_size = min(app_settings.QUESTION_BANK_REFILL_BATCH, wanted - added)
+            recent = await db.run_sync(self._recent_questions, bucket)
+            # End the read transaction so the worker does not hold a pooled connection through the LLM call
+            await db.commit()
+            settings = QuizSettings(topic=bucket.display_topic, question_type=bucket.question_type, difficulty=bucket.difficulty, num_questions=batch_size)
+            try:
+                with llm_call_budget(), llm_caller(PRIORITY_BACKGROUND):
+                    generated = await self.quiz_service.generate_questions(settings, exclude_questions=recent)
+            except Exception as e:
+                self.logger.error(f"Failed to refill bucket {key}: {str(e)}")
+                break
+            _, created = await db.run_sync(self._deposit, key, generated.questions)
+            await db.commit()
+            if not created:
+                break
+            added += created
+        return added
+
+    async def run_refill_worker(self, stop_event: asyncio.Event):
+        """Background loop started from the FastAPI lifespan."""
+        self.logger.info("Question bank refill worker started")
+        while not stop_event.is_set():
+            try:
+                await self.refill_popular_buckets()
+            except Exception as e:
+                self.logger.error(f"Question bank refill pass failed: {str(e)}")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=app_settings.QUESTION_BANK_REFILL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        self.logger.info("Question bank refill worker stopped")
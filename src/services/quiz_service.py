@@ -1,155 +1,201 @@
-from typing import List
+import asyncio
+from typing import Dict, List, Optional, Tuple
 from src.generator.question_generator import QuestionGenerator
 from src.models.api_schemas import QuizQuestion, QuizResponse, QuizSettings
+from src.config.settings import settings as app_settings
 from src.common.custom_exception import CustomException
+from src.llm.resilience import LLMUnavailableError
 from src.common.logger import get_logger
+from src.utils.similarity_index import SimilarityIndex
 
 class QuizService:
     def __init__(self):
         self.generator = QuestionGenerator()
         self.logger = get_logger(self.__class__.__name__)
 
-    async def generate_questions(self, settings: QuizSettings) -> QuizResponse:
-        questions: List[QuizQuestion] = []
+    async def generate_questions(self, settings: QuizSettings, exclude_questions: Optional[List[str]] = None, history: Optional[SimilarityIndex] = None) -> QuizResponse:
+        """Generates a quiz; `exclude_questions` are treated as already asked (context and duplicate checks), and
+        questions near-duplicating anything in `history` (e.g. what the student was served before) are rejected."""
         question_type = settings.question_type
         topic = settings.topic
         difficulty = settings.difficulty
         num_questions = settings.num_questions
-        
-        generated_questions_text = []  # Keep as list to maintain order
-        max_attempts_per_question = 5
+
+        exclude_questions = list(exclude_questions or [])
+
+        if app_settings.QUIZ_GENERATION_MODE == "concurrent" and num_questions > 1:
+            questions = await self._generate_concurrently(question_type, topic, difficulty, num_questions, exclude_questions, history)
+        elif app_settings.QUIZ_GENERATION_MODE == "batch":
+            questions = await self._generate_in_batches(question_type, topic, difficulty, num_questions, exclude_questions, history)
+        else:
+            questions = await self._generate_sequentially(question_type, topic, difficulty, num_questions, exclude_questions, history)
+
+        if not questions:
+            raise CustomException(
+                f"Failed to generate any questions for topic '{topic}' with difficulty '{difficulty}' "
+                f"and question type '{question_type}' after multiple attempts."
+            )
+
+        return QuizResponse(questions=questions)
+
+    async def _generate_sequentially(self, question_type: str, topic: str, difficulty: str, num_questions: int, exclude_questions: List[str], history: Optional[SimilarityIndex] = None) -> List[QuizQuestion]:
+        questions: List[QuizQuestion] = []
+        generated_questions_text = exclude_questions.copy()  # Keep as list to maintain order
+        seen = self._new_index(exclude_questions)
+        max_attempts_per_question = app_settings.QUIZ_MAX_ATTEMPTS_PER_QUESTION
 
         for i in range(num_questions):
             question_generated = False
-            
+
             for attempt in range(max_attempts_per_question):
                 try:
                     # Pass previous questions for context
                     previous_questions = generated_questions_text.copy()
-                    
-                    if question_type == "Multiple Choice":
-                        result = await self.generator.generate_mcq(
-                            topic, 
-                            difficulty.lower(),
-                            previous_questions=previous_questions if previous_questions else None
-                        )
-                        
-                        # Check for exact duplicate
-                        if result.question not in generated_questions_text:
-                            # Check for semantic similarity (basic check)
-                            is_too_similar = False
-                            question_lower = result.question.lower().strip()
-                            
-                            for prev_q in generated_questions_text:
-                                prev_q_lower = prev_q.lower().strip()
-                                # Calculate basic similarity
-                                if self._are_questions_too_similar(question_lower, prev_q_lower):
-                                    is_too_similar = True
-                                    self.logger.warning(f"Question too similar to existing: '{result.question}' vs '{prev_q}'")
-                                    break
-                            
-                            if not is_too_similar:
-                                questions.append(
-                                    QuizQuestion(
-                                        type='MCQ',
-                                        question=result.question,
-                                        options=result.options,
-                                        correct_answer=result.correct_answer
-                                    )
-                                )
-                                generated_questions_text.append(result.question)
-                                question_generated = True
-                                self.logger.info(f"Generated unique question {i + 1}/{num_questions}")
-                                break
-                            else:
-                                self.logger.warning(f"Semantically similar question detected, retrying... (attempt {attempt + 1})")
-                        else:
-                            self.logger.warning(f"Exact duplicate question detected, retrying... (attempt {attempt + 1})")
-                    
-                    elif question_type == "Fill in the blank":
-                        result = await self.generator.generate_fill_blank(
-                            topic,
-                            difficulty.lower(),
-                            previous_questions=previous_questions if previous_questions else None
-                        )
-                        
-                        # Check for exact duplicate
-                        if result.question not in generated_questions_text:
-                            # Check for semantic similarity
-                            is_too_similar = False
-                            question_lower = result.question.lower().strip()
-                            
-                            for prev_q in generated_questions_text:
-                                prev_q_lower = prev_q.lower().strip()
-                                if self._are_questions_too_similar(question_lower, prev_q_lower):
-                                    is_too_similar = True
-                                    self.logger.warning(f"Question too similar to existing: '{result.question}' vs '{prev_q}'")
-                                    break
-                            
-                            if not is_too_similar:
-                                questions.append(
-                                    QuizQuestion(
-                                        type='Fill in the blank',
-                                        question=result.question,
-                                        correct_answer=result.answer
-                                    )
-                                )
-                                generated_questions_text.append(result.question)
-                                question_generated = True
-                                self.logger.info(f"Generated unique question {i + 1}/{num_questions}")
-                                break
-                            else:
-                                self.logger.warning(f"Semantically similar question detected, retrying... (attempt {attempt + 1})")
-                        else:
-                            self.logger.warning(f"Exact duplicate question detected, retrying... (attempt {attempt + 1})")
-                
+                    result = await self._generate_one(question_type, topic, difficulty, previous_questions or None)
+
+                    if self._is_unique(result.question, seen, history, attempt):
+                        questions.append(result)
+                        generated_questions_text.append(result.question)
+                        seen.add(result.question)
+                        question_generated = True
+                        self.logger.info(f"Generated unique question {i + 1}/{num_questions}")
+                        break
+
+                except LLMUnavailableError as e:
+                    return self._stop_early(questions, num_questions, e)
                 except Exception as e:
                     self.logger.warning(f"Failed to generate question {i + 1}/{num_questions} on attempt {attempt + 1}: {str(e)}")
                     if attempt == max_attempts_per_question - 1:
                         self.logger.error(f"Could not generate unique question {i + 1} after {max_attempts_per_question} attempts")
-            
+
             if not question_generated:
                 self.logger.warning(f"Skipping question {i + 1} after exhausting all attempts")
-        
+
+        return questions
+
+    async def _generate_concurrently(self, question_type: str, topic: str, difficulty: str, num_questions: int, exclude_questions: List[str], history: Optional[SimilarityIndex] = None) -> List[QuizQuestion]:
+        """
+        Fans the per-question generations out as asyncio tasks (at most QUIZ_MAX_CONCURRENCY in flight).
+        Results are checked for duplicates as they arrive; a rejected slot is regenerated with the
+        questions accepted so far as context. Slots keep their index so the quiz order is stable.
+        """
+        semaphore = asyncio.Semaphore(max(1, app_settings.QUIZ_MAX_CONCURRENCY))
+        max_attempts_per_question = app_settings.QUIZ_MAX_ATTEMPTS_PER_QUESTION
+        slots: List[Optional[QuizQuestion]] = [None] * num_questions
+        generated_questions_text: List[str] = exclude_questions.copy()
+        seen = self._new_index(exclude_questions)
+
+        async def run(previous_questions: Optional[List[str]]) -> QuizQuestion:
+            async with semaphore:
+                return await self._generate_one(question_type, topic, difficulty, previous_questions)
+
+        pending: Dict[asyncio.Task, Tuple[int, int]] = {asyncio.create_task(run(exclude_questions.copy() or None)): (i, 0) for i in range(num_questions)}
+        unavailable: Optional[LLMUnavailableError] = None
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    slot, attempt = pending.pop(task)
+                    try:
+                        result = task.result()
+                        if self._is_unique(result.question, seen, history, attempt):
+                            slots[slot] = result
+                            generated_questions_text.append(result.question)
+                            seen.add(result.question)
+                            self.logger.info(f"Generated unique question {slot + 1}/{num_questions}")
+                            continue
+                    except LLMUnavailableError as e:
+                        # Keep going through this batch: its other calls already completed (and were paid for)
+                        unavailable = unavailable or e
+                        continue
+                    except Exception as e:
+                        self.logger.warning(f"Failed to generate question {slot + 1}/{num_questions} on attempt {attempt + 1}: {str(e)}")
+
+                    if unavailable is not None:
+                        continue
+                    if attempt + 1 < max_attempts_per_question:
+                        # Targeted regeneration: only this slot, with everything accepted so far as context
+                        retry = asyncio.create_task(run(generated_questions_text.copy() or None))
+                        pending[retry] = (slot, attempt + 1)
+                    else:
+                        self.logger.error(f"Could not generate unique question {slot + 1} after {max_attempts_per_question} attempts")
+                        self.logger.warning(f"Skipping question {slot + 1} after exhausting all attempts")
+                if unavailable is not None:
+                    return self._stop_early([q for q in slots if q is not None], num_questions, unavailable)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return [q for q in slots if q is not None]
+
+    async def _generate_in_batches(self, question_type: str, topic: str, difficulty: str, num_questions: int, exclude_questions: List[str], history: Optional[SimilarityIndex] = None) -> List[QuizQuestion]:
+        """Asks for the whole quiz in one completion, then re-requests only the slots lost to duplicates."""
+        questions: List[QuizQuestion] = []
+        generated_questions_text: List[str] = exclude_questions.copy()
+        seen = self._new_index(exclude_questions)
+
+        for attempt in range(app_settings.QUIZ_MAX_ATTEMPTS_PER_QUESTION):
+            missing = num_questions - len(questions)
+            if missing <= 0:
+                break
+            try:
+                batch = await self._generate_batch(question_type, topic, difficulty, missing, generated_questions_text.copy() or None)
+            except LLMUnavailableError as e:
+                return self._stop_early(questions, num_questions, e)
+            except Exception as e:
+                self.logger.warning(f"Failed to generate batch of {missing} questions on attempt {attempt + 1}: {str(e)}")
+                continue
+
+            for result in batch:
+                if len(questions) < num_questions and self._is_unique(result.question, seen, history, attempt):
+                    questions.append(result)
+                    generated_questions_text.append(result.question)
+                    seen.add(result.question)
+                    self.logger.info(f"Generated unique question {len(questions)}/{num_questions}")
+
+        if len(questions) < num_questions:
+            self.logger.warning(f"Skipping {num_questions - len(questions)} questions after exhausting all attempts")
+        return questions
+
+    async def _generate_batch(self, question_type: str, topic: str, difficulty: str, count: int, previous_questions: Optional[List[str]]) -> List[QuizQuestion]:
+        if question_type == "Multiple Choice":
+            results = await self.generator.generate_mcq_batch(topic, count, difficulty.lower(), previous_questions=previous_questions)
+            return [QuizQuestion(type='MCQ', question=r.question, options=r.options, correct_answer=r.correct_answer) for r in results]
+        elif question_type == "Fill in the blank":
+            results = await self.generator.generate_fill_blank_batch(topic, count, difficulty.lower(), previous_questions=previous_questions)
+            return [QuizQuestion(type='Fill in the blank', question=r.question, correct_answer=r.answer) for r in results]
+        raise CustomException(f"Unsupported question type '{question_type}'")
+
+    async def _generate_one(self, question_type: str, topic: str, difficulty: str, previous_questions: Optional[List[str]]) -> QuizQuestion:
+        if question_type == "Multiple Choice":
+            result = await self.generator.generate_mcq(topic, difficulty.lower(), previous_questions=previous_questions)
+            return QuizQuestion(type='MCQ', question=result.question, options=result.options, correct_answer=result.correct_answer)
+        elif question_type == "Fill in the blank":
+            result = await self.generator.generate_fill_blank(topic, difficulty.lower(), previous_questions=previous_questions)
+            return QuizQuestion(type='Fill in the blank', question=result.question, correct_answer=result.answer)
+        raise CustomException(f"Unsupported question type '{question_type}'")
+
+    def _stop_early(self, questions: List[QuizQuestion], num_questions: int, error: LLMUnavailableError) -> List[QuizQuestion]:
+        """No more LLM calls will be admitted for this request: serve what was accepted, or fail if nothing was."""
         if not questions:
-            raise CustomException(
-                f"Failed to generate any questions for topic '{topic}' with difficulty '{difficulty}' "
-                f"and question type '{question_type}' after multiple attempts."
-            )
+            raise error
+        self.logger.warning(f"Stopping at {len(questions)}/{num_questions} questions: {str(error)}")
+        return questions
 
-        return QuizResponse(questions=questions)
-    
-    def _are_questions_too_similar(self, q1: str, q2: str) -> bool:
-        """Check if two questions are semantically too similar"""
-        # Remove common question words
-        common_words = {
-            'what', 'is', 'are', 'the', 'a', 'an', 'in', 'of', 'to', 'for', 
-            'and', 'or', 'which', 'how', 'can', 'does', 'do', 'when', 'where', 
-            'why', 'who', 'with', 'from', 'by', 'at', 'as', 'on', 'be', 'this',
-            'that', 'it', 'its', 'you', 'your', 'will', 'would', 'should', 'could'
-        }
-        
-        def get_key_words(question: str) -> set:
-            # Remove punctuation and split
-            words = question.replace('?', '').replace('.', '').replace(',', '').replace('!', '').split()
-            # Filter out common words and get key terms
-            return {w.lower() for w in words if w.lower() not in common_words and len(w) > 2}
-        
-        words1 = get_key_words(q1)
-        words2 = get_key_words(q2)
-        
-        if not words1 or not words2:
+    @staticmethod
+    def _new_index(questions: List[str]) -> SimilarityIndex:
+        return SimilarityIndex.from_texts(questions, threshold=app_settings.QUIZ_SIMILARITY_THRESHOLD)
+
+    def _is_unique(self, question: str, seen: SimilarityIndex, history: Optional[SimilarityIndex], attempt: int) -> bool:
+        """Rejects exact duplicates and near-duplicates of the questions already accepted or in the student's history."""
+        if question in seen:
+            self.logger.warning(f"Exact duplicate question detected, retrying... (attempt {attempt + 1})")
             return False
-        
-        # Calculate Jaccard similarity
-        intersection = len(words1 & words2)
-        union = len(words1 | words2)
-        
-        if union == 0:
+
+        match = seen.query(question) or (history.query(question) if history is not None else None)
+        if match:
+            prev_q, similarity = match
+            self.logger.warning(f"Question too similar to existing ({similarity:.2f}): '{question}' vs '{prev_q}'")
+            self.logger.warning(f"Semantically similar question detected, retrying... (attempt {attempt + 1})")
             return False
-        
-        similarity = intersection / union
-        
-        # If more than 70% of key words are the same, consider it too similar
-        self.logger.debug(f"Similarity score: {similarity:.2f} between questions")
-        return similarity > 0.7
+        return True
@@ -0,0 +1,48 @@
+from sqlalchemy import event
+from src.services.chat_service import ChatService
+
+
+def contents(window):
+    return [message.content for message in window.messages]
+
+
+def test_cached_window_follows_appends(Session):
+    chat = ChatService()
+    with Session() as db:
+        conv_id = chat.start_turn(db, "s1", None, "hello")
+        chat.add_message_to_history(db, conv_id, "tutor", "hi there")
+        chat.add_message_to_history(db, conv_id, "student", "what is a closure?")
+        cached = chat.context_cache.get(conv_id)
+        chat.context_cache.clear()
+        loaded = chat.get_window(db, conv_id)
+    assert contents(cached) == contents(loaded) == ["hello", "hi there", "what is a closure?"]
+    assert cached.message_count == loaded.message_count == 3
+    assert not chat._inflight
+
+
+def test_load_that_races_an_append_is_not_cached(Session):
+    chat = ChatService()
+    with Session() as db:
+        conv_id = chat.start_turn(db, "s1", None, "hello")
+    chat.context_cache.clear()
+
+    with Session() as db, Session() as other:
+        executed = []
+
+        @event.listens_for(db, "do_orm_execute")
+        def append_after_read(state):
+            # Once the load has read the messages, another request commits a reply before the load caches its window
+            result = state.invoke_statement().freeze()
+            executed.append(state.statement)
+            if len(executed) == 3:
+                chat.add_message_to_history(other, conv_id, "tutor", "late reply")
+            return result()
+
+        stale = chat.get_window(db, conv_id)
+
+    assert contents(stale) == ["hello"]
+    assert chat.context_cache.get(conv_id) is None
+    with Session() as db:
+        assert contents(chat.get_window(db, conv_id)) == ["hello", "late reply"]
+    assert contents(chat.context_cache.get(conv_id)) == ["hello", "late reply"]
+    assert not chat._inflight
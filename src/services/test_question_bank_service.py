@@ -0,0 +1,85 @@
+from sqlalchemy import select
+from src.database.models import ServedBankQuestion
+from src.models.api_schemas import QuizQuestion, QuizSettings
+from src.services.question_bank_service import QuestionBankService
+
+QUESTIONS = [
+    "Which keyword defines a function in Python?",
+    "What does the len function return when given a list of items?",
+    "Which built-in type stores an immutable ordered sequence?",
+    "How do you open a file so it is closed automatically afterwards?",
+]
+
+
+def question(text: str) -> QuizQuestion:
+    return QuizQuestion(type="MCQ", question=text, options=["a", "b", "c", "d"], correct_answer="a")
+
+
+def quiz(student_id: str, num_questions: int = 4) -> QuizSettings:
+    return QuizSettings(topic="Python", question_type="Multiple Choice", difficulty="easy", num_questions=num_questions, student_id=student_id)
+
+
+def served_to(db, student_id: str):
+    return set(db.scalars(select(ServedBankQuestion.question_id).where(ServedBankQuestion.student_id == student_id)))
+
+
+def reserve(bank, db, settings):
+    bucket, banked, history = bank._reserve(db, bank.bucket_key(settings.topic, settings.difficulty, settings.question_type), settings)
+    db.commit()
+    return banked
+
+
+def test_draw_skips_questions_already_served_to_the_student(Session):
+    bank = QuestionBankService()
+    key = bank.bucket_key("Python", "easy", "Multiple Choice")
+    with Session() as db:
+        rows, created = bank._deposit(db, key, [question(text) for text in QUESTIONS])
+        bank._mark_served(db, "s1", rows[:2])
+        db.commit()
+        assert created == 4
+
+        drawn = reserve(bank, db, quiz("s1"))
+        assert {q.question for q in drawn} == set(QUESTIONS[2:])
+        assert len(reserve(bank, db, quiz("s2"))) == 4
+
+        # Serving the rest leaves nothing in the bucket for s1
+        bank._mark_served(db, "s1", drawn)
+        db.commit()
+        assert reserve(bank, db, quiz("s1")) == []
+
+
+def test_draw_skips_near_duplicates_of_the_students_history(Session):
+    bank = QuestionBankService()
+    key = bank.bucket_key("Python", "easy", "Multiple Choice")
+    with Session() as db:
+        rows, _ = bank._deposit(db, key, [question(QUESTIONS[1])])
+        bank._mark_served(db, "s1", rows)
+        db.commit()
+        # Reserving once builds s1's history index; the near-duplicate banked afterwards must still be skipped
+        assert reserve(bank, db, quiz("s1")) == []
+        bank._deposit(db, key, [question("What does the len function return when given a list of items ?"), question(QUESTIONS[0])])
+        db.commit()
+
+        assert [q.question for q in reserve(bank, db, quiz("s1"))] == [QUESTIONS[0]]
+        assert len(reserve(bank, db, quiz("s2"))) == 2
+
+
+def test_live_top_up_keeps_only_questions_new_to_the_student(Session):
+    bank = QuestionBankService()
+    key = bank.bucket_key("Python", "easy", "Multiple Choice")
+    with Session() as db:
+        rows, _ = bank._deposit(db, key, [question(text) for text in QUESTIONS[:2]])
+        bank._mark_served(db, "s1", rows[:1])
+        db.commit()
+
+        drawn = rows[1:]
+        live = [question(text) for text in QUESTIONS]
+        kept_rows, kept = bank._deposit_live(db, key, "s1", live, drawn)
+        # QUESTIONS[0] was served before and QUESTIONS[1] is already in this quiz
+        assert [q.question for q in kept] == QUESTIONS[2:]
+        assert [row.question for row in kept_rows] == QUESTIONS[2:]
+
+        bank._mark_served(db, "s1", drawn + kept_rows)
+        db.commit()
+        assert served_to(db, "s1") == {row.id for row in rows + kept_rows}
+        assert reserve(bank, db, quiz("s1")) == []
@@ -0,0 +1,57 @@
+from datetime import datetime
+from sqlalchemy import func, select
+from src.config.settings import settings
+from src.database.models import XPTransaction
+from src.services import xp_ledger as ledger_module
+from src.services.xp_ledger import XPLedger
+
+
+def entry(student_id, xp_amount=10):
+    return {"student_id": student_id, "xp_amount": xp_amount, "activity_type": "quiz_completion", "description": "Quiz", "timestamp": datetime.utcnow()}
+
+
+def ledger_rows(Session) -> int:
+    with Session() as db:
+        return db.scalar(select(func.count(XPTransaction.id)))
+
+
+def test_entries_are_flushed_in_one_batch(Session, monkeypatch):
+    monkeypatch.setattr(ledger_module, "SessionLocal", Session)
+    ledger = XPLedger()
+    # Without a running worker, entries are written as soon as they are queued
+    ledger._enqueue([entry("s1"), entry("s2"), entry("s1")])
+    assert ledger_rows(Session) == 3
+    assert ledger.get_stats()["queued"] == 0 and ledger.flushes == 1
+
+
+def test_failing_batch_is_retried_then_bad_entry_is_set_aside(Session, monkeypatch):
+    monkeypatch.setattr(ledger_module, "SessionLocal", Session)
+    monkeypatch.setattr(settings, "XP_LEDGER_MAX_RETRIES", 2)
+    ledger = XPLedger()
+    bad = entry(None)
+    ledger._enqueue([entry("s1"), bad, entry("s2")])
+    # First failure: the batch goes back to the front of the queue untouched
+    assert ledger_rows(Session) == 0 and ledger.get_stats()["queued"] == 3
+
+    # Retries used up: the good entries are written one by one, the bad one is dead-lettered
+    assert ledger.flush_sync() == 2
+    assert ledger_rows(Session) == 2
+    assert list(ledger.dead_letters) == [bad]
+    stats = ledger.get_stats()
+    assert stats["queued"] == 0 and stats["dead_lettered"] == 1 and stats["flush_failures"] == 2
+
+    # Later entries are no longer blocked
+    ledger._enqueue([entry("s3")])
+    assert ledger_rows(Session) == 3
+
+
+def test_backlogged_queue_falls_back_to_inline_writes(Session, monkeypatch):
+    monkeypatch.setattr(settings, "XP_LEDGER_WRITE_BEHIND", True)
+    monkeypatch.setattr(settings, "XP_LEDGER_MAX_QUEUED", 2)
+    ledger = XPLedger()
+    ledger._queue = [entry("s1"), entry("s1")]
+    with Session() as db:
+        ledger.record(db, "s2", 25, "daily_login", "Login")
+        db.commit()
+    assert ledger_rows(Session) == 1
+    assert ledger.get_stats()["inline_writes"] == 1 and len(ledger._queue) == 2
@@ -0,0 +1,190 @@
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+from src.config.settings import settings
+from src.common.logger import get_logger
+from src.database.database import AsyncSessionLocal, SessionLocal
+from src.database.models import XPTransaction
+
+logger = get_logger("XPLedger")
+
+# Session.info key for ledger entries written inside a transaction that has not committed yet
+PENDING_ENTRIES_KEY = "xp_ledger_entries"
+
+
+class XPLedger:
+    """
+    Write-behind buffer for the xp_transactions ledger. Entries recorded in a session are queued when that session
+    commits (dropped if it rolls back) and bulk-inserted by run_flush_worker every XP_LEDGER_FLUSH_INTERVAL_SECONDS,
+    or sooner once XP_LEDGER_BATCH_SIZE are waiting. Balances (total_xp, level) are still updated in the request's
+    own transaction; only the history rows are deferred. Without a running worker (scripts), entries are written
+    as soon as their session commits.
+
+    A batch that fails to insert is retried on the next flushes, in order; after XP_LEDGER_MAX_RETRIES failures in a
+    row its entries are written one at a time and any that still fail are logged and set aside as dead letters, so one
+    bad entry cannot block the rest. Once XP_LEDGER_MAX_QUEUED entries are waiting, new entries are written inline.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue: List[dict] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.enqueued = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.max_queued = 0
+        self.inline_writes = 0
+        self.dead_lettered = 0
+        self.dead_letters = deque(maxlen=1000)
+        self._retries = 0
+
+    def record(self, db: Session, student_id: str, xp_amount: int, activity_type: str, description: str):
+        """Adds a ledger entry to db's transaction; it is queued for insertion once db commits."""
+        entry = {"student_id": student_id, "xp_amount": xp_amount, "activity_type": activity_type, "description": description, "timestamp": datetime.utcnow()}
+        if not settings.XP_LEDGER_WRITE_BEHIND or len(self._queue) >= settings.XP_LEDGER_MAX_QUEUED:
+            # Backlogged (e.g. the database keeps rejecting flushes): stop growing the queue and write inline
+            if settings.XP_LEDGER_WRITE_BEHIND:
+                self.inline_writes += 1
+            db.add(XPTransaction(**entry))
+            return
+        db.info.setdefault(PENDING_ENTRIES_KEY, []).append(entry)
+
+    def _enqueue(self, entries: List[dict]):
+        with self._lock:
+            self._queue.extend(entries)
+            self.enqueued += len(entries)
+            self.max_queued = max(self.max_queued, len(self._queue))
+            full = len(self._queue) >= settings.XP_LEDGER_BATCH_SIZE
+        if self._loop is None:
+            self.flush_sync()
+        elif full:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def pending_for(self, student_id: str) -> List[dict]:
+        with self._lock:
+            return [entry for entry in self._queue if entry["student_id"] == student_id]
+
+    def _take(self) -> List[dict]:
+        with self._lock:
+            batch, self._queue = self._queue[:settings.XP_LEDGER_BATCH_SIZE], self._queue[settings.XP_LEDGER_BATCH_SIZE:]
+            return batch
+
+    def _flushed(self, batch: List[dict], error: Optional[Exception]) -> bool:
+        """Records a batch insert. On failure, returns True once retries are used up and the entries should be written one by one."""
+        with self._lock:
+            if error is None:
+                self.flushes += 1
+                self.flushed += len(batch)
+                self._retries = 0
+                return False
+            self.flush_failures += 1
+            self._retries += 1
+            give_up = self._retries >= settings.XP_LEDGER_MAX_RETRIES
+            if give_up:
+                self._retries = 0
+            else:
+                # Put the batch back in front so it is retried, in order, on the next flush
+                self._queue[:0] = batch
+        logger.error(f"Failed to flush {len(batch)} XP ledger entries{', writing them one at a time' if give_up else ''}: {str(error)}")
+        return give_up
+
+    def _settled(self, entry: dict, error: Optional[Exception]) -> bool:
+        """Records a single-entry insert made after its batch kept failing; a failure here is final."""
+        with self._lock:
+            if error is None:
+                self.flushed += 1
+                return True
+            self.dead_lettered += 1
+            self.dead_letters.append(entry)
+        logger.error(f"Dropping XP ledger entry after {settings.XP_LEDGER_MAX_RETRIES} failed flushes: {entry}: {str(error)}")
+        return False
+
+    @staticmethod
+    async def _insert(entries: List[dict]) -> Optional[Exception]:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(XPTransaction), entries)
+                await db.commit()
+        except Exception as e:
+            return e
+        return None
+
+    @staticmethod
+    def _insert_sync(entries: List[dict]) -> Optional[Exception]:
+        try:
+            with SessionLocal() as db:
+                db.execute(insert(XPTransaction), entries)
+                db.commit()
+        except Exception as e:
+            return e
+        return None
+
+    async def flush(self) -> int:
+        written = 0
+        while batch := self._take():
+            error = await self._insert(batch)
+            if error is None:
+                self._flushed(batch, None)
+                written += len(batch)
+            elif self._flushed(batch, error):
+                for entry in batch:
+                    written += self._settled(entry, await self._insert([entry]))
+            else:
+                break
+        return written
+
+    def flush_sync(self) -> int:
+        written = 0
+        while batch := self._take():
+            error = self._insert_sync(batch)
+            if error is None:
+                self._flushed(batch, None)
+                written += len(batch)
+            elif self._flushed(batch, error):
+                for entry in batch:
+                    written += self._settled(entry, self._insert_sync([entry]))
+            else:
+                break
+        return written
+
+    async def run_flush_worker(self, stop_event: asyncio.Event):
+        """Background loop started from the FastAPI lifespan; flushes whatever is left when stop_event is set."""
+        self._loop, self._wake = asyncio.get_running_loop(), asyncio.Event()
+        logger.info("XP ledger flush worker started")
+        stopping = asyncio.ensure_future(stop_event.wait())
+        try:
+            while not stopping.done():
+                woken = asyncio.ensure_future(self._wake.wait())
+                await asyncio.wait({stopping, woken}, timeout=settings.XP_LEDGER_FLUSH_INTERVAL_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+                woken.cancel()
+                self._wake.clear()
+                await self.flush()
+        finally:
+            self._loop = self._wake = None
+            await self.flush()
+            logger.info(f"XP ledger flush worker stopped ({len(self._queue)} entries left unwritten)")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {"write_behind": settings.XP_LEDGER_WRITE_BEHIND, "queued": len(self._queue), "max_queued": self.max_queued, "enqueued": self.enqueued, "flushed": self.flushed, "flushes": self.flushes, "flush_failures": self.flush_failures, "dead_lettered": self.dead_lettered, "inline_writes": self.inline_writes, "worker_running": self._loop is not None}
+
+
+xp_ledger = XPLedger()
+
+
+@event.listens_for(Session, "after_commit")
+def _queue_committed_entries(session: Session):
+    entries = session.info.pop(PENDING_ENTRIES_KEY, None)
+    if entries:
+        xp_ledger._enqueue(entries)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back_entries(session: Session):
+    session.info.pop(PENDING_ENTRIES_KEY, None)
@@ -3,12 +3,23 @@ from langchain_core.documents import Document
 from pyvis.network import Network
 from src.llm.groq_client import get_groq_llm
 from src.utils.content_generator import generate_content_for_topic
+from src.common.cache import LRUCache, SQLiteCache
 from src.common.logger import get_logger
+from src.config.settings import settings
+import asyncio
 import base64
+import hashlib
+import json
+import re
 
 logger = get_logger("KnowledgeGraphGenerator")
 
-import re
+# LLMGraphTransformer options; part of the cache key so changing them invalidates cached graphs
+GRAPH_TRANSFORMER_SETTINGS = {"allowed_nodes": [], "allowed_relationships": [], "strict_mode": True, "node_properties": False, "relationship_properties": False}
+
+# Level 1: rendered output per key. Level 2: extracted nodes/relationships on disk.
+_rendered_cache = LRUCache(max_entries=settings.KG_CACHE_MEMORY_ENTRIES, ttl_seconds=settings.KG_CACHE_TTL_SECONDS)
+_graph_store = SQLiteCache(settings.KG_CACHE_PATH, ttl_seconds=settings.KG_CACHE_TTL_SECONDS, max_bytes=settings.KG_CACHE_MAX_BYTES) if settings.KG_CACHE_ENABLED else None
 
 def clean_html_for_json(html_content: str) -> str:
     """
@@ -29,49 +40,64 @@ async def extract_graph_data(text: str):
     """Asynchronously extracts graph data from input text."""
     # Use a low temperature for fact extraction
     llm = get_groq_llm(temperature=0)
-    graph_transformer = LLMGraphTransformer(llm=llm)
+    graph_transformer = LLMGraphTransformer(llm=llm, **GRAPH_TRANSFORMER_SETTINGS)
     documents = [Document(page_content=text)]
     # This is the async call now fully compatible with FastAPI's event loop
     graph_documents = await graph_transformer.aconvert_to_graph_documents(documents)
     return graph_documents
 
 
-def visualize_graph(graph_documents):
+def graph_documents_to_data(graph_documents) -> dict:
+    """Reduces extracted graph documents to the plain nodes/relationships the renderer needs."""
+    if not graph_documents:
+        return {"nodes": [], "relationships": []}
+    doc = graph_documents[0]
+    return {
+        "nodes": [{"id": node.id, "type": node.type} for node in doc.nodes],
+        "relationships": [{"source": rel.source.id, "target": rel.target.id, "type": rel.type} for rel in doc.relationships],
+    }
+
+
+def graph_cache_key(text: str = None, topic: str = None) -> str:
+    """Content address: normalized text (or topic), model name and transformer settings."""
+    source = f"text:{' '.join(text.split())}" if text else f"topic:{' '.join(topic.lower().split())}"
+    payload = json.dumps({"source": source, "model": settings.MODEL_NAME, "transformer": GRAPH_TRANSFORMER_SETTINGS}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def visualize_graph(graph_data: dict) -> str:
     """
-    Visualizes a knowledge graph using PyVis and returns the HTML content.
+    Visualizes a knowledge graph using PyVis and returns the raw HTML content.
     """
-    if not graph_documents or not graph_documents[0].nodes:
+    if not graph_data or not graph_data["nodes"]:
         return "<html><body>No graph data extracted.</body></html>"
 
     net = Network(height="750px", width="100%", directed=True,
                       notebook=False, bgcolor="#222222", font_color="white", filter_menu=True, cdn_resources='remote')
 
-    nodes = graph_documents[0].nodes
-    relationships = graph_documents[0].relationships
-
-    node_dict = {node.id: node for node in nodes}
+    node_dict = {node["id"]: node for node in graph_data["nodes"]}
 
     valid_edges = []
     valid_node_ids = set()
-    for rel in relationships:
-        if rel.source.id in node_dict and rel.target.id in node_dict:
+    for rel in graph_data["relationships"]:
+        if rel["source"] in node_dict and rel["target"] in node_dict:
             valid_edges.append(rel)
-            valid_node_ids.update([rel.source.id, rel.target.id])
+            valid_node_ids.update([rel["source"], rel["target"]])
 
     for node_id in valid_node_ids:
         node = node_dict[node_id]
-        label = node.id if len(node.id) < 30 else f"{node.id[:27]}..."
+        label = node["id"] if len(node["id"]) < 30 else f"{node['id'][:27]}..."
         try:
-            net.add_node(node.id, label=label, title=f"Type: {node.type}\nID: {node.id}", group=node.type)
+            net.add_node(node["id"], label=label, title=f"Type: {node['type']}\nID: {node['id']}", group=node["type"])
         except Exception as e:
-            logger.warning(f"Failed to add node {node.id}: {str(e)}")
+            logger.warning(f"Failed to add node {node['id']}: {str(e)}")
             continue
 
     for rel in valid_edges:
         try:
-            net.add_edge(rel.source.id, rel.target.id, label=rel.type.lower())
+            net.add_edge(rel["source"], rel["target"], label=rel["type"].lower())
         except Exception as e:
-            logger.warning(f"Failed to add edge from {rel.source.id} to {rel.target.id}: {str(e)}")
+            logger.warning(f"Failed to add edge from {rel['source']} to {rel['target']}: {str(e)}")
             continue
 
     net.set_options("""
@@ -95,43 +121,54 @@ def visualize_graph(graph_documents):
         }
     """)
 
-    # Generate HTML to a temporary file
-    import tempfile
-    import os as os_module
-    
-    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.html') as tmp_file:
-        tmp_path = tmp_file.name
-        net.save_graph(tmp_path)
-
-    # Read the HTML content
-    with open(tmp_path, 'r', encoding='utf-8') as f:
-        html_content = f.read()
-
-    # Clean up the temporary file
-    try:
-        os_module.unlink(tmp_path)
-    except Exception as e:
-        logger.warning(f"Failed to delete temporary file {tmp_path}: {str(e)}")
-
-    # Base64 encode to avoid JSON serialization issues
-    html_bytes = html_content.encode('utf-8')
-    html_base64 = base64.b64encode(html_bytes).decode('utf-8')
-    
-    return html_base64
+    # Render straight to a string; no temporary file round trip
+    return net.generate_html()
+
+
+def encode_html_base64(html_content: str) -> str:
+    """Base64 encodes rendered HTML for the JSON API (avoids JSON serialization issues)."""
+    return base64.b64encode(html_content.encode('utf-8')).decode('utf-8')
+
 
 async def generate_knowledge_graph(text: str = None, topic: str = None) -> str:
     """Generates and visualizes a knowledge graph from input text or a topic."""
     if not text and not topic:
         return "<html><body>Please provide a topic or text to generate the knowledge graph.</body></html>"
 
-    source_text = text
-    if not source_text and topic:
-        logger.info(f"No text provided, generating content for topic: {topic}")
-        source_text = await generate_content_for_topic(topic)
+    key = graph_cache_key(text=text, topic=topic)
+    if settings.KG_CACHE_ENABLED:
+        cached_html = _rendered_cache.get(key)
+        if cached_html is not None:
+            logger.info(f"Knowledge graph cache hit (memory) for key {key[:12]}")
+            return cached_html
+
+    graph_data = None
+    if _graph_store is not None:
+        # The store is a SQLite file; read and write it off the event loop
+        stored = await asyncio.to_thread(_graph_store.get, key)
+        if stored is not None:
+            logger.info(f"Knowledge graph cache hit (store) for key {key[:12]}")
+            graph_data = json.loads(stored)
+
+    if graph_data is None:
+        source_text = text
+        if not source_text and topic:
+            logger.info(f"No text provided, generating content for topic: {topic}")
+            source_text = await generate_content_for_topic(topic)
+
+        if not source_text:
+            return "<html><body>Could not generate content for the given topic.</body></html>"
+
+        graph_documents = await extract_graph_data(source_text)
+        graph_data = graph_documents_to_data(graph_documents)
+        if _graph_store is not None and graph_data["nodes"]:
+            await asyncio.to_thread(_graph_store.set, key, json.dumps(graph_data))
+
+    html_content = visualize_graph(graph_data)
+    if settings.KG_CACHE_ENABLED and graph_data["nodes"]:
+        _rendered_cache.set(key, html_content)
+    return html_content
 
-    if not source_text:
-        return "<html><body>Could not generate content for the given topic.</body></html>"
 
-    graph_documents = await extract_graph_data(source_text)
-    html_content = visualize_graph(graph_documents)
-    return html_content
\ No newline at end of file
+def get_graph_cache_stats() -> dict:
+    return {"memory": _rendered_cache.stats(), "store": _graph_store.stats() if _graph_store is not None else None}
\ No newline at end of file
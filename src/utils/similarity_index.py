@@ -0,0 +1,114 @@
+import hashlib
+import random
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Words that say nothing about what a question is about; dropped before comparing questions
+STOPWORDS = frozenset({
+    'what', 'is', 'are', 'the', 'a', 'an', 'in', 'of', 'to', 'for',
+    'and', 'or', 'which', 'how', 'can', 'does', 'do', 'when', 'where',
+    'why', 'who', 'with', 'from', 'by', 'at', 'as', 'on', 'be', 'this',
+    'that', 'it', 'its', 'you', 'your', 'will', 'would', 'should', 'could'
+})
+
+_STRIP_PUNCTUATION = str.maketrans("", "", "?.,!;:\"'()[]")
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text: str) -> frozenset:
+    """Normalized word shingles of a question: lowercase key terms, punctuation and stopwords removed."""
+    return frozenset(w for w in text.lower().translate(_STRIP_PUNCTUATION).split() if w not in STOPWORDS and len(w) > 2)
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """num_perm universal hash functions; the minimum of each over a shingle set estimates Jaccard similarity."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        # Fixed seed: signatures must agree across processes and restarts
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, items: Iterable[str]) -> Tuple[int, ...]:
+        hashes = [int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big") for item in items]
+        if not hashes:
+            return (_MAX_HASH,) * self.num_perm
+        return tuple(min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes) for a, b in self._perms)
+
+
+@lru_cache(maxsize=4)
+def _hasher(num_perm: int) -> MinHasher:
+    return MinHasher(num_perm)
+
+
+class SimilarityIndex:
+    """
+    Near-duplicate index for questions. Each question's MinHash signature is split into `bands` LSH bands; a lookup
+    only compares against questions sharing at least one band bucket, then confirms candidates with the exact
+    Jaccard similarity of their shingles. With 128 permutations in 32 bands, a question above a 0.7 threshold
+    shares a bucket with probability > 0.9998, while one at 0.3 is a candidate less than a quarter of the time.
+    Not thread-safe; each index is used from one event loop.
+    """
+
+    def __init__(self, threshold: float = 0.7, num_perm: int = 128, bands: int = 32):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self._rows = num_perm // bands
+        self._hasher = _hasher(num_perm)
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+        self._texts: List[str] = []
+        self._shingles: List[frozenset] = []
+        self._exact: Set[str] = set()
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str], **kwargs) -> "SimilarityIndex":
+        index = cls(**kwargs)
+        for text in texts:
+            index.add(text)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def __contains__(self, text: str) -> bool:
+        return text.strip() in self._exact
+
+    def _band_keys(self, items: frozenset) -> List[Tuple[int, Tuple[int, ...]]]:
+        signature = self._hasher.signature(items)
+        return [(band, signature[start:start + self._rows]) for band, start in enumerate(range(0, len(signature), self._rows))]
+
+    def add(self, text: str):
+        text = text.strip()
+        if text in self._exact:
+            return
+        position = len(self._texts)
+        items = shingles(text)
+        self._texts.append(text)
+        self._shingles.append(items)
+        self._exact.add(text)
+        if items:
+            for key in self._band_keys(items):
+                self._buckets.setdefault(key, []).append(position)
+
+    def query(self, text: str) -> Optional[Tuple[str, float]]:
+        """Returns the most similar indexed question above the threshold, with its similarity, or None."""
+        text = text.strip()
+        if text in self._exact:
+            return text, 1.0
+        items = shingles(text)
+        if not items:
+            return None
+        candidates = {position for key in self._band_keys(items) for position in self._buckets.get(key, ())}
+        best = max(((jaccard(items, self._shingles[p]), p) for p in candidates), default=None)
+        if best is None or best[0] <= self.threshold:
+            return None
+        return self._texts[best[1]], best[0]